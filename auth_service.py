@@ -5,7 +5,8 @@ from fastapi.security.api_key import APIKeyHeader
 from starlette.status import HTTP_403_FORBIDDEN
 from pydantic import BaseModel
 from datetime import datetime
-from config import API_CLIENT_ID, API_KEY
+from config import API_CLIENT_ID, API_KEY, API_KEY_STORE_PATH, API_KEY_CACHE_TTL_SECONDS
+from key_store import KeyStore
 
 class APIKey(BaseModel):
     key: str
@@ -14,21 +15,17 @@ class APIKey(BaseModel):
     is_active: bool = True
 
 class AuthService:
-    def __init__(self):
-        # Initialize with static API key from config
-        self._api_key = APIKey(
-            key=API_KEY,
-            client_id=API_CLIENT_ID,
-            created_at=datetime.utcnow(),
-            is_active=True
-        )
+    def __init__(self, key_store: Optional[KeyStore] = None):
+        # Every tenant's keys live hashed in the key store; the configured pair belongs to the default tenant,
+        # and changing API_KEY revokes the key it replaces
+        self.key_store = key_store or KeyStore(API_KEY_STORE_PATH, cache_ttl=API_KEY_CACHE_TTL_SECONDS)
+        self.key_store.ensure_configured(API_CLIENT_ID, API_KEY)
     
     def validate_credentials(self, key: str, client_id: str) -> Optional[APIKey]:
         """Validate both the API key and client ID."""
-        if (key == self._api_key.key and 
-            client_id == self._api_key.client_id and 
-            self._api_key.is_active):
-            return self._api_key
+        record = self.key_store.lookup(key)
+        if record is not None and record["client_id"] == client_id and record["is_active"]:
+            return APIKey(key=key, **record)
         return None
 
 # FastAPI security schemes
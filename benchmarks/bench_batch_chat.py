@@ -0,0 +1,147 @@
+"""Answering a list of questions: one /api/v1/chat call per question vs a single /api/v1/chat/batch request.
+
+Prefills a collection with synthetic chunks, then answers the same questions
+three ways: sequential chat calls (an evaluation script's loop), chat calls
+`--concurrency` at a time, and one batch request. Reports wall time, embedding
+requests and time to the first answer. Runs in-process against the ASGI app
+with fake model backends whose latencies stand in for the API round trips;
+every run uses fresh questions, so the response cache never answers.
+
+    python -m benchmarks.bench_batch_chat --questions 200 --llm-latency 0.5 --embed-latency 0.05
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.fakes import make_rag_service
+from benchmarks.fixtures import WORDS
+
+UNLIMITED = {"rate": math.inf, "burst": math.inf, "concurrency": math.inf}
+
+
+def prefill(manager, chunks):
+    from langchain_core.documents import Document
+
+    rng = random.Random(0)
+    for offset in range(0, chunks, 2000):
+        manager.write_chunks([
+            Document(page_content=f"Chunk {i}: {' '.join(rng.choices(WORDS, k=30))}.",
+                     metadata={"url": f"https://example.com/{i // 20}", "url_hash": f"{i // 20:032x}"})
+            for i in range(offset, min(offset + 2000, chunks))
+        ])
+    manager.flush()
+
+
+def questions(count, tag):
+    rng = random.Random(tag)
+    return [f"What is said about {' '.join(rng.choices(WORDS, k=3))} ({tag} {i})?" for i in range(count)]
+
+
+async def sequential(client, headers, queries):
+    first = None
+    start = time.perf_counter()
+    for query in queries:
+        response = await client.post("/api/v1/chat", json={"query": query}, headers=headers)
+        response.raise_for_status()
+        first = first or time.perf_counter() - start
+    return first
+
+
+async def concurrent(client, headers, queries, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    start = time.perf_counter()
+    finished = []
+
+    async def ask(query):
+        async with semaphore:
+            response = await client.post("/api/v1/chat", json={"query": query}, headers=headers)
+            response.raise_for_status()
+            finished.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(ask(query) for query in queries))
+    return min(finished)
+
+
+async def batch(client, headers, queries, service):
+    response = await client.post("/api/v1/chat/batch", json={"queries": queries}, headers=headers)
+    response.raise_for_status()
+    results = [json.loads(line) for line in response.text.splitlines() if line]
+    assert len(results) == len(queries) and not any("error" in result for result in results)
+
+
+async def batch_first_answer(service, queries):
+    # The in-process transport delivers a body whole, so time to first answer is read off the service itself
+    start = time.perf_counter()
+    results = service.aget_responses(queries)
+    await results.__anext__()
+    first = time.perf_counter() - start
+    await results.aclose()
+    return first
+
+
+async def run(args, root):
+    import main
+    from config import API_CLIENT_ID, API_KEY
+    from tenant_limits import TenantLimiter
+
+    service = make_rag_service(os.path.join(root, "db"), backend=args.backend, llm_latency=args.llm_latency,
+                               embed_latency=args.embed_latency, flush_interval=1.0)
+    main.build_rag_service = lambda tenant: service
+    await main.app.router.startup()
+    main.warmup.wait()
+    prefill(service.vector_store_manager, args.chunks)
+    service.warm_up()
+    main.tenant_limits = TenantLimiter({"chat": UNLIMITED, "index": UNLIMITED, "batch": UNLIMITED})
+    headers = {"X-Client-ID": API_CLIENT_ID, "X-API-Key": API_KEY}
+    embeddings = service.vector_store_manager.embedding_function
+
+    print(f"{'mode':>22} {'wall s':>8} {'q/s':>8} {'first ms':>9} {'embed calls':>12}")
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench",
+                                 timeout=3600) as client:
+        runs = [
+            ("sequential /chat", lambda queries: sequential(client, headers, queries)),
+            (f"{args.concurrency} concurrent /chat", lambda queries: concurrent(client, headers, queries,
+                                                                                args.concurrency)),
+            ("/chat/batch", lambda queries: batch(client, headers, queries, service)),
+        ]
+        for name, ask in runs:
+            queries = questions(args.questions, name)
+            calls = embeddings.calls
+            start = time.perf_counter()
+            first = await ask(queries)
+            elapsed = time.perf_counter() - start
+            if first is None:
+                calls_so_far = embeddings.calls
+                first = await batch_first_answer(service, questions(args.questions, f"{name} first"))
+                calls += embeddings.calls - calls_so_far
+            print(f"{name:>22} {elapsed:>8.2f} {len(queries) / elapsed:>8.1f} {first * 1000:>9.1f} "
+                  f"{embeddings.calls - calls:>12}")
+    await main.app.router.shutdown()
+    service.vector_store_manager.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--questions", type=int, default=100)
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--backend", choices=["chroma", "local"], default="local")
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--concurrency", type=int, default=8, help="parallel /chat calls (CHAT_BATCH_CONCURRENCY)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root, tempfile.TemporaryDirectory() as workdir:
+        # Sessions, keys, jobs and other sqlite stores are created relative to the working directory
+        os.chdir(workdir)
+        asyncio.run(run(args, root))
+
+
+if __name__ == "__main__":
+    main()
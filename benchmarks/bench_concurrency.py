@@ -0,0 +1,77 @@
+"""Chat latency under N parallel clients: blocking get_response vs async aget_response.
+
+Runs against fake LLM/embedding backends with a fixed simulated latency, so the
+numbers show event-loop behaviour rather than OpenAI latency.
+
+    python -m benchmarks.bench_concurrency --clients 1 4 16 64
+"""
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+
+from langchain_core.documents import Document
+
+from benchmarks.fakes import make_rag_service
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def run_clients(handler, clients, requests_per_client):
+    """Fire requests from `clients` concurrent coroutines and collect per-request latency."""
+    latencies = []
+
+    async def client(client_id, sent_at):
+        # Latency is measured from when the request was issued, so time spent
+        # waiting for a blocked event loop is counted too
+        for i in range(requests_per_client):
+            await handler(f"question {client_id}-{i} about retrieval", [])
+            finished_at = time.perf_counter()
+            latencies.append(finished_at - sent_at)
+            sent_at = finished_at
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(c, start) for c in range(clients)))
+    return latencies, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--requests", type=int, default=4, help="requests per client")
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--embed-latency", type=float, default=0.01)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as persist_directory:
+        rag_service = make_rag_service(persist_directory, args.llm_latency, args.embed_latency)
+        rag_service.vector_store_manager.write_chunks([
+            Document(page_content=f"Chunk {i} about retrieval and ranking.",
+                     metadata={"url": f"https://example.com/{i}"})
+            for i in range(50)
+        ])
+
+        async def blocking_handler(query, history):
+            # What the handlers did before: a sync call inside `async def`
+            return rag_service.get_response(query, history)
+
+        async def async_handler(query, history):
+            return await rag_service.aget_response(query, history)
+
+        print(f"{'mode':<9}{'clients':>8}{'p50 ms':>10}{'p99 ms':>10}{'req/s':>10}")
+        for mode, handler in (("blocking", blocking_handler), ("async", async_handler)):
+            for clients in args.clients:
+                latencies, elapsed = asyncio.run(run_clients(handler, clients, args.requests))
+                print(f"{mode:<9}{clients:>8}"
+                      f"{statistics.median(latencies) * 1000:>10.1f}"
+                      f"{percentile(latencies, 99) * 1000:>10.1f}"
+                      f"{len(latencies) / elapsed:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
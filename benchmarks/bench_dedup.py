@@ -0,0 +1,62 @@
+"""Stored chunks, embedding work and top-k diversity with and without chunk deduplication.
+
+Serves generated pages that all repeat the same cookie banner and related-links
+block inside the article (so boilerplate stripping cannot remove it) and indexes
+them with dedup on and off. Then asks questions about the repeated text and
+reports how many of the k results are distinct, with and without MMR.
+
+    python -m benchmarks.bench_dedup --pages 200 --paragraphs 8
+"""
+import argparse
+import random
+import tempfile
+import time
+
+from benchmarks.fakes import make_rag_service
+from benchmarks.fixtures import make_html_page, serve_pages
+
+REPEATED = [
+    " ".join(["We use cookies to give you the best experience on our website and to analyse traffic."] * 10),
+    " ".join(["Related articles: getting started, configuration reference, troubleshooting, release notes."] * 10),
+]
+QUERIES = ["cookies best experience website analyse traffic", "related articles configuration troubleshooting"]
+
+
+def make_page(i, paragraphs, rng):
+    html = make_html_page(f"Page {i}", paragraphs, rng)
+    return html.replace("</article>", "".join(f"<p>{text}</p>" for text in REPEATED) + "</article>")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--paragraphs", type=int, default=8, help="unique paragraphs per page")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    pages = {f"docs/page-{i}.html": make_page(i, args.paragraphs, rng) for i in range(args.pages)}
+    with serve_pages(pages) as base_url:
+        urls = [base_url + path for path in pages]
+        for dedup in (False, True):
+            with tempfile.TemporaryDirectory() as persist_directory:
+                rag_service = make_rag_service(persist_directory, dedup=dedup)
+                manager = rag_service.vector_store_manager
+                start = time.perf_counter()
+                manager.process_urls(urls)
+                elapsed = time.perf_counter() - start
+                stats = manager.get_collection_stats()
+                embed = manager.get_ingest_stats().get("embed", {"items": 0})
+                print(f"\ndedup={dedup}: {stats['total_chunks']} page chunks, {manager.vector_store.count()} stored, "
+                      f"{embed['items']} embedded, {elapsed:.2f}s")
+                for mmr in (False, True):
+                    # No threshold, so the k slots are always filled
+                    retriever = rag_service.get_retriever(args.k, score_threshold=-1.0, mmr=mmr)
+                    distinct = [len({doc.page_content for doc in retriever.invoke(query)}) for query in QUERIES]
+                    print(f"  mmr={mmr}: distinct texts in top {args.k} per query: {distinct}")
+                manager.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Batch ingestion throughput and per-stage counters, with and without the parse process pool.
+
+Serves generated article pages from a local HTTP server and indexes them with
+process_urls, once parsing in the calling threads (--parse-workers 0) and once
+per requested process pool size. Uses fake embeddings, so embed time is only
+the hashing cost; --embed-latency adds a simulated per-batch API delay.
+
+    python -m benchmarks.bench_ingest_pipeline --pages 300 --paragraphs 200 --parse-workers 0 2 4
+"""
+import argparse
+import random
+import tempfile
+import time
+
+from benchmarks.fakes import make_rag_service
+from benchmarks.fixtures import make_html_page, serve_pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--paragraphs", type=int, default=200, help="paragraphs per page")
+    parser.add_argument("--parse-workers", type=int, nargs="+", default=[0, 2, 4])
+    parser.add_argument("--embed-latency", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    pages = {f"docs/page-{i}.html": make_html_page(f"Page {i}", args.paragraphs, rng) for i in range(args.pages)}
+    with serve_pages(pages) as base_url:
+        urls = [base_url + path for path in pages]
+        for parse_workers in args.parse_workers:
+            with tempfile.TemporaryDirectory() as persist_directory:
+                rag_service = make_rag_service(persist_directory, embed_latency=args.embed_latency)
+                manager = rag_service.vector_store_manager
+                manager.parse_workers = parse_workers
+                start = time.perf_counter()
+                results = manager.process_urls(urls)
+                elapsed = time.perf_counter() - start
+                manager.close()
+            failed = sum(1 for result in results if result["status"] == "failed")
+            print(f"\nparse_workers={parse_workers}: {len(urls) / elapsed:.1f} pages/s "
+                  f"({elapsed:.2f}s, {failed} failed)")
+            print(f"{'stage':>6} {'items':>8} {'busy s':>8} {'items/s':>9}")
+            for stage, counters in manager.get_ingest_stats().items():
+                print(f"{stage:>6} {counters['items']:>8} {counters['busy_seconds']:>8.2f} "
+                      f"{counters['items_per_second']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Per-URL ingestion throughput as the index grows, write-through vs write-behind.
+
+Replays the write path of process_url (apply one page's plan, then persist) for
+synthetic pages and reports pages/s per window. write-through persists the
+backend after every page like the old code; buffered uses the write-behind
+buffer with its default flush interval. Whether write-through slows down as the
+index grows depends on the backend's persist() cost: the legacy duckdb+parquet
+Chroma rewrites the collection on every call, the current one is a no-op and
+the local backend flushes its memory map. Pages are all new; refreshing an
+indexed page looks up its stored chunks by url_hash, which applies the queued
+writes first, so refresh-heavy runs see less of the buffered speedup.
+
+    python -m benchmarks.bench_ingestion --pages 2000 --window 250 --backend local
+"""
+import argparse
+import tempfile
+import time
+
+from langchain_core.documents import Document
+
+from benchmarks.fakes import make_rag_service
+from index_service import IndexPlan
+
+
+def make_plan(manager, page, chunks_per_page):
+    url = f"https://docs.example.com/page-{page}"
+    url_hash = manager.get_url_hash(url)
+    chunks = [Document(page_content=f"page {page} chunk {i} " + "lorem ipsum dolor sit amet " * 30,
+                       metadata={"url": url, "url_hash": url_hash, "domain": "docs.example.com",
+                                 "chunk_hash": f"{page}-{i}"})
+              for i in range(chunks_per_page)]
+    text_bytes = sum(len(chunk.page_content.encode()) for chunk in chunks)
+    return IndexPlan(url, url_hash, "indexed", len(chunks), text_bytes, chunks, [], [], [])
+
+
+def run(mode, args):
+    """Return pages/s for each window of args.window pages"""
+    with tempfile.TemporaryDirectory() as persist_directory:
+        rag_service = make_rag_service(persist_directory, backend=args.backend,
+                                       flush_interval=0 if mode == "write-through" else 30)
+        manager = rag_service.vector_store_manager
+        rates = []
+        start = time.perf_counter()
+        for page in range(args.pages):
+            manager.apply_plans([make_plan(manager, page, args.chunks_per_page)])
+            manager.vector_store.persist()
+            if (page + 1) % args.window == 0:
+                now = time.perf_counter()
+                rates.append(args.window / (now - start))
+                start = now
+        manager.close()
+        return rates
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", choices=["chroma", "local"], default="chroma")
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--window", type=int, default=250)
+    parser.add_argument("--chunks-per-page", type=int, default=8)
+    args = parser.parse_args()
+
+    results = {mode: run(mode, args) for mode in ("write-through", "buffered")}
+    print(f"backend={args.backend}, {args.chunks_per_page} chunks per page, pages/s per {args.window}-page window")
+    print(f"{'indexed pages':>13} " + " ".join(f"{mode:>13}" for mode in results))
+    for window, rates in enumerate(zip(*results.values()), start=1):
+        print(f"{window * args.window:>13} " + " ".join(f"{rate:>13.1f}" for rate in rates))
+
+
+if __name__ == "__main__":
+    main()
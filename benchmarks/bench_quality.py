@@ -0,0 +1,296 @@
+"""Retrieval quality (recall@k, MRR), per-stage latency, ingest throughput and memory of the whole pipeline.
+
+Indexes local HTML fixtures through the real ingestion path (fetch, parse,
+chunk with CHUNK_SIZE/CHUNK_OVERLAP, dedup, embed, write), then replays a query
+set through get_response with fake model backends and scores the retrieved
+pages against each query's labelled relevant pages. Everything is seeded and
+the fakes are deterministic, so two commits run on the same query set are
+directly comparable: --output appends one JSON record per run (commit, settings
+and metrics) and --compare prints the change from the last record in a file.
+
+Query sets are JSONL. A line is either {"query", "relevant": [page paths]},
+answered from the HTML files under --pages, or a request-log entry
+{"title", "body"} such as requests.jsonl, whose body becomes a fixture page
+and whose title is the query. Without --queries a synthetic set is generated:
+pages of filler prose, each stating a few facts, asked for by identifier and
+by description. Fake hashing embeddings only measure lexical overlap, so the
+numbers track regressions, not OpenAI-embedding quality.
+
+    python -m benchmarks.bench_quality --output bench_quality.jsonl
+    python -m benchmarks.bench_quality --queries requests.jsonl --compare bench_quality.jsonl
+"""
+import argparse
+import html
+import json
+import os
+import random
+import resource
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks.bench_concurrency import percentile
+from benchmarks.bench_vector_backends import rss_mb
+from benchmarks.fakes import make_rag_service
+from benchmarks.fixtures import make_html_page, serve_pages
+
+
+def synthetic_query_set(pages, facts_per_page, vocabulary_size, rng):
+    """({path: html}, [(kind, query, [relevant paths])]) with facts planted in filler-prose pages.
+
+    Fact descriptions draw from a small shared vocabulary, so a descriptive
+    question also matches facts on other pages and ranking has work to do.
+    """
+    vocabulary = ["".join(rng.choices("bcdfghjklmnprstvz", k=3)) + rng.choice(["ing", "er", "ion", "al"])
+                  for _ in range(vocabulary_size)]
+    fixtures, queries = {}, []
+    for i in range(pages):
+        path = f"docs/page-{i}.html"
+        facts = []
+        for j in range(facts_per_page):
+            identifier = f"{rng.choice(['ERR', 'CFG', 'SKU'])}-{i:04d}{j}"
+            description = rng.sample(vocabulary, 5)
+            facts.append(f"{identifier} is the setting for {' '.join(description)}.")
+            queries.append(("identifier", f"What is {identifier}?", [path]))
+            queries.append(("descriptive", f"Which setting is for {' '.join(rng.sample(description, 3))}?", [path]))
+        fixtures[path] = make_html_page(f"Page {i}", paragraphs=10, rng=rng, facts=facts)
+    return fixtures, queries
+
+
+def text_page(title, text):
+    paragraphs = "\n".join(f"<p>{html.escape(block.strip())}</p>" for block in text.split("\n\n") if block.strip())
+    return f"<!DOCTYPE html>\n<html><head><title>{html.escape(title)}</title></head>\n" \
+           f"<body><main><article>\n{paragraphs}\n</article></main></body></html>"
+
+
+def load_query_set(path, pages_directory):
+    """({path: html}, [(kind, query, [relevant paths])]) from a JSONL query set."""
+    fixtures, queries = {}, []
+    with open(path) as f:
+        for line_number, line in enumerate(f):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if "query" in entry:
+                queries.append((entry.get("kind", "labelled"), entry["query"], entry["relevant"]))
+                continue
+            # A request-log entry: answer its title from a page holding only its body
+            page = f"requests/{entry.get('request_id', line_number)}.html"
+            fixtures[page] = text_page(f"Request {line_number}", entry["body"])
+            queries.append(("request", entry["title"], [page]))
+    if pages_directory:
+        for root, _, files in os.walk(pages_directory):
+            for name in files:
+                if name.endswith((".html", ".htm")):
+                    file_path = os.path.join(root, name)
+                    with open(file_path) as f:
+                        fixtures[os.path.relpath(file_path, pages_directory)] = f.read()
+    missing = {page for _, _, relevant in queries for page in relevant} - set(fixtures)
+    if missing:
+        raise SystemExit(f"Relevant pages not found under --pages: {sorted(missing)[:5]}")
+    return fixtures, queries
+
+
+def ranked_urls(documents):
+    """Distinct page URLs in rank order; a chunk shared by several pages counts for each of them."""
+    urls = []
+    for doc in documents:
+        for url in doc.metadata.get("source_urls") or [doc.metadata.get("url")]:
+            if url and url not in urls:
+                urls.append(url)
+    return urls
+
+
+def score(urls, relevant, k):
+    """(recall@k, reciprocal rank of the first relevant page) for one query."""
+    found = [url in relevant for url in urls]
+    recall = sum(found[:k]) / len(relevant)
+    return recall, next((1 / rank for rank, hit in enumerate(found, 1) if hit), 0.0)
+
+
+def ingest(service, fixtures):
+    html_bytes = sum(len(page.encode()) for page in fixtures.values())
+    with serve_pages(fixtures) as base_url:
+        start = time.perf_counter()
+        results = service.process_urls([base_url + path for path in fixtures])
+        service.flush_index()
+        elapsed = time.perf_counter() - start
+    failed = [result for result in results if result["status"] == "failed"]
+    if failed:
+        raise SystemExit(f"{len(failed)} fixture pages failed to index, e.g. {failed[0]}")
+    chunks = sum(result["chunks"] for result in results)
+    return base_url, {
+        "pages": len(fixtures),
+        "chunks": chunks,
+        "seconds": round(elapsed, 3),
+        "pages_per_s": round(len(fixtures) / elapsed, 1),
+        "chunks_per_s": round(chunks / elapsed, 1),
+        "mb_per_s": round(html_bytes / 1e6 / elapsed, 2),
+    }
+
+
+def replay(service, queries, base_url, k, score_threshold):
+    """Quality per query kind and stage latency percentiles over every query."""
+    from tracing import StageTimer
+
+    pipeline = service.get_chain(k=k, score_threshold=score_threshold)
+    service.get_response(queries[0][1], [], k=k, score_threshold=score_threshold)  # Warm up
+    per_kind, stages, totals = {}, {}, []
+    for kind, query, relevant in queries:
+        # Each query pays for the full pipeline, even if the set repeats one
+        service.response_cache.clear()
+        timer = StageTimer()
+        start = time.perf_counter()
+        with timer.bound():
+            service.get_response(query, [], k=k, score_threshold=score_threshold)
+        totals.append(time.perf_counter() - start)
+        for stage, ms in timer.timings.items():
+            stages.setdefault(stage, []).append(ms)
+
+        # Scored on the budget-fitted context the answer was generated from
+        documents = pipeline.budget.fit_documents(pipeline.retriever.invoke(query))
+        recall, reciprocal_rank = score(ranked_urls(documents), {base_url + page for page in relevant}, k)
+        kind_stats = per_kind.setdefault(kind, {"queries": 0, "recall": 0.0, "mrr": 0.0, "empty": 0})
+        kind_stats["queries"] += 1
+        kind_stats["recall"] += recall
+        kind_stats["mrr"] += reciprocal_rank
+        kind_stats["empty"] += not documents
+
+    quality = {}
+    for kind, kind_stats in [*per_kind.items(), ("all", None)]:
+        if kind_stats is None:
+            kind_stats = {name: sum(stats[name] for stats in per_kind.values())
+                          for name in ("queries", "recall", "mrr", "empty")}
+        count = kind_stats["queries"]
+        quality[kind] = {"queries": count, f"recall@{k}": round(kind_stats["recall"] / count, 4),
+                         "mrr": round(kind_stats["mrr"] / count, 4), "empty": round(kind_stats["empty"] / count, 4)}
+    latency = {stage: {f"p{pct}": round(percentile(samples, pct), 2) for pct in (50, 95, 99)}
+               for stage, samples in [*stages.items(), ("total", [seconds * 1000 for seconds in totals])]}
+    return quality, latency
+
+
+def git_revision():
+    """Short commit hash, marked dirty when the tree has uncommitted changes; None outside a checkout."""
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=repo, capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=repo,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ("-dirty" if dirty else "")
+
+
+def flatten(record, prefix=""):
+    flat = {}
+    for key, value in record.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def print_report(record, baseline=None):
+    settings = record["settings"]
+    print(f"commit {record['commit']}  backend={settings['backend']} chunk_size={settings['chunk_size']} "
+          f"chunk_overlap={settings['chunk_overlap']} k={settings['k']} "
+          f"score_threshold={settings['score_threshold']} hybrid={settings['hybrid']} mmr={settings['mmr']}")
+    if baseline is not None:
+        print(f"compared with commit {baseline['commit']} ({baseline['timestamp']})")
+        if baseline["settings"] != settings:
+            changed = sorted(key for key in settings if baseline["settings"].get(key) != settings[key])
+            print(f"settings differ: {', '.join(changed)}")
+    before = flatten(baseline) if baseline else {}
+    for metric, value in flatten(record).items():
+        if metric.startswith("settings."):
+            continue
+        line = f"{metric:>40} {value:>12g}"
+        if metric in before:
+            delta = value - before[metric]
+            line += f" {before[metric]:>12g} {delta:>+12g}"
+            if before[metric]:
+                line += f" {delta / before[metric]:>+8.1%}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", help="JSONL query set (default: a generated synthetic set)")
+    parser.add_argument("--pages", help="directory with the HTML pages labelled queries refer to")
+    parser.add_argument("--synthetic-pages", type=int, default=200)
+    parser.add_argument("--facts-per-page", type=int, default=3)
+    parser.add_argument("--vocabulary", type=int, default=100, help="words synthetic fact descriptions draw from")
+    parser.add_argument("--max-queries", type=int, default=0, help="replay a seeded sample of this many queries")
+    parser.add_argument("--backend", choices=["chroma", "local"], default="local")
+    parser.add_argument("--k", type=int, default=None, help="retriever k (default RETRIEVER_K)")
+    parser.add_argument("--score-threshold", type=float, default=None, help="default RETRIEVER_SCORE_THRESHOLD")
+    parser.add_argument("--llm-latency", type=float, default=0.0)
+    parser.add_argument("--embed-latency", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="append this run's JSON record to a JSONL file")
+    parser.add_argument("--compare", help="JSONL file of earlier records; show changes from the last on this query set")
+    args = parser.parse_args()
+
+    from config import (CHUNK_SIZE, CHUNK_OVERLAP, RETRIEVER_K, RETRIEVER_SCORE_THRESHOLD, RETRIEVER_HYBRID,
+                        RETRIEVER_MMR)
+
+    k = args.k if args.k is not None else RETRIEVER_K
+    score_threshold = args.score_threshold if args.score_threshold is not None else RETRIEVER_SCORE_THRESHOLD
+    rng = random.Random(args.seed)
+    if args.queries:
+        fixtures, queries = load_query_set(args.queries, args.pages)
+    else:
+        fixtures, queries = synthetic_query_set(args.synthetic_pages, args.facts_per_page, args.vocabulary, rng)
+    if args.max_queries and len(queries) > args.max_queries:
+        queries = rng.sample(queries, args.max_queries)
+
+    rss_start = rss_mb()
+    with tempfile.TemporaryDirectory() as persist_directory:
+        service = make_rag_service(persist_directory, backend=args.backend, llm_latency=args.llm_latency,
+                                   embed_latency=args.embed_latency, flush_interval=0)
+        base_url, ingest_stats = ingest(service, fixtures)
+        rss_indexed = rss_mb()
+        quality, latency = replay(service, queries, base_url, k, score_threshold)
+        memory = {
+            "rss_indexed_mb": round(rss_indexed - rss_start, 1),
+            "rss_replayed_mb": round(rss_mb() - rss_start, 1),
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        }
+        service.vector_store_manager.close()
+
+    record = {
+        "commit": git_revision(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "settings": {
+            "query_set": os.path.basename(args.queries) if args.queries else
+            f"synthetic:{args.synthetic_pages}x{args.facts_per_page}/{args.vocabulary}",
+            "queries": len(queries), "seed": args.seed, "backend": args.backend,
+            "chunk_size": CHUNK_SIZE, "chunk_overlap": CHUNK_OVERLAP, "k": k, "score_threshold": score_threshold,
+            "hybrid": RETRIEVER_HYBRID, "mmr": RETRIEVER_MMR,
+            "llm_latency": args.llm_latency, "embed_latency": args.embed_latency,
+        },
+        "ingest": ingest_stats,
+        "quality": quality,
+        "latency_ms": latency,
+        "memory": memory,
+    }
+
+    baseline = None
+    if args.compare and os.path.exists(args.compare):
+        with open(args.compare) as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        # The last run on the same query set, else the last run of any kind
+        same_set = [earlier for earlier in records
+                    if earlier["settings"]["query_set"] == record["settings"]["query_set"]]
+        baseline = (same_set or records or [None])[-1]
+    print_report(record, baseline)
+    if args.output:
+        with open(args.output, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Recall@k and latency of the vector-only retriever vs hybrid BM25 + vector fusion.
+
+Builds a synthetic corpus in which every chunk carries a unique identifier (an
+error code or product name), a short description and generic filler prose, then
+asks two kinds of questions: exact-identifier lookups and descriptive questions
+without the identifier. Runs on fake hashing embeddings, so absolute recall says
+nothing about OpenAI embeddings; the gap on identifier queries is the point.
+
+    python -m benchmarks.bench_retrieval --chunks 2000 --queries 200
+"""
+import argparse
+import random
+import tempfile
+import time
+
+from langchain_core.documents import Document
+
+from benchmarks.bench_concurrency import percentile
+from benchmarks.fakes import make_rag_service
+
+FILLER = ("the service reports this condition when the request cannot be completed and "
+          "operators should review the logs configuration and recent changes before retrying").split()
+
+
+def make_corpus(chunks, rng):
+    """Return the documents plus (identifier, description words) for each one."""
+    vocabulary = ["".join(rng.choices("bcdfghjklmnprstvz", k=3)) + rng.choice(["ing", "er", "ion", "al"])
+                  for _ in range(max(500, chunks // 4))]
+    documents, facts = [], []
+    for i in range(chunks):
+        identifier = rng.choice([f"ERR-{i:05d}", f"Zentrix-{i}X", f"QX{i}"])
+        description = rng.sample(vocabulary, 6)
+        prose = " ".join(rng.choices(FILLER, k=30))
+        text = f"{identifier}: {' '.join(description)}. {prose}"
+        documents.append(Document(page_content=text,
+                                  metadata={"doc_id": str(i), "url": f"https://docs.example.com/{i}",
+                                            "url_hash": f"{i:032x}"}))
+        facts.append((identifier, description))
+    return documents, facts
+
+
+def evaluate(retriever, queries, k):
+    """Return (recall@k, share of queries with no results, per-query latencies)."""
+    hits, empty, latencies = 0, 0, []
+    for query, relevant in queries:
+        start = time.perf_counter()
+        results = retriever.invoke(query)
+        latencies.append(time.perf_counter() - start)
+        hits += any(doc.metadata.get("doc_id") == relevant for doc in results[:k])
+        empty += not results
+    return hits / len(queries), empty / len(queries), latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--score-threshold", type=float, default=0.6)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as persist_directory:
+        rag_service = make_rag_service(persist_directory)
+        documents, facts = make_corpus(args.chunks, rng)
+        rag_service.vector_store_manager.write_chunks(documents)
+
+        sample = rng.sample(range(args.chunks), min(args.queries, args.chunks))
+        query_sets = {
+            "identifier": [(f"What does {facts[i][0]} mean?", str(i)) for i in sample],
+            "descriptive": [(" ".join(rng.sample(facts[i][1], 4)), str(i)) for i in sample],
+        }
+        retrievers = {
+            "vector": rag_service.get_retriever(args.k, args.score_threshold, hybrid=False),
+            "hybrid": rag_service.get_retriever(args.k, args.score_threshold, hybrid=True),
+        }
+
+        print(f"{args.chunks} chunks, {len(sample)} queries per set, k={args.k}, "
+              f"score_threshold={args.score_threshold}")
+        print(f"{'retriever':>9} {'queries':>11} {f'recall@{args.k}':>10} {'empty':>6} {'p50 ms':>8} {'p99 ms':>8}")
+        for set_name, queries in query_sets.items():
+            for name, retriever in retrievers.items():
+                retriever.invoke(queries[0][0])  # Warm up
+                recall, empty, latencies = evaluate(retriever, queries, args.k)
+                print(f"{name:>9} {set_name:>11} {recall:>10.3f} {empty:>6.2f} "
+                      f"{percentile(latencies, 50) * 1000:>8.2f} {percentile(latencies, 99) * 1000:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Import time and time to healthy/ready for the API, with lazy imports and background warmup vs eager startup.
+
+Each measurement runs in a fresh interpreter so imports are cold. "lazy" is the
+app as shipped: /healthz answers as soon as main is imported and the startup
+hook has run, and /readyz flips once the background warmup has loaded the index
+and built the default chain. "eager" imports the heavy modules up front and
+warms up before serving, as the app did before. Indexes are prefilled with
+fake embeddings, so only load time differs between sizes.
+
+    python -m benchmarks.bench_startup --chunks 0 10000 50000 --backend local
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.fakes import make_rag_service
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child; the clock starts before anything of the app is imported
+CHILD = r"""
+import time
+start = time.perf_counter()
+import sys
+eager = sys.argv[1] == "eager"
+if eager:
+    import rag_service, index_service, chromadb, langchain_openai
+    from langchain.chains.combine_documents import create_stuff_documents_chain
+import main
+imported = time.perf_counter() - start
+import asyncio, json, httpx
+
+def build_rag_service(tenant):
+    from benchmarks.fakes import make_rag_service
+    return make_rag_service(sys.argv[2], backend=sys.argv[3])
+
+main.build_rag_service = build_rag_service
+
+async def run():
+    if eager:
+        main.warmup.start()
+        main.warmup.wait()
+    await main.app.router.startup()
+    result = {"import": imported}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench") as client:
+        for probe in ("healthz", "readyz"):
+            while (await client.get("/" + probe)).status_code != 200:
+                await asyncio.sleep(0.01)
+            result[probe] = time.perf_counter() - start
+    await main.app.router.shutdown()
+    print(json.dumps(result))
+
+asyncio.run(run())
+"""
+
+
+def prefill(persist_directory, chunks, backend):
+    from langchain_core.documents import Document
+
+    rag_service = make_rag_service(persist_directory, backend=backend, dedup=False)
+    manager = rag_service.vector_store_manager
+    batch = 1000
+    for offset in range(0, chunks, batch):
+        manager.write_chunks([
+            Document(page_content=f"Chunk {i} of the startup benchmark corpus.",
+                     metadata={"url": f"https://example.com/{i // 20}", "url_hash": f"{i // 20:032x}"})
+            for i in range(offset, min(offset + batch, chunks))
+        ])
+    manager.close()
+
+
+def measure(mode, persist_directory, backend):
+    with tempfile.TemporaryDirectory() as workdir:
+        # Sessions, jobs and other sqlite stores are created relative to the working directory
+        env = dict(os.environ, PYTHONPATH=ROOT)
+        output = subprocess.run([sys.executable, "-c", CHILD, mode, persist_directory, backend],
+                                cwd=workdir, env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, nargs="+", default=[0, 10000])
+    parser.add_argument("--backend", choices=["chroma", "local"], default="local")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'chunks':>8} {'mode':>6} {'import s':>9} {'healthy s':>10} {'ready s':>8}")
+    for chunks in args.chunks:
+        with tempfile.TemporaryDirectory() as persist_directory:
+            start = time.perf_counter()
+            prefill(persist_directory, chunks, args.backend)
+            print(f"(prefilled {chunks} chunks in {time.perf_counter() - start:.1f}s)")
+            for mode in ("eager", "lazy"):
+                runs = [measure(mode, persist_directory, args.backend) for _ in range(args.repeats)]
+                best = {key: min(run[key] for run in runs) for key in runs[0]}
+                print(f"{chunks:>8} {mode:>6} {best['import']:>9.2f} {best['healthz']:>10.2f} {best['readyz']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""A quiet tenant's chat latency next to a noisy one: shared vs per-tenant collections, with and without limits.
+
+Prefills a small collection for the quiet tenant and a large one for the noisy
+tenant, either into one shared collection (every client searching everything, as
+before tenants) or into a collection per tenant. The quiet tenant then chats at
+a steady pace, alone and while the noisy tenant floods /api/v1/index/batch from
+concurrent clients, once with limits effectively off and once with the default
+per-tenant limits. Runs in-process against the ASGI app with fake model backends.
+
+    python -m benchmarks.bench_tenants --noisy-chunks 100000 --quiet-chunks 2000
+"""
+import argparse
+import asyncio
+import math
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.bench_concurrency import percentile
+from benchmarks.fakes import make_rag_service
+from benchmarks.fixtures import WORDS, make_html_page, serve_pages
+
+UNLIMITED = {"rate": math.inf, "burst": math.inf, "concurrency": math.inf}
+
+
+def prefill(manager, tenant, chunks):
+    from langchain_core.documents import Document
+
+    rng = random.Random(tenant)
+    for offset in range(0, chunks, 2000):
+        manager.write_chunks([
+            Document(page_content=f"{tenant} chunk {i}: {' '.join(rng.choices(WORDS, k=30))}.",
+                     metadata={"url": f"https://{tenant}.example.com/{i // 20}", "url_hash": f"{tenant}{i // 20:026x}"})
+            for i in range(offset, min(offset + 2000, chunks))
+        ])
+    manager.flush()
+
+
+async def quiet_chats(client, headers, chats, interval, tag):
+    latencies = []
+    for i in range(chats):
+        start = time.perf_counter()
+        # Distinct queries across scenarios too, so the response cache never answers
+        response = await client.post("/api/v1/chat", headers=headers,
+                                     json={"query": f"What is said about {WORDS[i % len(WORDS)]} in {tag} note {i}?"})
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(max(0.0, interval - latencies[-1]))
+    return latencies
+
+
+async def flood(client, headers, urls, batch, stop):
+    """Submit index batches back to back until stop is set; return (URLs accepted, requests refused)."""
+    accepted = refused = 0
+    while not stop.is_set():
+        chunk = [urls.pop() for _ in range(min(batch, len(urls)))]
+        if not chunk:
+            break
+        response = await client.post("/api/v1/index/batch", json={"urls": chunk}, headers=headers)
+        if response.status_code == 429:
+            refused += 1
+            urls.extend(chunk)
+            await asyncio.sleep(0.05)
+        else:
+            response.raise_for_status()
+            accepted += len(chunk)
+    return accepted, refused
+
+
+async def scenario(client, args, keys, urls, flooding, tag):
+    stop = asyncio.Event()
+    floods = [asyncio.create_task(flood(client, keys["noisy"], urls, args.batch, stop))
+              for _ in range(args.flood_clients if flooding else 0)]
+    latencies = await quiet_chats(client, keys["quiet"], args.chats, args.chat_interval, tag)
+    stop.set()
+    results = await asyncio.gather(*floods)
+    return latencies, sum(a for a, _ in results), sum(r for _, r in results)
+
+
+async def run(args, root):
+    import main
+    from config import (API_CLIENT_ID, TENANT_CHAT_RATE, TENANT_CHAT_BURST, TENANT_CHAT_CONCURRENCY,
+                        TENANT_INDEX_RATE, TENANT_INDEX_BURST, TENANT_INDEX_CONCURRENCY)
+    from tenant_limits import TenantLimiter
+    from tenants import TenantRegistry
+
+    limits = {
+        "chat": {"rate": TENANT_CHAT_RATE, "burst": TENANT_CHAT_BURST, "concurrency": TENANT_CHAT_CONCURRENCY},
+        "index": {"rate": TENANT_INDEX_RATE, "burst": TENANT_INDEX_BURST, "concurrency": TENANT_INDEX_CONCURRENCY},
+    }
+    keys = {tenant: {"X-Client-ID": tenant, "X-API-Key": main.auth_service.key_store.add(tenant)}
+            for tenant in ("quiet", "noisy")}
+    rng = random.Random(0)
+    pages = {f"flood/{i}.html": make_html_page(f"Flood page {i}", paragraphs=args.paragraphs, rng=rng)
+             for i in range(args.pages)}
+
+    def build(directory):
+        return make_rag_service(directory, backend=args.backend, llm_latency=args.llm_latency, flush_interval=1.0)
+
+    main.build_rag_service = lambda tenant: build(os.path.join(root, "default"))
+    await main.app.router.startup()
+    main.warmup.wait()
+
+    print(f"{'collections':>11} {'noisy':>10} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'urls in':>8} {'429s':>6}")
+    with serve_pages(pages) as base_url:
+        for layout in ("shared", "per-tenant"):
+            if layout == "shared":
+                shared = build(os.path.join(root, "shared"))
+                services = {"quiet": shared, "noisy": shared}
+            else:
+                services = {tenant: build(os.path.join(root, tenant)) for tenant in ("quiet", "noisy")}
+            prefill(services["quiet"].vector_store_manager, "quiet", args.quiet_chunks)
+            prefill(services["noisy"].vector_store_manager, "noisy", args.noisy_chunks)
+            for service in set(services.values()):
+                service.warm_up()
+            main.tenants = TenantRegistry(lambda tenant: services[tenant], API_CLIENT_ID)
+            urls = [f"{base_url}{path}?{layout}" for path in pages]
+
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench",
+                                         timeout=600) as client:
+                for noisy, limiter in (("idle", None), ("unlimited", {"chat": UNLIMITED, "index": UNLIMITED}),
+                                       ("limited", limits)):
+                    main.tenant_limits = TenantLimiter(limiter or limits)
+                    latencies, accepted, refused = await scenario(client, args, keys, urls, limiter is not None,
+                                                                     f"{layout} {noisy}")
+                    print(f"{layout:>11} {noisy:>10} {statistics.median(latencies) * 1000:>8.1f} "
+                          f"{percentile(latencies, 95) * 1000:>8.1f} {max(latencies) * 1000:>8.1f} "
+                          f"{accepted:>8} {refused:>6}")
+            for service in set(services.values()):
+                service.vector_store_manager.close()
+    await main.app.router.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quiet-chunks", type=int, default=2000)
+    parser.add_argument("--noisy-chunks", type=int, default=50000)
+    parser.add_argument("--backend", choices=["chroma", "local"], default="local")
+    parser.add_argument("--chats", type=int, default=40, help="quiet tenant chats per scenario")
+    parser.add_argument("--chat-interval", type=float, default=0.25, help="seconds between the quiet tenant's chats")
+    parser.add_argument("--llm-latency", type=float, default=0.0)
+    parser.add_argument("--flood-clients", type=int, default=4)
+    parser.add_argument("--batch", type=int, default=10, help="URLs per noisy index request")
+    parser.add_argument("--pages", type=int, default=2000, help="distinct pages the noisy tenant can index")
+    parser.add_argument("--paragraphs", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root, tempfile.TemporaryDirectory() as workdir:
+        # Sessions, keys, jobs and other sqlite stores are created relative to the working directory
+        os.chdir(workdir)
+        asyncio.run(run(args, root))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Load time, query latency and memory of the Chroma backend vs the local memory-mapped backend.
+
+The local backend runs as local (exact flat scan) and local-hnsw (approximate
+HNSW graph). Each (backend, size) pair is built once from random unit vectors, then reopened
+in a fresh process that reports the time to open the store, query latency over
+random query vectors and the process's resident set size before and after the
+queries. 1M chunks at the default dimension needs a few GB of disk and takes a
+while to build, so it is opt-in via --sizes.
+
+    python -m benchmarks.bench_vector_backends --sizes 10000 100000 --dim 384
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import chromadb
+import numpy as np
+
+from benchmarks.bench_concurrency import percentile
+from benchmarks.fakes import FakeEmbeddings
+from local_vector_store import LocalVectorStore
+from vector_backends import ChromaBackend
+
+# Below Chroma's maximum batch size
+BUILD_BATCH = 5000
+
+
+def rss_mb():
+    """Resident set size of this process in MB, from /proc (Linux only)"""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def open_backend(backend, directory, dim):
+    if backend in ("local", "local-hnsw"):
+        return LocalVectorStore(os.path.join(directory, "local_index"),
+                                index="hnsw" if backend == "local-hnsw" else "flat", hnsw_save_interval=0)
+    settings = chromadb.config.Settings(is_persistent=True, persist_directory=directory, anonymized_telemetry=False)
+    return ChromaBackend(directory, FakeEmbeddings(dim), settings)
+
+
+def build(backend, directory, size, dim, seed):
+    store = open_backend(backend, directory, dim)
+    rng = np.random.default_rng(seed)
+    for start in range(0, size, BUILD_BATCH):
+        stop = min(start + BUILD_BATCH, size)
+        vectors = rng.standard_normal((stop - start, dim), dtype=np.float32)
+        store.upsert(
+            ids=[f"chunk-{i}" for i in range(start, stop)],
+            embeddings=vectors.tolist(),
+            metadatas=[{"url_hash": f"{i // 10:032x}", "chunk_index": i % 10} for i in range(start, stop)],
+            documents=[f"chunk {i}" for i in range(start, stop)],
+        )
+    store.persist()
+
+
+def measure(backend, directory, dim, queries, k, seed):
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    store = open_backend(backend, directory, dim)
+    store.count()
+    load_s = time.perf_counter() - start
+    rss_loaded = rss_mb()
+
+    rng = np.random.default_rng(seed + 1)
+    query_vectors = rng.standard_normal((queries, dim), dtype=np.float32).tolist()
+    store.query(query_embeddings=[query_vectors[0]], n_results=k)  # Warm up
+    latencies = []
+    for vector in query_vectors:
+        start = time.perf_counter()
+        store.query(query_embeddings=[vector], n_results=k)
+        latencies.append(time.perf_counter() - start)
+    return {
+        "load_s": load_s,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "rss_loaded_mb": rss_loaded - rss_before,
+        "rss_queried_mb": rss_mb() - rss_before,
+    }
+
+
+def run_worker(*args):
+    """Run one phase in a fresh interpreter so load time and RSS are not skewed by earlier runs"""
+    output = subprocess.run([sys.executable, "-m", "benchmarks.bench_vector_backends", "--worker", *map(str, args)],
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backends", nargs="+", default=["chroma", "local", "local-hnsw"],
+                        choices=["chroma", "local", "local-hnsw"])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--worker", nargs=3, metavar=("PHASE", "BACKEND", "DIRECTORY"), help=argparse.SUPPRESS)
+    parser.add_argument("--size", type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        phase, backend, directory = args.worker
+        if phase == "build":
+            start = time.perf_counter()
+            build(backend, directory, args.size, args.dim, args.seed)
+            print(json.dumps({"build_s": time.perf_counter() - start}))
+        else:
+            print(json.dumps(measure(backend, directory, args.dim, args.queries, args.k, args.seed)))
+        return
+
+    print(f"dim={args.dim}, {args.queries} queries, k={args.k}")
+    print(f"{'backend':>10} {'chunks':>8} {'build s':>8} {'load s':>7} {'p50 ms':>8} {'p99 ms':>8} "
+          f"{'RSS load MB':>11} {'RSS query MB':>12}")
+    for size in args.sizes:
+        for backend in args.backends:
+            common = ["--dim", args.dim, "--seed", args.seed]
+            with tempfile.TemporaryDirectory() as directory:
+                built = run_worker("build", backend, directory, "--size", size, *common)
+                result = run_worker("measure", backend, directory, "--queries", args.queries, "--k", args.k, *common)
+            print(f"{backend:>10} {size:>8} {built['build_s']:>8.1f} {result['load_s']:>7.2f} "
+                  f"{result['p50_ms']:>8.2f} {result['p99_ms']:>8.2f} "
+                  f"{result['rss_loaded_mb']:>11.1f} {result['rss_queried_mb']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
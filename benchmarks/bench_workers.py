@@ -0,0 +1,165 @@
+"""Memory, chat throughput and write visibility with one writer and N read-only reader workers.
+
+Prefills a local-backend index, starts a writer and N reader processes (each a
+uvicorn server with fake model backends), then reports per-reader resident and
+private memory next to the size of the vector file, chat requests per second
+spread round-robin over the readers, and how long a page indexed through the
+writer takes to show up in a reader's answers.
+
+    python -m benchmarks.bench_workers --chunks 50000 --readers 1 2 4
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.fakes import make_rag_service
+from benchmarks.fixtures import serve_pages
+from config import API_CLIENT_ID, API_KEY
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEADERS = {"X-Client-ID": API_CLIENT_ID, "X-API-Key": API_KEY}
+WORDS = ["retrieval", "embedding", "vector", "index", "latency", "cache", "token", "prompt", "chunk", "ranking"]
+
+SERVER = r"""
+import os, sys
+import main, uvicorn
+from benchmarks.fakes import make_rag_service
+main.build_rag_service = lambda tenant: make_rag_service(sys.argv[1], backend="local", flush_interval=float(sys.argv[3]),
+                                                         read_only=os.environ["RAG_SERVING_ROLE"] == "reader")
+uvicorn.run(main.app, host="127.0.0.1", port=int(sys.argv[2]), log_level="warning")
+"""
+
+
+def prefill(persist_directory, chunks):
+    from langchain_core.documents import Document
+
+    rag_service = make_rag_service(persist_directory, backend="local", dedup=False)
+    manager = rag_service.vector_store_manager
+    for offset in range(0, chunks, 2000):
+        manager.write_chunks([
+            Document(page_content=f"Chunk {i} about {WORDS[i % len(WORDS)]} and {WORDS[i * 7 % len(WORDS)]}.",
+                     metadata={"url": f"https://example.com/{i // 20}", "url_hash": f"{i // 20:032x}"})
+            for i in range(offset, min(offset + 2000, chunks))
+        ])
+    manager.close()
+
+
+def start_server(role, persist_directory, port, workdir, flush_interval):
+    env = dict(os.environ, PYTHONPATH=ROOT, RAG_SERVING_ROLE=role, RAG_WRITER_URL="http://127.0.0.1:18100",
+               API_KEY=API_KEY, API_CLIENT_ID=API_CLIENT_ID)
+    return subprocess.Popen([sys.executable, "-c", SERVER, persist_directory, str(port), str(flush_interval)],
+                            cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+async def wait_ready(client, ports, timeout=300.0):
+    deadline = time.monotonic() + timeout
+    for port in ports:
+        while True:
+            try:
+                if (await client.get(f"http://127.0.0.1:{port}/readyz")).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Server on port {port} did not become ready")
+            await asyncio.sleep(0.2)
+
+
+def memory_kb(pid):
+    """Rss, Pss and private (not shared with any other process) memory of a process, from smaps_rollup."""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return fields["Rss"], fields["Pss"], fields["Private_Clean"] + fields["Private_Dirty"]
+
+
+async def chat_throughput(client, ports, requests, concurrency):
+    queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(i)
+
+    async def worker():
+        while not queue.empty():
+            i = queue.get_nowait()
+            # Distinct queries, so per-worker response caches never answer
+            query = f"What is said about {WORDS[i % len(WORDS)]} in chunk {i}?"
+            response = await client.post(f"http://127.0.0.1:{ports[i % len(ports)]}/api/v1/chat",
+                                         json={"query": query}, headers=HEADERS)
+            response.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return requests / (time.perf_counter() - start)
+
+
+async def visibility_lag(client, reader_port):
+    """Seconds from indexing a page through a reader (forwarded to the writer) until a reader retrieves it."""
+    token = f"zq{int(time.time() * 1000)}"
+    page = f"<html><body><article><p>The marker {token} is defined on this page only.</p></article></body></html>"
+    with serve_pages({"marker.html": page}) as base_url:
+        response = await client.post(f"http://127.0.0.1:{reader_port}/api/v1/index/batch",
+                                     json={"urls": [base_url + "/marker.html"]}, headers=HEADERS)
+        response.raise_for_status()
+    start = time.perf_counter()
+    while True:
+        response = await client.post(f"http://127.0.0.1:{reader_port}/api/v1/chat",
+                                     json={"query": f"What is {token}?"}, headers=HEADERS)
+        if response.json().get("sources"):
+            return time.perf_counter() - start
+        await asyncio.sleep(0.05)
+
+
+async def run(args, persist_directory, workdir, readers):
+    writer = start_server("writer", persist_directory, 18100, workdir, args.flush_interval)
+    reader_ports = [18101 + i for i in range(readers)]
+    processes = [writer]
+    try:
+        async with httpx.AsyncClient(timeout=120) as client:
+            await wait_ready(client, [18100])
+            processes += [start_server("reader", persist_directory, port, workdir, args.flush_interval)
+                          for port in reader_ports]
+            await wait_ready(client, reader_ports)
+            throughput = await chat_throughput(client, reader_ports, args.requests, args.concurrency)
+            memory = [memory_kb(process.pid) for process in processes[1:]]
+            lag = await visibility_lag(client, reader_ports[0])
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+    return throughput, memory, lag
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=50000)
+    parser.add_argument("--readers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--flush-interval", type=float, default=1.0, help="writer's vector store flush interval")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as persist_directory, tempfile.TemporaryDirectory() as workdir:
+        start = time.perf_counter()
+        prefill(persist_directory, args.chunks)
+        vectors_mb = os.path.getsize(os.path.join(persist_directory, "local_index", "vectors.f32")) / 1e6
+        print(f"Prefilled {args.chunks} chunks in {time.perf_counter() - start:.1f}s; "
+              f"vector file {vectors_mb:.1f} MB; {os.cpu_count()} CPU cores")
+        print(f"{'readers':>7} {'chat/s':>8} {'rss MB':>8} {'pss MB':>8} {'private MB':>11} {'visible s':>10}")
+        for readers in args.readers:
+            throughput, memory, lag = asyncio.run(run(args, persist_directory, workdir, readers))
+            rss, pss, private = (sum(values) / len(values) / 1000 for values in zip(*memory))
+            print(f"{readers:>7} {throughput:>8.1f} {rss:>8.1f} {pss:>8.1f} {private:>11.1f} {lag:>10.2f}")
+        print("Memory is the mean per reader; vectors are mapped from the shared page cache, not copied.")
+
+
+if __name__ == "__main__":
+    main()
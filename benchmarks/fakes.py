@@ -0,0 +1,125 @@
+"""Local stand-ins for the OpenAI chat and embedding models used by the benchmarks."""
+import asyncio
+import hashlib
+import math
+import os
+import re
+import time
+from typing import Any, AsyncIterator, List, Optional
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic bag-of-words hashing embeddings with an optional simulated latency."""
+
+    def __init__(self, dim: int = 256, latency: float = 0.0):
+        self.dim = dim
+        self.latency = latency
+        self.calls = 0
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dim
+        for token in re.findall(r"\w+", text.lower()):
+            digest = hashlib.md5(token.encode()).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dim
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model that echoes the last message with a citation after a fixed latency."""
+
+    latency: float = 0.0
+    answer_template: str = "Based on the context [1], here is what I found about: {input}"
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _answer(self, messages: List[BaseMessage]) -> ChatResult:
+        text = self.answer_template.format(input=messages[-1].content[:200])
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        if self.latency:
+            time.sleep(self.latency)
+        return self._answer(messages)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._answer(messages)
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        # Spread the latency over the tokens so time-to-first-token is measurable
+        text = self._answer(messages).generations[0].message.content
+        tokens = re.findall(r"\S+\s*", text)
+        for token in tokens:
+            if self.latency:
+                await asyncio.sleep(self.latency / len(tokens))
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+
+def make_rag_service(persist_directory: str, llm_latency: float = 0.0, embed_latency: float = 0.0,
+                     embedding_cache_path: Optional[str] = None, backend: str = "chroma",
+                     flush_interval: float = 30.0, dedup: bool = True, read_only: bool = False):
+    """Build a RAGService over a throwaway persistent vector store with fake model backends.
+
+    The embedding cache is off unless a path is given, so the fake latency is always paid.
+    """
+    from index_service import VectorStoreManager
+    from rag_service import RAGService
+
+    client_settings = None
+    if backend == "chroma":
+        import chromadb
+
+        client_settings = chromadb.config.Settings(
+            is_persistent=True,
+            persist_directory=persist_directory,
+            anonymized_telemetry=False,
+        )
+    vector_store_manager = VectorStoreManager(
+        persist_directory,
+        embedding_function=FakeEmbeddings(latency=embed_latency),
+        client_settings=client_settings,
+        embedding_cache_path=embedding_cache_path,
+        stats_store_path=os.path.join(persist_directory, "collection_stats.sqlite"),
+        bm25_index_path=os.path.join(persist_directory, "bm25_index.sqlite"),
+        backend=backend,
+        wal_path=os.path.join(persist_directory, "vector_store_wal.sqlite"),
+        flush_interval=flush_interval,
+        dedup_index_path=os.path.join(persist_directory, "dedup_index.sqlite") if dedup else None,
+        read_only=read_only,
+    )
+    return RAGService(
+        persist_directory,
+        vector_store_manager=vector_store_manager,
+        llm_factory=lambda model: FakeChatModel(latency=llm_latency),
+    )
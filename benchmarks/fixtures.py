@@ -0,0 +1,69 @@
+"""Local HTML pages served over HTTP, so ingestion runs end to end without the network."""
+import functools
+import http.server
+import os
+import random
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Sequence
+
+WORDS = ("index vector query chunk embedding latency cache shard replica token model answer page crawl "
+         "retrieval ranking score batch queue worker process memory disk network request response").split()
+
+
+def make_html_page(title: str, paragraphs: int = 20, rng: Optional[random.Random] = None,
+                   facts: Sequence[str] = ()) -> str:
+    """An article page with the usual navigation, header, footer and script around the content.
+
+    facts are sentences placed as paragraphs in the middle of the filler prose.
+    """
+    rng = rng or random.Random(title)
+    filler = [f"<p>{' '.join(rng.choices(WORDS, k=rng.randint(40, 120)))}.</p>" for _ in range(paragraphs)]
+    filler[paragraphs // 2:paragraphs // 2] = [f"<p>{fact}</p>" for fact in facts]
+    body = "\n".join(filler)
+    return f"""<!DOCTYPE html>
+<html lang="en">
+<head><title>{title}</title><meta name="description" content="About {title}">
+<style>body {{ font-family: sans-serif; }}</style>
+<script>window.analytics = {{track: function() {{}}}};</script></head>
+<body>
+<header><a href="/">Home</a> <a href="/docs">Docs</a> <a href="/blog">Blog</a></header>
+<nav><ul><li>Getting started</li><li>Guides</li><li>API reference</li><li>Changelog</li></ul></nav>
+<main><article><h1>{title}</h1>
+{body}
+</article></main>
+<aside>Related: other pages you may like</aside>
+<footer>Copyright Example Inc. All rights reserved. Privacy | Terms</footer>
+</body></html>"""
+
+
+class _QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def serve_pages(pages: Dict[str, str], directory: Optional[str] = None) -> Iterator[str]:
+    """Serve {path: html} from directory (a temporary one by default) and yield the base URL.
+
+    SimpleHTTPRequestHandler sends Last-Modified and answers If-Modified-Since with
+    304, so conditional re-crawls work against the fixtures too. Files are read per
+    request, so a page rewritten in directory is served changed on the next fetch.
+    """
+    with tempfile.TemporaryDirectory() as scratch:
+        directory = directory or scratch
+        for path, html in pages.items():
+            file_path = os.path.join(directory, path.lstrip("/"))
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            with open(file_path, "w") as f:
+                f.write(html)
+        handler = functools.partial(_QuietHandler, directory=directory)
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            yield f"http://127.0.0.1:{server.server_port}/"
+        finally:
+            server.shutdown()
+            server.server_close()
@@ -0,0 +1,221 @@
+import heapq
+import json
+import math
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Words too common to help lexical matching; everything else, including codes like
+# "err-504" or "gpt-3.5", is kept as a term
+STOP_WORDS = frozenset("""
+a an and are as at be but by can do does for from has have how i in is it its of on or
+that the this to was what when where which who why will with you your
+""".split())
+
+
+class BM25Index:
+    """Inverted-index BM25 search over chunk text, kept in sync with the vector store.
+
+    Postings live in memory for fast scoring; each chunk's term frequencies are
+    also written to SQLite so the index is reloaded, not rebuilt, on restart.
+    Every change is also appended to a change log kept for change_log_seconds, so
+    a replica in another process can refresh() by applying only what changed.
+    """
+
+    def __init__(self, path: str, k1: float = 1.5, b: float = 0.75, change_log_seconds: float = 3600.0):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.change_log_seconds = change_log_seconds
+        self._log_pruned_at = 0.0
+        self._lock = threading.Lock()
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._lengths: Dict[str, int] = {}
+        self._terms: Dict[str, List[str]] = {}
+        self._ids_by_url: Dict[str, Set[str]] = {}
+        self._url_of: Dict[str, str] = {}
+        self._total_length = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS bm25_chunks (
+                id TEXT PRIMARY KEY,
+                url_hash TEXT NOT NULL,
+                term_counts TEXT NOT NULL
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS bm25_chunks_url ON bm25_chunks(url_hash)")
+        # One row per changed chunk (id), removed URL (url_hash only) or rebuild (neither)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS bm25_changes (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                id TEXT,
+                url_hash TEXT,
+                changed_at REAL NOT NULL
+            )""")
+        self._conn.commit()
+        # Read before the chunks, so changes committed while they load are applied again, not missed
+        self._seen_seq = self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM bm25_changes").fetchone()[0]
+        for chunk_id, url_hash, term_counts in self._conn.execute("SELECT * FROM bm25_chunks"):
+            self._index(chunk_id, url_hash, json.loads(term_counts))
+
+    @staticmethod
+    def tokenize(text: str) -> List[str]:
+        """Lowercased terms; compound tokens are also split so 'gpt-3.5' matches 'gpt'."""
+        terms = []
+        for token in re.findall(r"\w+(?:[-._/]\w+)*", text.lower()):
+            if token in STOP_WORDS:
+                continue
+            terms.append(token)
+            parts = re.findall(r"\w+", token)
+            if len(parts) > 1:
+                terms.extend(part for part in parts if part not in STOP_WORDS)
+        return terms
+
+    def _index(self, chunk_id: str, url_hash: str, term_counts: Dict[str, int]):
+        if chunk_id in self._lengths:
+            self._unindex(chunk_id)
+        for term, count in term_counts.items():
+            self._postings.setdefault(term, {})[chunk_id] = count
+        length = sum(term_counts.values())
+        self._lengths[chunk_id] = length
+        self._terms[chunk_id] = list(term_counts)
+        self._ids_by_url.setdefault(url_hash, set()).add(chunk_id)
+        self._url_of[chunk_id] = url_hash
+        self._total_length += length
+
+    def _unindex(self, chunk_id: str):
+        for term in self._terms.pop(chunk_id, []):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(chunk_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_length -= self._lengths.pop(chunk_id, 0)
+        url_hash = self._url_of.pop(chunk_id, None)
+        ids = self._ids_by_url.get(url_hash)
+        if ids is not None:
+            ids.discard(chunk_id)
+            if not ids:
+                del self._ids_by_url[url_hash]
+
+    def _log_changes(self, changes: List[Tuple[Optional[str], Optional[str]]]):
+        """Append (chunk_id, url_hash) changes for replicas and drop expired ones (lock held, caller commits)."""
+        now = time.time()
+        self._conn.executemany("INSERT INTO bm25_changes (id, url_hash, changed_at) VALUES (?, ?, ?)",
+                               [(chunk_id, url_hash, now) for chunk_id, url_hash in changes])
+        if now - self._log_pruned_at > 60:
+            self._conn.execute("DELETE FROM bm25_changes WHERE changed_at < ?", (now - self.change_log_seconds,))
+            self._log_pruned_at = now
+
+    def add(self, chunks: Iterable[Tuple[str, str, str]]):
+        """Index (chunk_id, url_hash, text) triples."""
+        rows = []
+        with self._lock:
+            for chunk_id, url_hash, text in chunks:
+                term_counts = dict(Counter(self.tokenize(text)))
+                self._index(chunk_id, url_hash, term_counts)
+                rows.append((chunk_id, url_hash, json.dumps(term_counts)))
+            self._conn.executemany("INSERT OR REPLACE INTO bm25_chunks VALUES (?, ?, ?)", rows)
+            self._log_changes([(chunk_id, url_hash) for chunk_id, url_hash, _ in rows])
+            self._conn.commit()
+
+    def remove_ids(self, chunk_ids: Iterable[str]):
+        with self._lock:
+            chunk_ids = list(chunk_ids)
+            for chunk_id in chunk_ids:
+                self._unindex(chunk_id)
+            self._conn.executemany("DELETE FROM bm25_chunks WHERE id = ?", [(chunk_id,) for chunk_id in chunk_ids])
+            self._log_changes([(chunk_id, None) for chunk_id in chunk_ids])
+            self._conn.commit()
+
+    def remove_url(self, url_hash: str):
+        with self._lock:
+            for chunk_id in list(self._ids_by_url.get(url_hash, ())):
+                self._unindex(chunk_id)
+            self._conn.execute("DELETE FROM bm25_chunks WHERE url_hash = ?", (url_hash,))
+            self._log_changes([(None, url_hash)])
+            self._conn.commit()
+
+    def rebuild(self, chunks: Iterable[Tuple[str, str, str]]) -> Dict[str, int]:
+        """Replace the index with (chunk_id, url_hash, text) from a full rescan."""
+        with self._lock:
+            before = len(self._lengths)
+            self._postings, self._lengths, self._terms, self._ids_by_url, self._url_of = {}, {}, {}, {}, {}
+            self._total_length = 0
+            self._conn.execute("DELETE FROM bm25_chunks")
+            self._log_changes([(None, None)])
+            self._conn.commit()
+        self.add(chunks)
+        return {"chunks": len(self._lengths), "drift": len(self._lengths) - before}
+
+    def reload(self):
+        """Re-read the whole index from SQLite.
+
+        The postings are loaded into a second instance and swapped in, so searches
+        are not held up while it loads.
+        """
+        replica = BM25Index(self.path, self.k1, self.b, self.change_log_seconds)
+        replica._conn.close()
+        with self._lock:
+            self._postings, self._lengths, self._terms = replica._postings, replica._lengths, replica._terms
+            self._ids_by_url, self._url_of = replica._ids_by_url, replica._url_of
+            self._total_length, self._seen_seq = replica._total_length, replica._seen_seq
+
+    def refresh(self) -> bool:
+        """Apply the changes another process logged since this one last looked; True if there were any.
+
+        Falls back to a full reload after a rebuild, or if changes this process has not
+        seen were already pruned from the log.
+        """
+        changes = self._conn.execute(
+            "SELECT seq, id, url_hash FROM bm25_changes WHERE seq > ? ORDER BY seq", (self._seen_seq,)).fetchall()
+        if not changes:
+            return False
+        first_seq = self._conn.execute("SELECT MIN(seq) FROM bm25_changes").fetchone()[0]
+        if first_seq > self._seen_seq + 1 or any(chunk_id is None and url_hash is None for _, chunk_id, url_hash in changes):
+            self.reload()
+            return True
+        # Each changed chunk is indexed as it is now, or dropped if it is gone
+        chunk_ids = list({chunk_id for _, chunk_id, _ in changes if chunk_id is not None})
+        current = {}
+        for start in range(0, len(chunk_ids), 500):
+            batch = chunk_ids[start:start + 500]
+            for chunk_id, url_hash, term_counts in self._conn.execute(
+                    f"SELECT * FROM bm25_chunks WHERE id IN ({', '.join('?' * len(batch))})", batch):
+                current[chunk_id] = (url_hash, json.loads(term_counts))
+        with self._lock:
+            for _, chunk_id, url_hash in changes:
+                if chunk_id is None:
+                    for stale_id in list(self._ids_by_url.get(url_hash, ())):
+                        self._unindex(stale_id)
+                elif chunk_id in current:
+                    self._index(chunk_id, *current[chunk_id])
+                else:
+                    self._unindex(chunk_id)
+            self._seen_seq = changes[-1][0]
+        return True
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def search(self, query: str, k: int = 20) -> List[Tuple[str, float]]:
+        """Return up to k (chunk_id, score) pairs, best first."""
+        terms = set(self.tokenize(query))
+        scores: Dict[str, float] = {}
+        with self._lock:
+            total_chunks = len(self._lengths)
+            if not total_chunks:
+                return []
+            average_length = self._total_length / total_chunks
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (total_chunks - len(postings) + 0.5) / (len(postings) + 0.5))
+                for chunk_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[chunk_id] / average_length)
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
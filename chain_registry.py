@@ -0,0 +1,62 @@
+import threading
+import time
+from typing import Any, Callable, Dict, NamedTuple
+
+
+class ChainKey(NamedTuple):
+    """Retriever/model settings that identify one chain variant."""
+    k: int
+    score_threshold: float
+    model: str
+
+
+class ChainRegistry:
+    """Build RAG chains lazily, once per ChainKey, and share them across requests.
+
+    LangChain runnables hold no per-call state, so a single built chain (and the
+    ChatOpenAI HTTP clients inside it) can be invoked concurrently from any number
+    of requests. Only the build itself is serialized.
+    """
+
+    def __init__(self, builder: Callable[[ChainKey], Any]):
+        self._builder = builder
+        self._chains: Dict[ChainKey, Any] = {}
+        self._build_seconds: Dict[ChainKey, float] = {}
+        self._hits: Dict[ChainKey, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: ChainKey) -> Any:
+        """Return the chain for key, building it on first use."""
+        chain = self._chains.get(key)
+        if chain is None:
+            with self._lock:
+                chain = self._chains.get(key)
+                if chain is None:
+                    start = time.perf_counter()
+                    chain = self._builder(key)
+                    self._build_seconds[key] = time.perf_counter() - start
+                    self._hits[key] = 0
+                    self._chains[key] = chain
+                    print(f"Built RAG chain {key} in {self._build_seconds[key] * 1000:.1f} ms")
+                    return chain
+        # Counter updates are best-effort; a lost increment only skews the stats
+        self._hits[key] = self._hits.get(key, 0) + 1
+        return chain
+
+    def stats(self) -> Dict[str, Any]:
+        """Report cached variants and the setup time saved by reusing them."""
+        variants = []
+        saved_seconds = 0.0
+        for key, build_seconds in list(self._build_seconds.items()):
+            hits = self._hits.get(key, 0)
+            saved_seconds += hits * build_seconds
+            variants.append({
+                **key._asdict(),
+                "build_ms": round(build_seconds * 1000, 3),
+                "reuses": hits,
+            })
+        return {
+            "chains_built": len(variants),
+            "variants": variants,
+            "setup_time_saved_ms": round(saved_seconds * 1000, 3),
+        }
@@ -5,18 +5,137 @@ import os
 
 # Server settings
 PERSIST_DIRECTORY = 'chroma_db_websites/'
+VECTOR_BACKEND = "chroma"  # chroma, or local: memory-mapped vectors + SQLite metadata
+LOCAL_VECTOR_INDEX = "flat"  # Local backend search: flat (exact scan) or hnsw (approximate graph)
+LOCAL_VECTOR_SEARCH_BLOCK_ROWS = 65536  # Rows scored per matrix product in the local backend
+LOCAL_HNSW_M = 16
+LOCAL_HNSW_EF_SEARCH = 100
+LOCAL_HNSW_SAVE_INTERVAL = 60  # Seconds between HNSW graph saves on persist()
 port_no = 8080
 host_name = "0.0.0.0"
+BLOCKING_IO_WORKERS = 8  # Threads for blocking calls made from async handlers
+
+# Multi-worker serving: one writer process indexes, reader workers map the local index read-only
+SERVING_ROLE = os.getenv("RAG_SERVING_ROLE", "single")  # single; writer; or reader (needs VECTOR_BACKEND = "local")
+SERVING_WORKERS = int(os.getenv("RAG_SERVING_WORKERS", 1))  # Above 1, `python main.py` starts this many readers plus a writer
+WRITER_PORT = 8081
+WRITER_URL = os.getenv("RAG_WRITER_URL", f"http://127.0.0.1:{WRITER_PORT}")  # Readers forward index and job requests here
+READER_REFRESH_INTERVAL_SECONDS = 1  # How often readers check whether the writer bumped the index version
 
 # API URLs
 API_BASE_URL = f"http://{host_name}:{port_no}/api/v1"
 CHAT_API_URL = f"{API_BASE_URL}/chat"
+CHAT_STREAM_API_URL = f"{API_BASE_URL}/chat/stream"
+SESSIONS_API_URL = f"{API_BASE_URL}/sessions"
+
+# Embedding cache (sits next to PERSIST_DIRECTORY)
+EMBEDDING_CACHE_PATH = 'embedding_cache.sqlite'
+EMBEDDING_CACHE_MAX_ENTRIES = 200_000
+
+# Incrementally maintained collection statistics
+STATS_STORE_PATH = 'collection_stats.sqlite'
+
+# In-memory URL registry for existence checks
+URL_REGISTRY_BLOOM = False  # Bloom filter instead of an exact set, for very large collections
+URL_REGISTRY_EXPECTED_URLS = 1_000_000  # Bloom filter sizing
+
+# Response cache
+RESPONSE_CACHE_MAX_ENTRIES = 1000
+RESPONSE_CACHE_TTL_SECONDS = 3600
+RESPONSE_CACHE_SEMANTIC = False  # Also match near-duplicate queries by embedding similarity
+RESPONSE_CACHE_SIMILARITY_THRESHOLD = 0.95
+
+# Server-side chat sessions
+SESSION_STORE_PATH = 'chat_sessions.sqlite'  # None keeps sessions in memory only
+SESSION_MAX_SESSIONS = 10_000  # Held in memory; older ones reload from SQLite on demand
+SESSION_MAX_MESSAGES = 200  # Per session; the prompt only sees the token-budgeted tail
+SESSION_TTL_SECONDS = 7 * 24 * 3600
+
+# Background indexing jobs
+JOB_QUEUE_PATH = 'index_jobs.sqlite'
+JOB_WORKERS = 4
+JOB_MAX_PER_DOMAIN = 2  # Concurrent jobs against one site
+JOB_MAX_ATTEMPTS = 3
+JOB_RETRY_BACKOFF_SECONDS = 5  # Doubled after each failed attempt
+
+# Freshness recrawler
+RECRAWL_ENABLED = True
+RECRAWL_STATE_PATH = 'recrawl_state.sqlite'
+RECRAWL_DEFAULT_INTERVAL_SECONDS = 24 * 3600
+RECRAWL_DOMAIN_INTERVALS = {}  # e.g. {"huyenchip.com": 7 * 24 * 3600}
+RECRAWL_MIN_DOMAIN_DELAY_SECONDS = 2  # Politeness gap between requests to one domain
+RECRAWL_MAX_DOMAINS_IN_PARALLEL = 4
+RECRAWL_TICK_SECONDS = 60
 
 # Chunking settings
 CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 200
 
+# Batch indexing settings
+INDEX_FETCH_WORKERS = 16  # Concurrent page fetches per batch
+EMBEDDING_BATCH_SIZE = 2048  # Max inputs per OpenAI embeddings request
+VECTOR_STORE_WRITE_BATCH_SIZE = 5000  # Chunks per vector store upsert
+INGEST_PARSE_WORKERS = 2  # Processes parsing and chunking pages (0: parse in the calling thread)
+# Parse workers use the forkserver start method, so scripts indexing in-process need an if __name__ == "__main__" guard
+INGEST_QUEUE_SIZE = 32  # Pages held between ingestion pipeline stages
+INGEST_STRIP_BOILERPLATE = True  # Drop scripts, navigation, headers and footers before chunking
+
+# Chunk deduplication across pages (headers, banners and sidebars repeated on every page)
+DEDUP_INDEX_PATH = 'dedup_index.sqlite'  # None: store every chunk
+DEDUP_MAX_HAMMING_DISTANCE = 3  # SimHash bits two chunks may differ in and still count as duplicates
+
+# Vector store write-behind buffer
+VECTOR_STORE_WAL_PATH = 'vector_store_wal.sqlite'  # Write-ahead log replayed after a crash
+VECTOR_STORE_MAX_PENDING_ROWS = 5000  # Queued chunk writes applied to the backend in one go
+VECTOR_STORE_FLUSH_INTERVAL = 30  # Max seconds between backend persists while writes are waiting (0: every write)
+
+# Retrieval / generation settings
+CHAT_MODEL = "gpt-3.5-turbo"
+RETRIEVER_K = 5
+RETRIEVER_SCORE_THRESHOLD = 0.6
+RETRIEVER_HYBRID = True  # Fuse vector search with BM25 lexical search
+HYBRID_CANDIDATES = 20  # Results taken from each search before fusion
+RRF_K = 60  # Reciprocal rank fusion damping constant
+RETRIEVER_MMR = True  # Re-rank candidates by maximal marginal relevance so near-copies don't fill all k slots
+MMR_FETCH_K = 20  # Candidates MMR chooses the k results from
+MMR_LAMBDA = 0.7  # Relevance vs. diversity trade-off (1: relevance only)
+CHAT_BATCH_CONCURRENCY = 8  # Answers one /chat/batch request generates at a time
+BM25_INDEX_PATH = 'bm25_index.sqlite'
+QUERY_REWRITE_MODE = "auto"  # auto: LLM rewrite only for follow-ups that need it; always; never
+QUERY_REWRITE_CACHE_MAX_ENTRIES = 1000
+
+# Request instrumentation, exposed at /api/v1/metrics
+TIMING_HEADER = True  # Add an X-Timing per-stage breakdown (ms) to responses; for streams it covers time to first byte
+
+# Startup: the vector index and chains load in a background warmup; /healthz answers at once, /readyz once warm
+WARMUP_REQUEST_TIMEOUT_SECONDS = 30  # API requests arriving during warmup wait this long before a 503
+WARMUP_SHUTDOWN_TIMEOUT_SECONDS = 60  # Shutdown waits this long for an unfinished warmup before skipping cleanup
+
+# Prompt token budgets; older turns beyond the history budget are summarized
+# Counted with tiktoken once warmup has loaded the chat model's encoding (downloaded into TIKTOKEN_CACHE_DIR
+# if missing), estimated from length before that or offline; /api/v1/stats reports which is active
+HISTORY_TOKEN_BUDGET = 1000
+HISTORY_SUMMARY_TOKENS = 200
+CONTEXT_TOKEN_BUDGET = 3000
+
 # API keys 
 OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY")
 API_CLIENT_ID = os.getenv("API_CLIENT_ID", "future_path")
-API_KEY = os.getenv("API_KEY", "1234")  # Change this or use env var
\ No newline at end of file
+API_KEY = os.getenv("API_KEY", "1234")  # Change this or use env var
+API_KEY_STORE_PATH = 'api_keys.sqlite'  # SHA-256 hashes of every tenant's keys; manage with `python key_store.py`
+API_KEY_CACHE_TTL_SECONDS = 60  # Validated keys are served from memory; a revocation reaches other processes within this
+
+# Tenants: each client id gets its own collection and indexes; API_CLIENT_ID keeps PERSIST_DIRECTORY
+TENANTS_DIRECTORY = 'tenants/'  # Other tenants' collections, one directory per client id
+# Rate limits per tenant and worker process; rate is requests (chat), URLs (index) or questions (batch) per second.
+# API_CLIENT_ID is exempt unless TENANT_LIMITS lists it, so a single-tenant deployment is not throttled
+TENANT_CHAT_RATE = 5
+TENANT_CHAT_BURST = 20
+TENANT_CHAT_CONCURRENCY = 8  # Chats one tenant may have in flight
+TENANT_INDEX_RATE = 1
+TENANT_INDEX_BURST = 100  # Also the largest batch one request may submit
+TENANT_INDEX_CONCURRENCY = 2  # Index requests in flight, and background index jobs running, per tenant
+TENANT_BATCH_RATE = 2
+TENANT_BATCH_BURST = 1000  # Also the most questions one /chat/batch request may ask
+TENANT_BATCH_CONCURRENCY = 1
+TENANT_LIMITS = {}  # Per-tenant overrides, e.g. {"acme": {"chat_rate": 20, "index_burst": 1000}}
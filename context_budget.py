@@ -0,0 +1,204 @@
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from tracing import record_tokens
+
+# model -> (counter name, encode), encode None while tokens are estimated from length
+_encoders: Dict[str, Tuple[str, Optional[Callable[[str], list]]]] = {}
+_encoders_lock = threading.Lock()
+_TIKTOKEN_BLOB = "https://openaipublic.blob.core.windows.net/encodings/{}.tiktoken"
+ESTIMATE = "estimate"
+
+
+def _encoding_cached(name: str) -> bool:
+    """Whether tiktoken can load encoding name from its local cache without downloading it."""
+    cache_dir = os.environ.get("TIKTOKEN_CACHE_DIR", os.environ.get(
+        "DATA_GYM_CACHE_DIR", os.path.join(tempfile.gettempdir(), "data-gym-cache")))
+    if not cache_dir:
+        return False
+    cache_key = hashlib.sha1(_TIKTOKEN_BLOB.format(name).encode()).hexdigest()
+    return os.path.exists(os.path.join(cache_dir, cache_key))
+
+
+def _load_encoder(model: str, download: bool) -> Tuple[str, Optional[Callable[[str], list]]]:
+    try:
+        import tiktoken
+        try:
+            name = tiktoken.encoding_name_for_model(model)
+        except KeyError:
+            name = "cl100k_base"
+        if not download and not _encoding_cached(name):
+            print(f"tiktoken encoding {name} is not cached; estimating tokens from length until warmup loads it")
+            return ESTIMATE, None
+        return f"tiktoken/{name}", tiktoken.get_encoding(name).encode
+    except Exception as e:
+        print(f"tiktoken unavailable for {model} ({e.__class__.__name__}: {e}); estimating tokens from length")
+        return ESTIMATE, None
+
+
+def load_encoding(model: str) -> str:
+    """Load model's tiktoken encoding, downloading it into the tiktoken cache if needed.
+
+    Meant for startup warmup, off the request path. Counters already returned by
+    token_counter switch over to it. Returns the active counter's name.
+    """
+    with _encoders_lock:
+        if _encoders.get(model, (ESTIMATE, None))[1] is None:
+            _encoders[model] = _load_encoder(model, download=True)
+        return _encoders[model][0]
+
+
+def counter_name(model: str) -> str:
+    """Which counter token_counter(model) uses: 'tiktoken/<encoding>' or 'estimate'."""
+    with _encoders_lock:
+        return _encoders.get(model, (ESTIMATE, None))[0]
+
+
+def token_counter(model: str) -> Callable[[str], int]:
+    """Return a token counting function for model.
+
+    Uses tiktoken when its encoding is already in the local tiktoken cache
+    (TIKTOKEN_CACHE_DIR) or was loaded by load_encoding, and the usual ~4
+    characters per token estimate otherwise, so a request never blocks on the
+    encoding download.
+    """
+    with _encoders_lock:
+        if model not in _encoders:
+            _encoders[model] = _load_encoder(model, download=False)
+
+    def count(text: str) -> int:
+        encode = _encoders[model][1]
+        if encode is None:
+            return (len(text) + 3) // 4
+        return len(encode(text))
+    return count
+
+
+def merge_overlap(first: str, second: str, min_overlap: int = 20, max_overlap: int = 400) -> Optional[str]:
+    """Join two chunks if the end of first repeats the start of second (splitter overlap)."""
+    for size in range(min(len(first), len(second), max_overlap), min_overlap - 1, -1):
+        if first.endswith(second[:size]):
+            return first + second[size:]
+    return None
+
+
+class ContextBudget:
+    """Fit chat history and retrieved chunks into fixed token budgets.
+
+    History keeps the most recent messages that fit history_tokens; anything older
+    is replaced by a short extractive summary of the earlier user questions, so
+    long sessions keep a constant prompt size without an extra LLM call. Chunks
+    are deduplicated, overlapping neighbours from the same URL are merged back
+    together, and the result is packed in relevance order up to context_tokens.
+    """
+
+    def __init__(self, count_tokens: Callable[[str], int], history_tokens: int = 1000,
+                 summary_tokens: int = 200, context_tokens: int = 3000, max_overlap: int = 400):
+        self.count_tokens = count_tokens
+        self.history_tokens = history_tokens
+        self.summary_tokens = summary_tokens
+        self.context_tokens = context_tokens
+        self.max_overlap = max_overlap
+
+    def fit_history(self, chat_history: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """Return the recent messages that fit the budget, preceded by a summary of the rest."""
+        kept: List[Dict[str, str]] = []
+        used = 0
+        for message in reversed(chat_history):
+            tokens = self.count_tokens(message["content"])
+            if used + tokens > self.history_tokens and kept:
+                break
+            if used + tokens > self.history_tokens:
+                # A single message larger than the whole budget is cut down rather than dropped
+                message = {**message, "content": self.truncate(message["content"], self.history_tokens)}
+                tokens = self.history_tokens
+            kept.append(message)
+            used += tokens
+        kept.reverse()
+        record_tokens("history", used)
+        dropped = chat_history[:len(chat_history) - len(kept)]
+        if not dropped:
+            return kept
+        return [self.summarize(dropped)] + kept
+
+    def summarize(self, messages: List[Dict[str, str]]) -> Dict[str, str]:
+        """Summarize dropped turns as the most recent earlier user questions that fit."""
+        questions = [re.split(r"(?<=[.?!])\s", m["content"].strip(), maxsplit=1)[0]
+                     for m in messages if m["role"].lower() == "user"]
+        lines: List[str] = []
+        used = self.count_tokens("Earlier in this conversation the user asked:")
+        for question in reversed(questions):
+            tokens = self.count_tokens(question) + 1
+            if used + tokens > self.summary_tokens:
+                break
+            lines.append(f"- {question}")
+            used += tokens
+        lines.reverse()
+        summary = "Earlier in this conversation the user asked:\n" + "\n".join(lines)
+        return {"role": "assistant", "content": summary}
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if self.count_tokens(text) <= max_tokens:
+            return text
+        low, high = 0, len(text)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.count_tokens(text[:middle]) <= max_tokens:
+                low = middle
+            else:
+                high = middle - 1
+        return text[:low]
+
+    def merge_documents(self, documents: List[Document]) -> List[Document]:
+        """Drop duplicate chunks and merge overlapping chunks of the same URL, keeping rank order."""
+        unique: List[Document] = []
+        seen = set()
+        for doc in documents:
+            key = doc.metadata.get("chunk_hash") or doc.page_content
+            if key not in seen:
+                seen.add(key)
+                unique.append(Document(page_content=doc.page_content, metadata=dict(doc.metadata)))
+
+        merged = True
+        while merged:
+            merged = False
+            for i, first in enumerate(unique):
+                for j in range(i + 1, len(unique)):
+                    second = unique[j]
+                    if first.metadata.get("url") != second.metadata.get("url"):
+                        continue
+                    text = (merge_overlap(first.page_content, second.page_content, max_overlap=self.max_overlap)
+                            or merge_overlap(second.page_content, first.page_content, max_overlap=self.max_overlap))
+                    if text is not None:
+                        # The merged chunk takes the better (earlier) rank
+                        first.page_content = text
+                        first.metadata.pop("chunk_hash", None)
+                        del unique[j]
+                        merged = True
+                        break
+                if merged:
+                    break
+        return unique
+
+    def fit_documents(self, documents: List[Document]) -> List[Document]:
+        """Merge chunks, then keep them in rank order until the context budget is spent."""
+        fitted: List[Document] = []
+        used = 0
+        for doc in self.merge_documents(documents):
+            tokens = self.count_tokens(doc.page_content)
+            if used + tokens > self.context_tokens:
+                if fitted:
+                    continue
+                # The best chunk alone is over budget: keep its beginning rather than nothing
+                doc = Document(page_content=self.truncate(doc.page_content, self.context_tokens), metadata=doc.metadata)
+                tokens = self.context_tokens
+            fitted.append(doc)
+            used += tokens
+        record_tokens("context", used)
+        return fitted
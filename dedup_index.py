@@ -0,0 +1,281 @@
+import hashlib
+import re
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase and collapse whitespace, so layout-only differences hash the same."""
+    return " ".join(text.lower().split())
+
+
+def simhash(text: str, shingle: int = 3) -> int:
+    """64-bit SimHash over word shingles; near-identical texts differ in few bits."""
+    words = re.findall(r"\w+", text.lower())
+    features = [" ".join(words[i:i + shingle]) for i in range(max(1, len(words) - shingle + 1))]
+    hashes = np.frombuffer(b"".join(hashlib.blake2b(feature.encode(), digest_size=8).digest()
+                                    for feature in features), dtype=np.uint8)
+    bits = np.unpackbits(hashes.reshape(-1, 8), axis=1, bitorder="little")
+    # A bit is set when more features have it set than not
+    majority = bits.sum(axis=0) * 2 > len(features)
+    return int.from_bytes(np.packbits(majority, bitorder="little").tobytes(), "little")
+
+
+def _signed(value: int) -> int:
+    """SQLite integers are signed 64-bit"""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+class DedupIndex:
+    """Exact and near-duplicate detection for stored chunks, plus duplicate references.
+
+    Every chunk stored in the vector store is registered with a hash of its
+    normalized text and a SimHash. A new chunk whose text matches, or whose SimHash
+    is within max_distance bits of, a chunk stored for a different URL is not
+    embedded or stored again; instead a reference (chunk_id, url_hash) records that
+    the URL also contains it. SimHashes are bucketed by max_distance + 1 bands, so
+    any pair within max_distance bits shares at least one band.
+
+    With references_only=True, for read-only replicas in reader processes, only
+    the references are loaded (all that retrieval consults) and refresh() re-reads
+    them after another process has committed to the index.
+    """
+
+    def __init__(self, path: str, max_distance: int = 3, references_only: bool = False):
+        self.path = path
+        self.max_distance = max_distance
+        self.references_only = references_only
+        self.bands = max_distance + 1
+        self._band_bits = 64 // self.bands
+        self._lock = threading.Lock()
+        self._owner: Dict[str, str] = {}  # chunk_id -> url_hash
+        self._keys: Dict[str, Tuple[str, int]] = {}  # chunk_id -> (text hash, simhash)
+        self._by_text: Dict[str, Set[str]] = {}
+        self._buckets: List[Dict[int, Set[str]]] = [{} for _ in range(self.bands)]
+        self._refs: Dict[str, Dict[Tuple[str, str], Tuple[str, int]]] = {}  # url_hash -> {(chunk_id, chunk_hash): (url, text_bytes)}
+        self._referrers: Dict[str, Set[str]] = {}  # chunk_id -> url_hashes
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS chunk_signatures (
+                chunk_id TEXT PRIMARY KEY,
+                url_hash TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                simhash INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS chunk_refs (
+                chunk_id TEXT NOT NULL,
+                url_hash TEXT NOT NULL,
+                chunk_hash TEXT NOT NULL,
+                url TEXT NOT NULL,
+                text_bytes INTEGER NOT NULL,
+                PRIMARY KEY (chunk_id, url_hash, chunk_hash)
+            );
+            CREATE INDEX IF NOT EXISTS chunk_refs_url ON chunk_refs(url_hash);
+        """)
+        self._conn.commit()
+        # Changes whenever another connection commits, so refresh() can tell when to re-read
+        self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if not references_only:
+            for chunk_id, url_hash, text_hash, value in self._conn.execute("SELECT * FROM chunk_signatures"):
+                self._index(chunk_id, url_hash, text_hash, value & (1 << 64) - 1)
+        for chunk_id, url_hash, chunk_hash, url, text_bytes in self._conn.execute("SELECT * FROM chunk_refs"):
+            self._add_ref(chunk_id, url_hash, chunk_hash, url, text_bytes)
+
+    def _band_keys(self, value: int) -> List[int]:
+        mask = (1 << self._band_bits) - 1
+        return [value >> (band * self._band_bits) & mask for band in range(self.bands)]
+
+    def _index(self, chunk_id: str, url_hash: str, text_hash: str, value: int):
+        self._owner[chunk_id] = url_hash
+        self._keys[chunk_id] = (text_hash, value)
+        self._by_text.setdefault(text_hash, set()).add(chunk_id)
+        for band, key in enumerate(self._band_keys(value)):
+            self._buckets[band].setdefault(key, set()).add(chunk_id)
+
+    def _unindex(self, chunk_id: str):
+        self._owner.pop(chunk_id, None)
+        keys = self._keys.pop(chunk_id, None)
+        if keys is None:
+            return
+        text_hash, value = keys
+        self._by_text[text_hash].discard(chunk_id)
+        if not self._by_text[text_hash]:
+            del self._by_text[text_hash]
+        for band, key in enumerate(self._band_keys(value)):
+            bucket = self._buckets[band][key]
+            bucket.discard(chunk_id)
+            if not bucket:
+                del self._buckets[band][key]
+
+    def _add_ref(self, chunk_id: str, url_hash: str, chunk_hash: str, url: str, text_bytes: int):
+        self._refs.setdefault(url_hash, {})[(chunk_id, chunk_hash)] = (url, text_bytes)
+        self._referrers.setdefault(chunk_id, set()).add(url_hash)
+
+    def _remove_ref(self, chunk_id: str, url_hash: str):
+        refs = self._refs.get(url_hash, {})
+        for key in [key for key in refs if key[0] == chunk_id]:
+            del refs[key]
+        if not refs:
+            self._refs.pop(url_hash, None)
+        referrers = self._referrers.get(chunk_id)
+        if referrers is not None:
+            referrers.discard(url_hash)
+            if not referrers:
+                del self._referrers[chunk_id]
+
+    @staticmethod
+    def signature(text: str) -> Tuple[str, int]:
+        """(hash of the normalized text, SimHash)"""
+        return hashlib.md5(normalize_text(text).encode()).hexdigest(), simhash(text)
+
+    def _find(self, url_hash: str, text_hash: str, value: int) -> Optional[str]:
+        for chunk_id in self._by_text.get(text_hash, ()):
+            if self._owner[chunk_id] != url_hash:
+                return chunk_id
+        for band, key in enumerate(self._band_keys(value)):
+            for chunk_id in self._buckets[band].get(key, ()):
+                if (self._owner[chunk_id] != url_hash
+                        and bin(self._keys[chunk_id][1] ^ value).count("1") <= self.max_distance):
+                    return chunk_id
+        return None
+
+    def deduplicate(self, chunks: Iterable[Tuple[str, str, str, bool]]) -> List[Optional[str]]:
+        """Match (chunk_id, url_hash, text, must_store) chunks against stored chunks and each other.
+
+        Returns, per chunk, the id of the chunk of another URL it duplicates, or None
+        if it has to be stored; those are registered under their chunk_id straight
+        away, so later chunks in the same batch can match them. must_store chunks are
+        never reported as duplicates.
+        """
+        signed = [(chunk_id, url_hash, *self.signature(text), must_store)
+                  for chunk_id, url_hash, text, must_store in chunks]
+        duplicates, rows = [], []
+        with self._lock:
+            for chunk_id, url_hash, text_hash, value, must_store in signed:
+                duplicate = None if must_store else self._find(url_hash, text_hash, value)
+                duplicates.append(duplicate)
+                if duplicate is None:
+                    self._index(chunk_id, url_hash, text_hash, value)
+                    rows.append((chunk_id, url_hash, text_hash, _signed(value)))
+            self._conn.executemany("INSERT OR REPLACE INTO chunk_signatures VALUES (?, ?, ?, ?)", rows)
+            self._conn.commit()
+        return duplicates
+
+    def register(self, chunks: Iterable[Tuple[str, str, str]]):
+        """Register stored (chunk_id, url_hash, text) chunks as duplicate candidates."""
+        self.deduplicate((chunk_id, url_hash, text, True) for chunk_id, url_hash, text in chunks)
+
+    def unregister(self, chunk_ids: Iterable[str]):
+        """Forget deleted chunks, along with any references to them."""
+        chunk_ids = list(chunk_ids)
+        with self._lock:
+            for chunk_id in chunk_ids:
+                self._unindex(chunk_id)
+                for url_hash in list(self._referrers.get(chunk_id, ())):
+                    self._remove_ref(chunk_id, url_hash)
+            self._conn.executemany("DELETE FROM chunk_signatures WHERE chunk_id = ?", [(i,) for i in chunk_ids])
+            self._conn.executemany("DELETE FROM chunk_refs WHERE chunk_id = ?", [(i,) for i in chunk_ids])
+            self._conn.commit()
+
+    def add_refs(self, refs: Iterable[Tuple[str, str, str, str, int]]):
+        """Record (chunk_id, url_hash, chunk_hash, url, text_bytes): the URL contains a duplicate of chunk_id."""
+        refs = list(refs)
+        with self._lock:
+            for ref in refs:
+                self._add_ref(*ref)
+            self._conn.executemany("INSERT OR REPLACE INTO chunk_refs VALUES (?, ?, ?, ?, ?)", refs)
+            self._conn.commit()
+
+    def drop_refs(self, url_hash: str, refs: Optional[Iterable[Tuple[str, str]]] = None):
+        """Remove a URL's (chunk_id, chunk_hash) references, or all of its references."""
+        with self._lock:
+            url_refs = self._refs.get(url_hash, {})
+            refs = list(url_refs) if refs is None else [ref for ref in refs if ref in url_refs]
+            for ref in refs:
+                del url_refs[ref]
+            if not url_refs:
+                self._refs.pop(url_hash, None)
+            for chunk_id in {chunk_id for chunk_id, _ in refs}:
+                if not any(ref_id == chunk_id for ref_id, _ in url_refs):
+                    self._referrers[chunk_id].discard(url_hash)
+                    if not self._referrers[chunk_id]:
+                        del self._referrers[chunk_id]
+            self._conn.executemany("DELETE FROM chunk_refs WHERE chunk_id = ? AND url_hash = ? AND chunk_hash = ?",
+                                   [(chunk_id, url_hash, chunk_hash) for chunk_id, chunk_hash in refs])
+            self._conn.commit()
+
+    def refs_of_url(self, url_hash: str) -> List[Tuple[str, str]]:
+        """(chunk_id, chunk_hash) of the duplicates this URL references."""
+        with self._lock:
+            return list(self._refs.get(url_hash, {}))
+
+    def referrers(self, chunk_id: str) -> List[Tuple[str, str, str]]:
+        """(url_hash, url, chunk_hash) of each reference other URLs hold to chunk_id."""
+        with self._lock:
+            return [(url_hash, url, chunk_hash)
+                    for url_hash in sorted(self._referrers.get(chunk_id, ()))
+                    for (ref_id, chunk_hash), (url, _) in self._refs[url_hash].items() if ref_id == chunk_id]
+
+    def transfer(self, chunk_id: str, url_hash: str):
+        """Make url_hash the owner of a stored chunk whose owner is going away, dropping its references to it."""
+        self.drop_refs(url_hash, [ref for ref in self.refs_of_url(url_hash) if ref[0] == chunk_id])
+        with self._lock:
+            self._owner[chunk_id] = url_hash
+            self._conn.execute("UPDATE chunk_signatures SET url_hash = ? WHERE chunk_id = ?", (url_hash, chunk_id))
+            self._conn.commit()
+
+    def ref_pages(self) -> Dict[str, Dict[str, object]]:
+        """Per referencing URL: its url, reference count and referenced text bytes, for reconciliation."""
+        with self._lock:
+            return {
+                url_hash: {
+                    "url": next(iter(refs.values()))[0],
+                    "chunks": len(refs),
+                    "text_bytes": sum(text_bytes for _, text_bytes in refs.values()),
+                }
+                for url_hash, refs in self._refs.items()
+            }
+
+    def rebuild(self, chunks: Iterable[Tuple[str, str, str]]) -> Dict[str, int]:
+        """Re-register (chunk_id, url_hash, text) from a full rescan; references to missing chunks are dropped."""
+        with self._lock:
+            self._owner, self._keys, self._by_text = {}, {}, {}
+            self._buckets = [{} for _ in range(self.bands)]
+            self._conn.execute("DELETE FROM chunk_signatures")
+            self._conn.commit()
+        self.register(chunks)
+        with self._lock:
+            dangling = [chunk_id for chunk_id in self._referrers if chunk_id not in self._owner]
+        for chunk_id in dangling:
+            self.unregister([chunk_id])
+        return {"chunks": len(self._owner), "dangling_refs": len(dangling)}
+
+    def refresh(self) -> bool:
+        """Re-read the references if another process has committed to the index since; True if it had."""
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if version == self._data_version:
+            return False
+        replica = DedupIndex(self.path, self.max_distance, references_only=True)
+        replica._conn.close()
+        with self._lock:
+            self._refs, self._referrers = replica._refs, replica._referrers
+        self._data_version = version
+        return True
+
+    def __len__(self) -> int:
+        return len(self._owner)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            stored_chunks = len(self._owner)
+            if self.references_only:
+                stored_chunks = self._conn.execute("SELECT COUNT(*) FROM chunk_signatures").fetchone()[0]
+            return {
+                "stored_chunks": stored_chunks,
+                "duplicate_refs": sum(len(refs) for refs in self._refs.values()),
+                "duplicate_text_bytes": sum(text_bytes for refs in self._refs.values() for _, text_bytes in refs.values()),
+            }
@@ -0,0 +1,179 @@
+import asyncio
+import re
+from typing import Any, Dict, List, Tuple
+
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from tracing import trace
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], rrf_k: int = 60) -> List[Tuple[str, float]]:
+    """Fuse ranked id lists: each list contributes 1 / (rrf_k + rank) per id."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, start=1):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def mmr_select(candidates: List[Tuple[str, Document, float]], k: int,
+               lambda_mult: float = 0.7) -> List[Tuple[str, Document, float]]:
+    """Maximal marginal relevance over (chunk_id, document, relevance) candidates, best first.
+
+    Greedily picks the candidate with the best lambda_mult * relevance minus
+    (1 - lambda_mult) * its highest word-set (Jaccard) similarity to the picks so
+    far, so near-copies of a picked chunk drop down the list. Relevance is scaled
+    by the best candidate's, which makes fused rank scores comparable to it too.
+    """
+    if len(candidates) <= 1:
+        return candidates[:k]
+    top = max(score for _, _, score in candidates) or 1.0
+    words = [set(re.findall(r"\w+", doc.page_content.lower())) for _, doc, _ in candidates]
+    redundancy = [0.0] * len(candidates)
+    remaining = list(range(len(candidates)))
+    selected = []
+    while remaining and len(selected) < k:
+        best = max(remaining, key=lambda i: lambda_mult * candidates[i][2] / top - (1 - lambda_mult) * redundancy[i])
+        selected.append(best)
+        remaining.remove(best)
+        for i in remaining:
+            union = len(words[i] | words[best])
+            if union:
+                redundancy[i] = max(redundancy[i], len(words[i] & words[best]) / union)
+    return [candidates[i] for i in selected]
+
+
+class VectorRetriever(BaseRetriever):
+    """Similarity search with a relevance threshold, on whichever vector backend is configured.
+
+    With mmr, fetch_k candidates are re-ranked by maximal marginal relevance down
+    to k. Documents whose chunk is shared with other pages list every page in
+    metadata["source_urls"].
+    """
+
+    vector_store_manager: Any
+    k: int = 5
+    score_threshold: float = 0.6
+    mmr: bool = False
+    fetch_k: int = 20
+    mmr_lambda: float = 0.7
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def search_embeddings(self, query_embeddings: List[List[float]],
+                          n_results: int) -> List[List[Tuple[str, Document, float]]]:
+        """One backend search for all query embeddings; thresholded (chunk_id, document, relevance) hits per query."""
+        vector_store = self.vector_store_manager.vector_store
+        with trace("vector_search"):
+            result = vector_store.query(
+                query_embeddings=query_embeddings,
+                n_results=n_results,
+                include=["documents", "metadatas", "distances"]
+            )
+        return [
+            [(chunk_id, Document(page_content=text, metadata=meta or {}), relevance)
+             for chunk_id, text, meta, distance in zip(ids, documents, metadatas, distances)
+             for relevance in [vector_store.relevance_score(distance)] if relevance >= self.score_threshold]
+            for ids, documents, metadatas, distances in zip(
+                result["ids"], result["documents"], result["metadatas"], result["distances"])
+        ]
+
+    def vector_search(self, query: str, n_results: int) -> List[Tuple[str, Document, float]]:
+        """Thresholded similarity search returning (chunk_id, document, relevance) triples, best first."""
+        with trace("embed_query"):
+            query_embedding = self.vector_store_manager.embedding_function.embed_query(query)
+        return self.search_embeddings([query_embedding], n_results)[0]
+
+    def vector_search_many(self, queries: List[str], n_results: int) -> List[List[Tuple[str, Document, float]]]:
+        """vector_search for many queries with one embedding request and one backend search."""
+        with trace("embed_query"):
+            query_embeddings = self.vector_store_manager.embedding_function.embed_documents(queries)
+        return self.search_embeddings(query_embeddings, n_results)
+
+    @property
+    def n_candidates(self) -> int:
+        return max(self.fetch_k, self.k) if self.mmr else self.k
+
+    def select(self, hits: List[Tuple[str, Document, float]]) -> List[Document]:
+        """Cut ranked hits down to k (by MMR if enabled) and attach their source URLs."""
+        if self.mmr:
+            with trace("mmr"):
+                hits = mmr_select(hits, self.k, self.mmr_lambda)
+        else:
+            hits = hits[:self.k]
+        dedup_index = self.vector_store_manager.dedup_index
+        for chunk_id, doc, _ in hits:
+            referrers = dedup_index.referrers(chunk_id) if dedup_index is not None else []
+            if referrers and "url" in doc.metadata:
+                doc.metadata["source_urls"] = list(dict.fromkeys([doc.metadata["url"]] + [url for _, url, _ in referrers]))
+        return [doc for _, doc, _ in hits]
+
+    def vector_hits_many(self, queries: List[str]) -> List[List[Tuple[str, Document, float]]]:
+        """The vector hits rank() needs for each query, from one batched search."""
+        return self.vector_search_many(queries, self.n_candidates)
+
+    def rank(self, query: str, vector_hits: List[Tuple[str, Document, float]]) -> List[Document]:
+        """Final documents for one query from its vector hits."""
+        return self.select(vector_hits)
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self.select(self.vector_search(query, self.n_candidates))
+
+    async def _aget_relevant_documents(self, query: str, *,
+                                       run_manager: AsyncCallbackManagerForRetrieverRun) -> List[Document]:
+        return await self.vector_store_manager.run_blocking(
+            lambda: self.select(self.vector_search(query, self.n_candidates)))
+
+
+class HybridRetriever(VectorRetriever):
+    """Vector search fused with BM25 lexical search by reciprocal rank fusion.
+
+    Vector hits still have to clear score_threshold; BM25 adds chunks that share
+    rare terms with the query (product names, error codes, acronyms) which the
+    embedding may miss. On the async path both searches run concurrently on the
+    manager's executor; the sync path may itself be running on that executor (batch
+    answers), so it runs them one after the other rather than wait on a queued task.
+    """
+
+    candidates: int = 20
+    rrf_k: int = 60
+
+    def lexical_search(self, query: str) -> List[str]:
+        with trace("bm25_search"):
+            return [chunk_id for chunk_id, _ in self.vector_store_manager.bm25_index.search(query, self.candidates)]
+
+    def fuse(self, vector_hits: List[Tuple[str, Document, float]], lexical_ids: List[str]) -> List[Document]:
+        fused = reciprocal_rank_fusion([[chunk_id for chunk_id, _, _ in vector_hits], lexical_ids], self.rrf_k)
+        top = fused[:self.n_candidates]
+        documents = {chunk_id: doc for chunk_id, doc, _ in vector_hits}
+        top_ids = [chunk_id for chunk_id, _ in top]
+        missing = [chunk_id for chunk_id in top_ids if chunk_id not in documents]
+        if missing:
+            result = self.vector_store_manager.vector_store.get(
+                ids=missing, include=["documents", "metadatas"])
+            for chunk_id, text, meta in zip(result["ids"], result["documents"], result["metadatas"]):
+                documents[chunk_id] = Document(page_content=text, metadata=meta or {})
+        # A BM25 hit deleted since it was indexed is simply dropped
+        return self.select([(chunk_id, documents[chunk_id], score) for chunk_id, score in top if chunk_id in documents])
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self.fuse(self.vector_search(query, self.candidates), self.lexical_search(query))
+
+    def vector_hits_many(self, queries: List[str]) -> List[List[Tuple[str, Document, float]]]:
+        return self.vector_search_many(queries, self.candidates)
+
+    def rank(self, query: str, vector_hits: List[Tuple[str, Document, float]]) -> List[Document]:
+        # BM25 search is per query either way, so it runs here rather than ahead of every answer in a batch
+        return self.fuse(vector_hits, self.lexical_search(query))
+
+    async def _aget_relevant_documents(self, query: str, *,
+                                       run_manager: AsyncCallbackManagerForRetrieverRun) -> List[Document]:
+        run_blocking = self.vector_store_manager.run_blocking
+        vector_hits, lexical_ids = await asyncio.gather(
+            run_blocking(self.vector_search, query, self.candidates),
+            run_blocking(self.lexical_search, query),
+        )
+        return await run_blocking(self.fuse, vector_hits, lexical_ids)
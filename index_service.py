@@ -1,146 +1,750 @@
 import os
+import uuid
+import asyncio
 import hashlib
+import functools
+import contextvars
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from urllib.parse import urlparse
-import chromadb
-from langchain.document_loaders import WebBaseLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.embeddings import OpenAIEmbeddings
-from langchain_community.vectorstores import Chroma
-from config import CHUNK_SIZE, CHUNK_OVERLAP, OPENAI_API_KEY
+from typing import List, NamedTuple, Tuple
+from langchain_core.documents import Document
+from config import (CHUNK_SIZE, CHUNK_OVERLAP, OPENAI_API_KEY, BLOCKING_IO_WORKERS,
+                    EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ENTRIES,
+                    INDEX_FETCH_WORKERS, EMBEDDING_BATCH_SIZE, VECTOR_STORE_WRITE_BATCH_SIZE,
+                    STATS_STORE_PATH, URL_REGISTRY_BLOOM, URL_REGISTRY_EXPECTED_URLS,
+                    BM25_INDEX_PATH, VECTOR_BACKEND, LOCAL_VECTOR_INDEX, LOCAL_VECTOR_SEARCH_BLOCK_ROWS,
+                    LOCAL_HNSW_M, LOCAL_HNSW_EF_SEARCH, LOCAL_HNSW_SAVE_INTERVAL,
+                    VECTOR_STORE_WAL_PATH, VECTOR_STORE_MAX_PENDING_ROWS, VECTOR_STORE_FLUSH_INTERVAL,
+                    INGEST_PARSE_WORKERS, INGEST_QUEUE_SIZE, INGEST_STRIP_BOILERPLATE,
+                    DEDUP_INDEX_PATH, DEDUP_MAX_HAMMING_DISTANCE, READER_REFRESH_INTERVAL_SECONDS)
+from embedding_cache import EmbeddingCache, CachedEmbeddings
+from stats_store import StatsStore
+from url_registry import UrlRegistry
+from bm25_index import BM25Index
+from vector_backends import ChromaBackend
+from local_vector_store import LocalVectorStore
+from write_buffer import WriteBehindBuffer
+from ingest_pipeline import IngestPipeline, split_page
+from tracing import StageCounters
+from dedup_index import DedupIndex
 import warnings
 warnings.filterwarnings('ignore')
 
+# Page-level change detection metadata, stored on every chunk of the page
+PAGE_FINGERPRINT_FIELDS = ("page_etag", "page_last_modified", "page_hash", "chunk_config")
+CHUNK_CONFIG = f"{CHUNK_SIZE}/{CHUNK_OVERLAP}" + ("/stripped" if INGEST_STRIP_BOILERPLATE else "")
+
+class IndexPlan(NamedTuple):
+    """Minimal set of vector store changes that brings one URL up to date"""
+    url: str
+    url_hash: str
+    status: str  # indexed, updated, unchanged, or skipped when another writer indexed it first
+    chunk_count: int  # Chunks the page has after the change
+    text_bytes: int  # Size of the page's chunk text after the change
+    add: List[Document]
+    delete_ids: List[str]
+    update_ids: List[str]
+    update_metadatas: List[dict]
+    drop_refs: List[Tuple[str, str]] = ()  # (chunk_id, chunk_hash) duplicate references the page no longer has
+
 class VectorStoreManager:
-    def __init__(self, persist_directory):
+    def __init__(self, persist_directory, embedding_function=None, client_settings=None,
+                 embedding_cache_path=EMBEDDING_CACHE_PATH, stats_store_path=STATS_STORE_PATH,
+                 bm25_index_path=BM25_INDEX_PATH, backend=VECTOR_BACKEND, wal_path=VECTOR_STORE_WAL_PATH,
+                 flush_interval=VECTOR_STORE_FLUSH_INTERVAL, parse_workers=INGEST_PARSE_WORKERS,
+                 dedup_index_path=DEDUP_INDEX_PATH, read_only=False):
+        if read_only and backend != "local":
+            raise ValueError("Read-only replicas need the local vector backend; Chroma cannot be shared between processes")
         self.persist_directory = persist_directory
-        self.client_settings = chromadb.config.Settings(
-            chroma_db_impl='duckdb+parquet',
-            persist_directory=persist_directory
+        self.backend = backend
+        # A reader process: the writer owns every index file, this one maps them and reloads on a version bump
+        self.read_only = read_only
+        self.client_settings = client_settings
+        if embedding_function is None:
+            # Imported here: the OpenAI client stack is slow to import and not needed with a custom function
+            from langchain_community.embeddings import OpenAIEmbeddings
+            embedding_function = OpenAIEmbeddings(api_key=OPENAI_API_KEY)
+        self.embedding_function = embedding_function
+        # Both indexing and query embedding go through the cache
+        self.embedding_cache = None
+        if embedding_cache_path:
+            self.embedding_cache = EmbeddingCache(embedding_cache_path, EMBEDDING_CACHE_MAX_ENTRIES)
+            self.embedding_function = CachedEmbeddings(self.embedding_function, self.embedding_cache)
+        # Writes are logged and batched; the backend persists on a timer instead of per URL.
+        # A replica never writes, so its buffer has no log (the writer's is not its to replay) and no timer
+        self.vector_store = WriteBehindBuffer(
+            self.initialize_vector_store(),
+            wal_path=None if read_only else wal_path,
+            max_pending_rows=VECTOR_STORE_MAX_PENDING_ROWS,
+            flush_interval=0 if read_only else flush_interval,
+            max_batch_rows=VECTOR_STORE_WRITE_BATCH_SIZE
+        )
+        # Bounded pool for work that has no async equivalent (parsing, vector store writes)
+        self.executor = ThreadPoolExecutor(max_workers=BLOCKING_IO_WORKERS, thread_name_prefix="vector-store")
+        # Parsing and chunking run in worker processes, off request and event-loop threads
+        self.parse_workers = parse_workers
+        self._parse_pool = None
+        self._parse_pool_lock = threading.Lock()
+        self.ingest_counters = StageCounters()
+        # Striped locks so background writers (jobs, recrawls) never diff the same URL concurrently
+        self._url_locks = [threading.Lock() for _ in range(64)]
+        self.stats_store = StatsStore(stats_store_path)
+        self.url_registry = UrlRegistry(
+            use_bloom=URL_REGISTRY_BLOOM,
+            expected_items=URL_REGISTRY_EXPECTED_URLS,
+            confirm=self.stats_store.has_url
         )
-        self.embedding_function = OpenAIEmbeddings(api_key=OPENAI_API_KEY)
-        self.vector_store = self.initialize_vector_store()
+        # Lexical index over the same chunks, for hybrid retrieval
+        self.bm25_index = BM25Index(bm25_index_path)
+        # Near-duplicate chunks of other pages are stored once and referenced
+        self.dedup_index = (DedupIndex(dedup_index_path, DEDUP_MAX_HAMMING_DISTANCE, references_only=read_only)
+                            if dedup_index_path else None)
+        if not read_only and ((self.stats_store.is_empty() or len(self.bm25_index) == 0
+                or (self.dedup_index is not None and len(self.dedup_index) == 0))
+                and self.vector_store.count() > 0):
+            print("Building collection statistics, URL registry, BM25 and dedup indexes from a full scan...")
+            self.reconcile()
+        else:
+            # The stats store already lists every indexed URL, so no collection scan is needed
+            self.url_registry.rebuild(self.stats_store.url_hashes())
+        self._refresh_listeners = []
+        self._stop_refresh = threading.Event()
+        self._refresher = None
+        if read_only:
+            self._refresher = threading.Thread(target=self._refresh_periodically, name="replica-refresh", daemon=True)
+            self._refresher.start()
 
     def initialize_vector_store(self):
-        """Initialize or load the vector store"""
-        if os.path.exists(self.persist_directory):
-            print(f"Loading existing vector store from {self.persist_directory}...")
-        else:
-            print(f"Creating new vector store in {self.persist_directory}...")
-        
-        return Chroma(
-            persist_directory=self.persist_directory,
-            embedding_function=self.embedding_function,
-            client_settings=self.client_settings
-        )
+        """Initialize or load the vector store with the configured backend"""
+        if self.backend == "local":
+            return LocalVectorStore(os.path.join(self.persist_directory, "local_index"),
+                                    block_rows=LOCAL_VECTOR_SEARCH_BLOCK_ROWS, index=LOCAL_VECTOR_INDEX,
+                                    hnsw_m=LOCAL_HNSW_M, hnsw_ef_search=LOCAL_HNSW_EF_SEARCH,
+                                    hnsw_save_interval=LOCAL_HNSW_SAVE_INTERVAL, read_only=self.read_only)
+        if self.backend == "chroma":
+            import chromadb
+            client_settings = self.client_settings or chromadb.config.Settings(
+                chroma_db_impl='duckdb+parquet',
+                persist_directory=self.persist_directory
+            )
+            return ChromaBackend(self.persist_directory, self.embedding_function, client_settings)
+        raise ValueError(f"Unknown vector backend: {self.backend}")
+
+    def check_writable(self):
+        """Refuse index writes in a read-only replica"""
+        if self.read_only:
+            raise RuntimeError("This worker serves a read-only replica of the index; index through the writer process")
+
+    def add_refresh_listener(self, callback):
+        """Call callback() after a replica has reloaded newer index data"""
+        self._refresh_listeners.append(callback)
+
+    def refresh(self):
+        """Bring a read-only replica up to date with the writer process; True if anything had changed.
+
+        The local store's write counter is the vector version: when it moves the vectors
+        are remapped. BM25 applies the writer's change log and the dedup references are
+        re-read when their file changed, so neither reloads a whole index per write.
+        """
+        vectors_changed = self.vector_store.refresh()
+        lexical_changed = self.bm25_index.refresh()
+        references_changed = self.dedup_index.refresh() if self.dedup_index is not None else False
+        if not (vectors_changed or lexical_changed or references_changed):
+            return False
+        self.url_registry.rebuild(self.stats_store.url_hashes())
+        for callback in self._refresh_listeners:
+            callback()
+        return True
+
+    def _refresh_periodically(self):
+        while not self._stop_refresh.wait(READER_REFRESH_INTERVAL_SECONDS):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Replica refresh failed: {e}")
 
     def get_url_hash(self, url):
         """Create a hash of the URL to use as a unique identifier"""
         return hashlib.md5(url.encode()).hexdigest()
 
+    def url_lock(self, url_hash):
+        """Lock serializing read-diff-write cycles for one URL"""
+        return self._url_locks[int(url_hash[:8], 16) % len(self._url_locks)]
+
     def url_already_exists(self, url_hash):
-        """Check if the URL has already been processed"""
-        collection = self.vector_store._collection
+        """Check if the URL has already been processed (answered from the in-memory registry)"""
+        return url_hash in self.url_registry
+
+    def url_in_collection(self, url_hash):
+        """Check the collection itself for a URL, bypassing the registry"""
+        collection = self.vector_store
         results = collection.get(
             where={"url_hash": url_hash},
+            limit=1,
             include=["metadatas"]
         )
         return len(results['metadatas']) > 0
 
-    def process_url(self, url, force_update=False):
-        """Process a URL and add its contents to the vector store if not already present"""
+    async def aurl_already_exists(self, url_hash):
+        """Async variant of url_already_exists, run in the bounded executor"""
+        return await self.run_blocking(self.url_already_exists, url_hash)
+
+    async def run_blocking(self, func, *args):
+        """Run a blocking call in the bounded executor without blocking the event loop"""
+        loop = asyncio.get_running_loop()
+        # Carry context variables (the request's stage timer) into the worker thread
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self.executor, functools.partial(context.run, func, *args))
+
+    def get_parse_pool(self):
+        """Process pool for parsing and chunking, started on first use (None when parse_workers is 0)"""
+        if self.parse_workers <= 0:
+            return None
+        with self._parse_pool_lock:
+            if self._parse_pool is None:
+                # Forking this process could copy a lock another thread holds (SQLite, the write buffer, the
+                # URL locks) into a worker; forkserver workers are forked from a clean single-threaded server
+                # instead, which imports __main__ once. split_page stays importable from ingest_pipeline.
+                start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+                self._parse_pool = ProcessPoolExecutor(max_workers=self.parse_workers,
+                                                       mp_context=multiprocessing.get_context(start_method))
+            return self._parse_pool
+
+    def chunk_page(self, url, url_hash, html):
+        """Parse, strip boilerplate from and split a page into chunks carrying the URL metadata and a content hash"""
+        args = (url, url_hash, html, CHUNK_SIZE, CHUNK_OVERLAP, INGEST_STRIP_BOILERPLATE)
+        pool = self.get_parse_pool()
+        chunks, timings = pool.submit(split_page, *args).result() if pool else split_page(*args)
+        for stage, seconds in timings.items():
+            self.ingest_counters.add(stage, 1, seconds)
+        return [Document(page_content=text, metadata=metadata) for text, metadata in chunks]
+
+    @staticmethod
+    def get_content_hash(text):
+        """Hash chunk or page content to detect changes between crawls"""
+        return hashlib.md5(text.encode()).hexdigest()
+
+    def get_page_fingerprints(self, url_hashes):
+        """Return {url_hash: fingerprint} for the given URLs that are already indexed.
+
+        The fingerprint (ETag, Last-Modified, body hash, chunking settings) is stored
+        on every chunk of a page, so any one chunk's metadata carries it.
+        """
+        # Pages the registry has never seen cannot have a stored fingerprint
+        url_hashes = [url_hash for url_hash in url_hashes if self.url_registry.might_contain(url_hash)]
+        if not url_hashes:
+            return {}
+        where = {"url_hash": url_hashes[0]} if len(url_hashes) == 1 else {"url_hash": {"$in": url_hashes}}
+        results = self.vector_store.get(
+            where=where,
+            limit=1 if len(url_hashes) == 1 else None,
+            include=["metadatas"]
+        )
+        fingerprints = {}
+        for meta in results["metadatas"]:
+            if meta["url_hash"] not in fingerprints:
+                fingerprints[meta["url_hash"]] = {field: meta.get(field, "") for field in PAGE_FINGERPRINT_FIELDS}
+        return fingerprints
+
+    def get_page_fingerprint(self, url_hash):
+        """Return the stored fingerprint for one URL, or None if it is not indexed"""
+        return self.get_page_fingerprints([url_hash]).get(url_hash)
+
+    @staticmethod
+    def conditional_headers(fingerprint):
+        """Build If-None-Match / If-Modified-Since headers from a stored fingerprint"""
+        headers = {}
+        # A page chunked with different settings must be re-split even if unmodified
+        if not fingerprint or fingerprint.get("chunk_config") != CHUNK_CONFIG:
+            return headers
+        if fingerprint.get("page_etag"):
+            headers["If-None-Match"] = fingerprint["page_etag"]
+        if fingerprint.get("page_last_modified"):
+            headers["If-Modified-Since"] = fingerprint["page_last_modified"]
+        return headers
+
+    def make_fingerprint(self, html, headers):
+        return {
+            "page_etag": headers.get("ETag", ""),
+            "page_last_modified": headers.get("Last-Modified", ""),
+            "page_hash": self.get_content_hash(html),
+            "chunk_config": CHUNK_CONFIG
+        }
+
+    def fetch_page(self, url, fingerprint=None):
+        """Fetch a page, conditionally if a fingerprint is stored.
+
+        Returns (html, fingerprint); html is None when the server answers 304 Not Modified.
+        """
+        from langchain.document_loaders import WebBaseLoader
+        
+        with self.ingest_counters.time("fetch"):
+            loader = WebBaseLoader(url)
+            response = loader.session.get(url, headers=self.conditional_headers(fingerprint), **loader.requests_kwargs)
+            if response.status_code == 304:
+                return None, fingerprint
+            response.raise_for_status()
+            response.encoding = response.apparent_encoding
+            return response.text, self.make_fingerprint(response.text, response.headers)
+
+    def plan_update(self, url, html, fingerprint, stored_fingerprint=None):
+        """Diff a fetched page against its stored chunks by content hash.
+
+        Unchanged chunks keep their vectors (only their metadata is refreshed),
+        so a small edit re-embeds only the chunks it touched. Chunks the page shares
+        with other pages are diffed against its duplicate references the same way.
+        """
         url_hash = self.get_url_hash(url)
+        stored = {"ids": [], "metadatas": []}
+        refs = []
+        if stored_fingerprint is not None:
+            stored = self.vector_store.get(where={"url_hash": url_hash}, include=["metadatas"])
+            if self.dedup_index is not None:
+                refs = self.dedup_index.refs_of_url(url_hash)
         
-        # Check if URL already exists
-        if not force_update and self.url_already_exists(url_hash):
-            print(f"URL {url} already exists in the vector store. Skipping...")
-            return False
+        if (stored_fingerprint is not None
+                and stored_fingerprint["page_hash"] == fingerprint["page_hash"]
+                and stored_fingerprint["chunk_config"] == fingerprint["chunk_config"]):
+            # Same body: at most the validators changed
+            update_ids = stored["ids"] if stored_fingerprint != fingerprint else []
+            return IndexPlan(url, url_hash, "unchanged", len(stored["ids"]) + len(refs), 0, [], [],
+                             update_ids, [{**meta, **fingerprint} for meta in stored["metadatas"]] if update_ids else [])
+        
+        document_chunks = self.chunk_page(url, url_hash, html)
+        for chunk in document_chunks:
+            chunk.metadata.update(fingerprint)
+        
+        stored_ids_by_hash = {}
+        delete_ids = []
+        for chunk_id, meta in zip(stored["ids"], stored["metadatas"]):
+            if "chunk_hash" in meta:
+                stored_ids_by_hash.setdefault(meta["chunk_hash"], []).append(chunk_id)
+            else:
+                delete_ids.append(chunk_id)
         
-        print(f"Processing new URL: {url}")
+        refs_by_hash = {}
+        for chunk_id, chunk_hash in refs:
+            refs_by_hash.setdefault(chunk_hash, []).append(chunk_id)
         
-        # Load and process the document
+        add, update_ids, update_metadatas, kept_refs = [], [], [], []
+        for chunk in document_chunks:
+            chunk_hash = chunk.metadata["chunk_hash"]
+            matching_ids = stored_ids_by_hash.get(chunk_hash)
+            if matching_ids:
+                update_ids.append(matching_ids.pop())
+                update_metadatas.append(chunk.metadata)
+            elif refs_by_hash.get(chunk_hash):
+                kept_refs.append(((refs_by_hash[chunk_hash].pop(), chunk_hash), chunk))
+            else:
+                add.append(chunk)
+        delete_ids.extend(chunk_id for ids in stored_ids_by_hash.values() for chunk_id in ids)
+        drop_refs = [(chunk_id, chunk_hash) for chunk_hash, ids in refs_by_hash.items() for chunk_id in ids]
+        if not update_ids and not add and kept_refs:
+            # The page fingerprint lives on the page's own chunks, so store one again
+            ref, chunk = kept_refs[0]
+            drop_refs.append(ref)
+            add.append(chunk)
+        
+        status = "updated" if stored_fingerprint is not None else "indexed"
+        text_bytes = sum(len(chunk.page_content.encode()) for chunk in document_chunks)
+        return IndexPlan(url, url_hash, status, len(document_chunks), text_bytes,
+                         add, delete_ids, update_ids, update_metadatas, drop_refs)
+
+    def apply_plans(self, plans):
+        """Apply index plans: deletes and metadata refreshes, then batched embedding of new chunks.
+
+        New chunks that duplicate a stored chunk of another page are not embedded;
+        the page gets a reference to the stored chunk instead.
+        """
+        self.check_writable()
+        collection = self.vector_store
+        if self.dedup_index is not None:
+            for plan in plans:
+                if plan.drop_refs:
+                    self.dedup_index.drop_refs(plan.url_hash, plan.drop_refs)
+        self.release_chunks([chunk_id for plan in plans for chunk_id in plan.delete_ids])
+        
+        update_ids = [chunk_id for plan in plans for chunk_id in plan.update_ids]
+        update_metadatas = [meta for plan in plans for meta in plan.update_metadatas]
+        for i in range(0, len(update_ids), VECTOR_STORE_WRITE_BATCH_SIZE):
+            collection.update(
+                ids=update_ids[i:i + VECTOR_STORE_WRITE_BATCH_SIZE],
+                metadatas=update_metadatas[i:i + VECTOR_STORE_WRITE_BATCH_SIZE]
+            )
+        
+        chunks = [chunk for plan in plans for chunk in plan.add]
+        ids = [str(uuid.uuid4()) for _ in chunks]
+        refs = []
+        if self.dedup_index is not None and chunks:
+            candidates = []
+            for plan in plans:
+                for i, chunk in enumerate(plan.add):
+                    # A page keeps at least one chunk of its own to carry its fingerprint
+                    candidates.append((chunk.metadata["url_hash"], chunk.page_content, i == 0 and not plan.update_ids))
+            duplicates = self.dedup_index.deduplicate(
+                (chunk_id, url_hash, text, must_store)
+                for chunk_id, (url_hash, text, must_store) in zip(ids, candidates))
+            refs = [(duplicate, chunk.metadata["url_hash"], chunk.metadata["chunk_hash"], chunk.metadata["url"],
+                     len(chunk.page_content.encode()))
+                    for chunk, duplicate in zip(chunks, duplicates) if duplicate is not None]
+            stored = [i for i, duplicate in enumerate(duplicates) if duplicate is None]
+            ids, chunks = [ids[i] for i in stored], [chunks[i] for i in stored]
         try:
-            loader = WebBaseLoader(url)
-            document = loader.load()
+            self.write_chunks(chunks, ids)
+        except Exception:
+            if self.dedup_index is not None:
+                self.dedup_index.unregister(ids)
+            raise
+        if refs:
+            self.dedup_index.add_refs(refs)
+        
+        for plan in plans:
+            if plan.status in ("indexed", "updated"):
+                self.stats_store.record_url(plan.url_hash, plan.url, urlparse(plan.url).netloc,
+                                            plan.chunk_count, plan.text_bytes)
+                self.url_registry.add(plan.url_hash)
+
+    def release_chunks(self, chunk_ids):
+        """Delete chunks a page no longer has.
+
+        A chunk other pages still reference is handed over to the first of them
+        instead: it takes that page's metadata and the reference is dropped.
+        """
+        collection = self.vector_store
+        delete_ids, transfers = [], []
+        for chunk_id in chunk_ids:
+            referrers = self.dedup_index.referrers(chunk_id) if self.dedup_index is not None else []
+            if referrers:
+                transfers.append((chunk_id, *referrers[0]))
+            else:
+                delete_ids.append(chunk_id)
+        for i in range(0, len(delete_ids), VECTOR_STORE_WRITE_BATCH_SIZE):
+            collection.delete(ids=delete_ids[i:i + VECTOR_STORE_WRITE_BATCH_SIZE])
+        self.bm25_index.remove_ids(delete_ids)
+        if self.dedup_index is not None:
+            self.dedup_index.unregister(delete_ids)
+        
+        for chunk_id, url_hash, url, chunk_hash in transfers:
+            stored = collection.get(ids=[chunk_id], include=["metadatas", "documents"])
+            if not stored["ids"]:
+                self.dedup_index.unregister([chunk_id])
+                continue
+            page = collection.get(where={"url_hash": url_hash}, limit=1, include=["metadatas"])
+            meta = page["metadatas"][0] if page["metadatas"] else {
+                **stored["metadatas"][0], "source": url, "url": url, "url_hash": url_hash,
+                "domain": urlparse(url).netloc}
+            collection.update(ids=[chunk_id], metadatas=[{**meta, "chunk_hash": chunk_hash}])
+            self.bm25_index.add([(chunk_id, url_hash, stored["documents"][0])])
+            self.dedup_index.transfer(chunk_id, url_hash)
+
+    def delete_url(self, url):
+        """Remove all chunks of a URL from the vector store"""
+        self.check_writable()
+        url_hash = self.get_url_hash(url)
+        with self.url_lock(url_hash):
+            if self.dedup_index is not None:
+                self.dedup_index.drop_refs(url_hash)
+            self.release_chunks(self.vector_store.get(where={"url_hash": url_hash}, include=["metadatas"])["ids"])
+            self.vector_store.persist()
+            self.stats_store.remove_url(url_hash)
+            self.url_registry.discard(url_hash)
+            if self.url_registry.needs_rebuild():
+                self.url_registry.rebuild(self.stats_store.url_hashes())
+            self.bm25_index.remove_url(url_hash)
+
+    def process_url(self, url, force_update=False, progress=None):
+        """Process a URL and add its contents to the vector store if not already present.
+
+        Returns False when the page is already indexed; see index_url.
+        """
+        return self.index_url(url, force_update, progress) != "skipped"
+
+    def index_url(self, url, force_update=False, progress=None):
+        """Index one URL and return its status: indexed, updated, unchanged or skipped.
+
+        With force_update an indexed page is refreshed: a conditional GET or an
+        unchanged body hash leaves it as is, otherwise only changed chunks are
+        rewritten. Without it an indexed page is skipped. Fetch, parse and write
+        errors are raised.
+        """
+        progress = progress or (lambda stage: None)
+        url_hash = self.get_url_hash(url)
+        
+        with self.url_lock(url_hash):
+            stored_fingerprint = self.get_page_fingerprint(url_hash)
             
-            # Split the document into chunks
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=CHUNK_SIZE,
-                chunk_overlap=CHUNK_OVERLAP
-            )
-            document_chunks = text_splitter.split_documents(document)
+            # Check if URL already exists
+            if not force_update and stored_fingerprint is not None:
+                print(f"URL {url} already exists in the vector store. Skipping...")
+                return "skipped"
             
-            # Add URL metadata to each chunk
-            for chunk in document_chunks:
-                chunk.metadata.update({
-                    "url": url,
-                    "url_hash": url_hash,
-                    "domain": urlparse(url).netloc
-                })
+            print(f"Processing URL: {url}")
             
-            # If updating existing content, remove old entries first
-            if force_update:
-                print(f"Removing existing content for URL: {url}")
-                collection = self.vector_store._collection
-                collection.delete(
-                    where={"url_hash": url_hash}
+            # Load and process the document
+            try:
+                progress("fetching")
+                html, fingerprint = self.fetch_page(url, stored_fingerprint)
+                if html is None:
+                    print(f"URL {url} not modified since last crawl")
+                    return "unchanged"
+                progress("indexing")
+                plan = self.plan_update(url, html, fingerprint, stored_fingerprint)
+                self.apply_plans([plan])
+                self.vector_store.persist()
+                
+                print(f"Successfully processed URL: {url} ({plan.status}, "
+                      f"+{len(plan.add)}/-{len(plan.delete_ids)} chunks)")
+                return plan.status
+                
+            except Exception as e:
+                print(f"Error processing URL {url}: {str(e)}")
+                raise
+
+    def refresh_url(self, url):
+        """Re-crawl a URL with a conditional GET, apply only what changed and return the status"""
+        url_hash = self.get_url_hash(url)
+        with self.url_lock(url_hash):
+            plan = self.prepare_url(url, self.get_page_fingerprint(url_hash))
+            if plan.add or plan.delete_ids or plan.update_ids or plan.drop_refs:
+                self.apply_plans([plan])
+                self.vector_store.persist()
+        return plan.status
+
+    def get_indexed_urls(self):
+        """Return (url, url_hash) for every page in the collection, from the statistics store rather than a scan"""
+        return self.stats_store.urls()
+
+    def prepare_url(self, url, stored_fingerprint=None):
+        """Fetch one URL and plan its update"""
+        html, fingerprint = self.fetch_page(url, stored_fingerprint)
+        return self.plan_page(url, html, fingerprint, stored_fingerprint)
+
+    def plan_page(self, url, html, fingerprint, stored_fingerprint=None):
+        """Plan the update for a fetched page; html is None when the server reported it unmodified"""
+        if html is None:
+            return IndexPlan(url, self.get_url_hash(url), "unchanged", 0, 0, [], [], [], [])
+        return self.plan_update(url, html, fingerprint, stored_fingerprint)
+
+    def write_chunks(self, chunks, ids=None):
+        """Embed chunks in provider-sized batches and write them to the vector store and the BM25 index"""
+        self.check_writable()
+        collection = self.vector_store
+        ids = ids or [str(uuid.uuid4()) for _ in chunks]
+        texts = [chunk.page_content for chunk in chunks]
+        embeddings = []
+        with self.ingest_counters.time("embed", len(texts)):
+            for i in range(0, len(texts), EMBEDDING_BATCH_SIZE):
+                embeddings.extend(self.embedding_function.embed_documents(texts[i:i + EMBEDDING_BATCH_SIZE]))
+        
+        with self.ingest_counters.time("write", len(chunks)):
+            for i in range(0, len(chunks), VECTOR_STORE_WRITE_BATCH_SIZE):
+                batch = chunks[i:i + VECTOR_STORE_WRITE_BATCH_SIZE]
+                batch_ids = ids[i:i + VECTOR_STORE_WRITE_BATCH_SIZE]
+                collection.upsert(
+                    ids=batch_ids,
+                    embeddings=embeddings[i:i + VECTOR_STORE_WRITE_BATCH_SIZE],
+                    metadatas=[chunk.metadata for chunk in batch],
+                    documents=[chunk.page_content for chunk in batch],
+                )
+                self.bm25_index.add(
+                    (chunk_id, chunk.metadata.get("url_hash", ""), chunk.page_content)
+                    for chunk_id, chunk in zip(batch_ids, batch)
                 )
-            
-            # Add documents to the vector store
-            self.vector_store.add_documents(document_chunks)
-            self.vector_store.persist()
-            
-            print(f"Successfully processed URL: {url}")
-            return True
-            
-        except Exception as e:
-            print(f"Error processing URL {url}: {str(e)}")
-            return False
 
-    def print_collection_stats(self):
-        """Print statistics about the vector store collection"""
-        collection = self.vector_store._collection
+    def process_urls(self, urls, force_update=False):
+        """Index many URLs through the streaming ingestion pipeline.
+
+        Pages are fetched by a thread pool, parsed and chunked in the parse process
+        pool and diffed, while this thread embeds and writes each plan as soon as
+        it arrives; bounded queues between the stages cap the pages in memory.
+        Returns one status dict per input URL, in input order.
+        """
+        results = {}
+        to_fetch = []
+        unique_urls = list(dict.fromkeys(urls))
+        fingerprints = self.get_page_fingerprints(self.get_url_hash(url) for url in unique_urls)
+        for url in unique_urls:
+            stored_fingerprint = fingerprints.get(self.get_url_hash(url))
+            if stored_fingerprint is not None and not force_update:
+                results[url] = {"url": url, "status": "skipped", "chunks": 0, "error": None}
+            else:
+                results[url] = {"url": url, "status": "pending", "chunks": 0, "error": None}
+                to_fetch.append((url, stored_fingerprint))
         
-        # Get total count of documents
-        count = collection.count()
-        print(f"\nCollection Statistics:")
-        print(f"Total documents: {count}")
-        
-        # Get all metadata to analyze URLs
-        result = collection.get(include=['metadatas'])
-        
-        # Get unique URLs
-        unique_urls = set(meta['url'] for meta in result['metadatas'] if 'url' in meta)
-        print(f"Unique URLs stored: {len(unique_urls)}")
-        
-        # Print domains
-        domains = set(meta['domain'] for meta in result['metadatas'] if 'domain' in meta)
-        print(f"Unique domains: {len(domains)}")
-        print("Domains:", ", ".join(domains))
-        
-        # Calculate storage size
-        if os.path.exists(self.vector_store._persist_directory):
-            total_size = sum(
-                os.path.getsize(os.path.join(dirpath, filename))
-                for dirpath, _, filenames in os.walk(self.vector_store._persist_directory)
-                for filename in filenames
-            )
-            print(f"Total storage size on disk: {total_size / (1024*1024):.2f} MB")
+        def plan_locked(url, html, fingerprint, stored_fingerprint):
+            # The URL's lock is held from the fingerprint read until its plan is written (or fails), so
+            # a concurrent process_url, refresh or batch cannot plan against the same stored chunks
+            url_hash = self.get_url_hash(url)
+            lock = self.url_lock(url_hash)
+            lock.acquire()
+            try:
+                current_fingerprint = self.get_page_fingerprint(url_hash)
+                if current_fingerprint is not None and stored_fingerprint is None and not force_update:
+                    # Indexed by someone else since this batch started
+                    return IndexPlan(url, url_hash, "skipped", 0, 0, [], [], [], [])
+                return self.plan_page(url, html, fingerprint, current_fingerprint)
+            except BaseException:
+                lock.release()
+                raise
+        
+        def write_locked(plans):
+            try:
+                self.apply_plans(plans)
+            finally:
+                for plan in plans:
+                    self.url_lock(plan.url_hash).release()
+        
+        def record_plan(plan):
+            results[plan.url].update(status=plan.status, chunks=plan.chunk_count)
         
-        stats_response = f"""\nCollection Statistics:\n
-                    Total documents: {count}
-                    Unique URLs stored: {len(unique_urls)}
-                    Unique domains: {len(domains)}
-                    Domains: {', '.join(domains)}
-                    Total storage size on disk: {total_size / (1024*1024):.2f} MB"""
+        def record_error(url, error):
+            print(f"Error processing URL {url}: {str(error)}")
+            results[url].update(status="failed", chunks=0, error=str(error))
         
-        return stats_response
+        IngestPipeline(
+            fetch=self.fetch_page,
+            plan=plan_locked,
+            write=write_locked,
+            on_plan=record_plan,
+            on_error=record_error,
+            fetch_workers=INDEX_FETCH_WORKERS,
+            parse_workers=self.parse_workers,
+            queue_size=INGEST_QUEUE_SIZE,
+            batch_chunks=EMBEDDING_BATCH_SIZE
+        ).run(to_fetch)
+        
+        self.vector_store.persist()
+        written = sum(1 for r in results.values() if r["status"] in ("indexed", "updated"))
+        print(f"Batch indexing finished: {written}/{len(results)} URLs written")
+        return [results[url] for url in unique_urls]
+
+    def flush(self):
+        """Apply buffered writes and persist the vector store now, returning the buffer state"""
+        self.vector_store.flush()
+        return self.vector_store.stats()
+
+    def close(self):
+        """Stop the background flush timer, persist everything buffered and stop the parse workers"""
+        self._stop_refresh.set()
+        if self._refresher is not None:
+            self._refresher.join()
+            self._refresher = None
+        self.vector_store.close()
+        if self._parse_pool is not None:
+            self._parse_pool.shutdown()
+
+    def warm_up(self):
+        """Load the vector index into memory ahead of the first query"""
+        self.vector_store.warm_up()
+
+    def get_ingest_stats(self):
+        """Return items processed and busy time per ingestion stage (pages for fetch to chunk, chunks for embed and write)"""
+        return self.ingest_counters.stats()
+
+    def get_embedding_cache_stats(self):
+        """Return hit/miss counters for the embedding cache, if enabled"""
+        return self.embedding_cache.stats() if self.embedding_cache else None
+
+    def reconcile(self, page_size=10000):
+        """Rebuild the statistics, URL registry, BM25 and dedup indexes from a full, paged scan of the collection"""
+        self.check_writable()
+        collection = self.vector_store
+        pages = {}
+        lexical_chunks = []
+        offset = 0
+        while True:
+            result = collection.get(include=['metadatas', 'documents'], limit=page_size, offset=offset)
+            for chunk_id, meta, text in zip(result['ids'], result['metadatas'], result['documents']):
+                meta = meta or {}
+                lexical_chunks.append((chunk_id, meta.get('url_hash', ''), text or ""))
+                if 'url_hash' not in meta:
+                    continue
+                page = pages.setdefault(meta['url_hash'], {
+                    "url_hash": meta['url_hash'],
+                    "url": meta.get('url', ''),
+                    "domain": meta.get('domain', ''),
+                    "chunks": 0,
+                    "text_bytes": 0
+                })
+                page["chunks"] += 1
+                page["text_bytes"] += len((text or "").encode())
+            if len(result['ids']) < page_size:
+                break
+            offset += page_size
+        dedup = None
+        if self.dedup_index is not None:
+            dedup = self.dedup_index.rebuild(chunk for chunk in lexical_chunks if chunk[1])
+            # Duplicate chunks a page references count towards its size like its own
+            for url_hash, refs in self.dedup_index.ref_pages().items():
+                page = pages.setdefault(url_hash, {
+                    "url_hash": url_hash,
+                    "url": refs["url"],
+                    "domain": urlparse(refs["url"]).netloc,
+                    "chunks": 0,
+                    "text_bytes": 0
+                })
+                page["chunks"] += refs["chunks"]
+                page["text_bytes"] += refs["text_bytes"]
+        return {
+            "stats_drift": self.stats_store.rebuild(pages.values()),
+            "url_registry": self.url_registry.reconcile(pages.keys()),
+            "bm25_index": self.bm25_index.rebuild(lexical_chunks),
+            "dedup_index": dedup
+        }
+
+    def get_collection_stats(self, reconcile=False):
+        """Return collection statistics from the incremental stats store.
+
+        With reconcile=True the store, URL registry, BM25 and dedup indexes are first rebuilt from
+        a full scan, and the drift that was corrected and the on-disk size are reported too.
+        """
+        drift = self.reconcile() if reconcile else None
+        stats = self.stats_store.snapshot()
+        stats["write_buffer"] = self.vector_store.stats()
+        if self.dedup_index is not None:
+            stats["dedup"] = self.dedup_index.stats()
+        if reconcile:
+            stats["reconcile"] = drift
+            if os.path.exists(self.persist_directory):
+                stats["storage_bytes"] = sum(
+                    os.path.getsize(os.path.join(dirpath, filename))
+                    for dirpath, _, filenames in os.walk(self.persist_directory)
+                    for filename in filenames
+                )
+        return stats
+
+    def print_collection_stats(self, reconcile=False):
+        """Print statistics about the vector store collection"""
+        stats = self.get_collection_stats(reconcile)
+        print(f"\nCollection Statistics:")
+        print(f"Total documents: {stats['total_chunks']}")
+        print(f"Unique URLs stored: {stats['unique_urls']}")
+        print(f"Unique domains: {stats['unique_domains']}")
+        print("Domains:", ", ".join(domain['domain'] for domain in stats['domains']))
+        print(f"Total text size: {stats['text_bytes'] / (1024*1024):.2f} MB")
+        if 'storage_bytes' in stats:
+            print(f"Total storage size on disk: {stats['storage_bytes'] / (1024*1024):.2f} MB")
+        return stats
 
 
 # Example usage
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Index example URLs or reconcile the collection metadata")
+    parser.add_argument("--reconcile", action="store_true",
+                        help="rescan the collection and fix drift in the stats store, URL registry, BM25 and dedup indexes")
+    args = parser.parse_args()
+
     persist_directory = 'chroma_db_websites'
     vector_store_manager = VectorStoreManager(persist_directory)
     
+    if args.reconcile:
+        print(vector_store_manager.reconcile())
+        vector_store_manager.close()
+        raise SystemExit
+    
     # Example URLs to process
     urls = ['https://huyenchip.com/2024/07/25/genai-platform.html', 
         'https://lilianweng.github.io/posts/2024-07-07-hallucination/',
@@ -150,9 +754,10 @@ if __name__ == "__main__":
     # Add more URLs as needed
     ]
     
-    # Process each URL
-    for url in urls:
-        vector_store_manager.process_url(url)
+    # Process all URLs in one batch
+    for result in vector_store_manager.process_urls(urls):
+        print(f"{result['status']:>8}  {result['url']}")
     
     # Print statistics
-    vector_store_manager.print_collection_stats()
\ No newline at end of file
+    vector_store_manager.print_collection_stats(reconcile=True)
+    vector_store_manager.close()
@@ -0,0 +1,184 @@
+import hashlib
+import queue
+import re
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup
+
+# Page furniture that repeats on every page of a site and only adds noise to chunks
+BOILERPLATE_TAGS = ["script", "style", "noscript", "template", "svg", "iframe",
+                    "nav", "header", "footer", "aside", "form"]
+
+
+def page_metadata(soup: "BeautifulSoup", url: str) -> Dict[str, str]:
+    """Source, title, description and language, as WebBaseLoader records them"""
+    metadata = {"source": url}
+    if title := soup.find("title"):
+        metadata["title"] = title.get_text()
+    if description := soup.find("meta", attrs={"name": "description"}):
+        metadata["description"] = description.get("content", "No description found.")
+    if html_tag := soup.find("html"):
+        metadata["language"] = html_tag.get("lang", "No language found.")
+    return metadata
+
+
+def strip_boilerplate(soup: "BeautifulSoup") -> str:
+    """Drop boilerplate elements and return the remaining text with whitespace collapsed"""
+    for tag in soup.find_all(BOILERPLATE_TAGS):
+        tag.decompose()
+    text = re.sub(r"[ \t\r\f\v]+", " ", soup.get_text())
+    return re.sub(r"\s*\n\s*(?:\n\s*)+", "\n\n", text).strip()
+
+
+def split_page(url: str, url_hash: str, html: str, chunk_size: int, chunk_overlap: int,
+               boilerplate: bool = True) -> Tuple[List[Tuple[str, Dict[str, Any]]], Dict[str, float]]:
+    """Parse, clean and chunk one page.
+
+    Runs in the parse process pool, so it takes and returns plain picklable data:
+    (chunk text, chunk metadata) pairs plus the seconds spent per stage.
+    """
+    # Imported on first use, in the worker that parses, rather than at app startup
+    from bs4 import BeautifulSoup
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    timings = {}
+    start = time.perf_counter()
+    soup = BeautifulSoup(html, "html.parser")
+    metadata = page_metadata(soup, url)
+    timings["parse"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    text = strip_boilerplate(soup) if boilerplate else soup.get_text()
+    timings["strip"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    domain = urlparse(url).netloc
+    chunks = [
+        (chunk, {**metadata, "url": url, "url_hash": url_hash, "domain": domain,
+                 "chunk_hash": hashlib.md5(chunk.encode()).hexdigest()})
+        for chunk in text_splitter.split_text(text)
+    ]
+    timings["chunk"] = time.perf_counter() - start
+    return chunks, timings
+
+
+class IngestPipeline:
+    """Fetch -> parse/clean/chunk/diff -> embed/write, connected by bounded queues.
+
+    fetch_workers threads fetch pages onto a queue of at most queue_size pages;
+    parse_workers threads turn them into index plans (the CPU-heavy parsing runs
+    in the manager's process pool) onto a second bounded queue; the calling thread
+    writes plans as soon as they arrive, grouping whatever is already waiting up
+    to batch_chunks new chunks per write. A slow stage blocks the one before it
+    instead of letting pages pile up in memory.
+
+    fetch(url, stored_fingerprint) returns (html, fingerprint), html being None for
+    an unmodified page; plan(url, html, fingerprint, stored_fingerprint) returns an
+    IndexPlan; write(plans) applies a list of plans. on_plan(plan) and
+    on_error(url, error) report per-URL outcomes; a failed write fails every URL in
+    its batch.
+    """
+
+    _DONE = object()
+
+    def __init__(self, fetch: Callable, plan: Callable, write: Callable, on_plan: Callable, on_error: Callable,
+                 fetch_workers: int = 16, parse_workers: int = 2, queue_size: int = 32, batch_chunks: int = 2048):
+        self.fetch = fetch
+        self.plan = plan
+        self.write = write
+        self.on_plan = on_plan
+        self.on_error = on_error
+        self.fetch_workers = fetch_workers
+        self.parse_workers = max(1, parse_workers)
+        self.queue_size = queue_size
+        self.batch_chunks = batch_chunks
+
+    def run(self, jobs: Iterable[Tuple[str, Optional[dict]]]):
+        """Index (url, stored_fingerprint) jobs and return when every plan is written"""
+        pending = queue.Queue()
+        for job in jobs:
+            pending.put(job)
+        fetch_workers = max(1, min(self.fetch_workers, pending.qsize()))
+        fetched = queue.Queue(maxsize=self.queue_size)
+        planned = queue.Queue(maxsize=self.queue_size)
+        fetchers_left = [fetch_workers]
+        parsers_left = [self.parse_workers]
+        lock = threading.Lock()
+
+        def fetch_loop():
+            try:
+                while True:
+                    try:
+                        url, stored_fingerprint = pending.get_nowait()
+                    except queue.Empty:
+                        return
+                    try:
+                        html, fingerprint = self.fetch(url, stored_fingerprint)
+                    except Exception as e:
+                        self.on_error(url, e)
+                        continue
+                    fetched.put((url, html, fingerprint, stored_fingerprint))
+            finally:
+                # The last fetcher out tells every parser to stop
+                with lock:
+                    fetchers_left[0] -= 1
+                    if fetchers_left[0] == 0:
+                        for _ in range(self.parse_workers):
+                            fetched.put(self._DONE)
+
+        def parse_loop():
+            try:
+                while True:
+                    item = fetched.get()
+                    if item is self._DONE:
+                        return
+                    url = item[0]
+                    try:
+                        plan = self.plan(*item)
+                    except Exception as e:
+                        self.on_error(url, e)
+                        continue
+                    self.on_plan(plan)
+                    planned.put(plan)
+            finally:
+                with lock:
+                    parsers_left[0] -= 1
+                    if parsers_left[0] == 0:
+                        planned.put(self._DONE)
+
+        threads = [threading.Thread(target=fetch_loop, name=f"ingest-fetch-{i}", daemon=True)
+                   for i in range(fetch_workers)]
+        threads += [threading.Thread(target=parse_loop, name=f"ingest-parse-{i}", daemon=True)
+                    for i in range(self.parse_workers)]
+        for thread in threads:
+            thread.start()
+
+        done = False
+        while not done:
+            batch = [planned.get()]
+            if batch[0] is self._DONE:
+                break
+            chunks = len(batch[0].add)
+            # Take whatever else is ready, without waiting for a full batch
+            while chunks < self.batch_chunks:
+                try:
+                    plan = planned.get_nowait()
+                except queue.Empty:
+                    break
+                if plan is self._DONE:
+                    done = True
+                    break
+                batch.append(plan)
+                chunks += len(plan.add)
+            try:
+                self.write(batch)
+            except Exception as e:
+                for plan in batch:
+                    self.on_error(plan.url, e)
+        for thread in threads:
+            thread.join()
@@ -0,0 +1,211 @@
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterable, Optional
+from urllib.parse import urlparse
+
+
+class JobQueue:
+    """Persistent SQLite-backed queue of indexing jobs served by an in-process worker pool.
+
+    - Jobs for a url_hash that is already queued or running for the same tenant are
+      deduplicated, so two force_update calls can never race on deleting the same
+      URL's chunks.
+    - At most max_per_domain jobs run concurrently for one domain, and at most
+      max_per_tenant for one tenant (other than the exempt_tenants), so a
+      tenant's bulk submission cannot take every worker while others' jobs wait.
+    - Failed jobs are retried with exponential backoff up to max_attempts, unless a
+      follow-up job for the same URL is already queued to take over.
+    - Jobs left 'running' by a crash are re-queued on startup.
+
+    The handler is called as handler(tenant, url, force_update, progress) and returns a
+    result string ('indexed', 'updated', 'unchanged', 'skipped'); raising marks the attempt failed.
+    """
+
+    ACTIVE = ("queued", "running")
+
+    def __init__(self, path: str, handler: Callable[[str, str, bool, Callable[[str], None]], str],
+                 workers: int = 4, max_per_domain: int = 2, max_per_tenant: Optional[int] = None,
+                 exempt_tenants: Iterable[str] = (), max_attempts: int = 3, backoff_seconds: float = 5.0):
+        self.handler = handler
+        self.workers = workers
+        self.max_per_domain = max_per_domain
+        self.max_per_tenant = max_per_tenant or workers
+        self.exempt_tenants = set(exempt_tenants)
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._running_per_domain: Dict[str, int] = {}
+        self._running_per_tenant: Dict[str, int] = {}
+        self._threads = []
+        self._stopping = False
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                url_hash TEXT NOT NULL,
+                domain TEXT NOT NULL,
+                force_update INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                progress TEXT,
+                result TEXT,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )""")
+        # Queues created before tenants existed hold the default tenant's jobs, recorded as ''
+        if "tenant" not in {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN tenant TEXT NOT NULL DEFAULT ''")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, next_attempt_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_url_hash ON jobs(url_hash, status)")
+        self._conn.execute("UPDATE jobs SET status = 'queued', progress = NULL WHERE status = 'running'")
+        self._conn.commit()
+
+    def start(self):
+        """Start the worker threads."""
+        self._stopping = False
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"index-job-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 10.0):
+        """Stop the workers after their current job; queued jobs stay in the file."""
+        with self._wakeup:
+            self._stopping = True
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def submit(self, url: str, url_hash: str, force_update: bool = False, tenant: str = "") -> str:
+        """Queue a job, or return the id of the tenant's active job for the same url_hash.
+
+        A forced request while the only active job is already running queues one
+        forced follow-up, since the running attempt may have read the page before
+        the change that prompted the refresh.
+        """
+        now = time.time()
+        with self._wakeup:
+            rows = self._conn.execute(
+                "SELECT id, status FROM jobs WHERE url_hash = ? AND tenant = ? AND status IN (?, ?) "
+                "ORDER BY created_at",
+                (url_hash, tenant, *self.ACTIVE),
+            ).fetchall()
+            queued = next((row for row in rows if row["status"] == "queued"), None)
+            if queued is not None:
+                if force_update:
+                    self._conn.execute("UPDATE jobs SET force_update = 1 WHERE id = ?", (queued["id"],))
+                    self._conn.commit()
+                return queued["id"]
+            if rows and not force_update:
+                return rows[0]["id"]
+            job_id = uuid.uuid4().hex
+            self._conn.execute(
+                "INSERT INTO jobs (id, url, url_hash, tenant, domain, force_update, status, attempts, "
+                "next_attempt_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, 'queued', 0, ?, ?, ?)",
+                (job_id, url, url_hash, tenant, urlparse(url).netloc, int(force_update), now, now, now),
+            )
+            self._conn.commit()
+            self._wakeup.notify()
+            return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return a job's status record, or None if unknown."""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["force_update"] = bool(job["force_update"])
+        return job
+
+    def _claim(self) -> Optional[sqlite3.Row]:
+        """Pick the oldest due job whose domain and tenant are under their concurrency limits (lock held)."""
+        rows = self._conn.execute(
+            "SELECT * FROM jobs WHERE status = 'queued' AND next_attempt_at <= ? ORDER BY created_at",
+            (time.time(),),
+        ).fetchall()
+        for row in rows:
+            if (self._running_per_domain.get(row["domain"], 0) < self.max_per_domain
+                    and (row["tenant"] in self.exempt_tenants
+                         or self._running_per_tenant.get(row["tenant"], 0) < self.max_per_tenant)):
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, progress = 'starting', "
+                    "updated_at = ? WHERE id = ?",
+                    (time.time(), row["id"]),
+                )
+                self._conn.commit()
+                self._running_per_domain[row["domain"]] = self._running_per_domain.get(row["domain"], 0) + 1
+                self._running_per_tenant[row["tenant"]] = self._running_per_tenant.get(row["tenant"], 0) + 1
+                return row
+        return None
+
+    def _update(self, job_id: str, **fields):
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+            self._conn.commit()
+
+    def _queued_follow_up(self, job: sqlite3.Row) -> Optional[str]:
+        """Return the id of another queued job for the same url_hash and tenant, if any."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id FROM jobs WHERE url_hash = ? AND tenant = ? AND status = 'queued' AND id != ?",
+                (job["url_hash"], job["tenant"], job["id"]),
+            ).fetchone()
+        return row["id"] if row is not None else None
+
+    def _work(self):
+        while True:
+            with self._wakeup:
+                job = None
+                while not self._stopping:
+                    try:
+                        job = self._claim()
+                    except Exception as e:
+                        # A locked or failing queue file must not take the worker down with it
+                        print(f"Index job worker could not claim a job: {e}")
+                        if self._conn.in_transaction:
+                            self._conn.rollback()
+                    if job is not None:
+                        break
+                    # Wake up periodically so backed-off jobs are picked up when due
+                    self._wakeup.wait(timeout=1.0)
+                if self._stopping:
+                    return
+            self._run(job)
+
+    def _run(self, job: sqlite3.Row):
+        job_id = job["id"]
+        try:
+            result = self.handler(job["tenant"], job["url"], bool(job["force_update"]),
+                                  lambda progress: self._update(job_id, progress=progress))
+            self._update(job_id, status="succeeded", progress="done", result=result, error=None)
+        except Exception as e:
+            attempts = job["attempts"] + 1
+            follow_up = self._queued_follow_up(job)
+            if follow_up is not None:
+                print(f"Index job {job_id} for {job['url']} failed ({e}); queued job {follow_up} takes over")
+                self._update(job_id, status="failed", progress=None, error=f"{e} (superseded by job {follow_up})")
+            elif attempts < self.max_attempts:
+                delay = self.backoff_seconds * 2 ** (attempts - 1)
+                print(f"Index job {job_id} for {job['url']} failed ({e}); retrying in {delay:.1f}s")
+                self._update(job_id, status="queued", progress=None, error=str(e),
+                             next_attempt_at=time.time() + delay)
+            else:
+                print(f"Index job {job_id} for {job['url']} failed after {attempts} attempts: {e}")
+                self._update(job_id, status="failed", progress=None, error=str(e))
+        finally:
+            with self._wakeup:
+                self._running_per_domain[job["domain"]] -= 1
+                self._running_per_tenant[job["tenant"]] -= 1
+                self._wakeup.notify_all()
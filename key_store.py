@@ -0,0 +1,148 @@
+import argparse
+import hashlib
+import re
+import secrets
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+# Client ids name per-tenant directories, so they are restricted to safe path characters
+CLIENT_ID_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$")
+
+
+def hash_key(key: str) -> str:
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+class KeyStore:
+    """API keys per client id, stored as SHA-256 hashes in SQLite.
+
+    Plaintext keys are never written; a key is shown once, when it is created.
+    Validated keys are cached in memory by hash, so a request costs one hash and
+    one dict lookup. Entries expire after cache_ttl seconds, which bounds how long
+    a key revoked by another process (e.g. the CLI) keeps working in this one.
+    """
+
+    def __init__(self, path: str, cache_ttl: float = 60.0):
+        self.cache_ttl = cache_ttl
+        self._lock = threading.Lock()
+        self._cache: Dict[str, Tuple[dict, float]] = {}  # key hash -> (record, expires at)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS api_keys (
+                key_hash TEXT PRIMARY KEY,
+                client_id TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                is_active INTEGER NOT NULL DEFAULT 1,
+                configured INTEGER NOT NULL DEFAULT 0
+            )""")
+        # Stores created before configured keys were tracked: their keys count as issued by the CLI
+        if "configured" not in {row["name"] for row in self._conn.execute("PRAGMA table_info(api_keys)")}:
+            self._conn.execute("ALTER TABLE api_keys ADD COLUMN configured INTEGER NOT NULL DEFAULT 0")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS api_keys_client ON api_keys(client_id)")
+        self._conn.commit()
+
+    @staticmethod
+    def check_client_id(client_id: str):
+        if not CLIENT_ID_PATTERN.match(client_id):
+            raise ValueError(f"Invalid client id {client_id!r}: use up to 64 letters, digits, '_', '-' or '.'")
+
+    def add(self, client_id: str, key: Optional[str] = None) -> str:
+        """Store a key for client_id (a new random one if none is given) and return it."""
+        self.check_client_id(client_id)
+        key = key or secrets.token_urlsafe(32)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO api_keys (key_hash, client_id, created_at, is_active) VALUES (?, ?, ?, 1)",
+                (hash_key(key), client_id, time.time()),
+            )
+            self._conn.commit()
+            self._cache.pop(hash_key(key), None)
+        return key
+
+    def ensure_configured(self, client_id: str, key: str) -> int:
+        """Make key the configured key of client_id and return how many previously configured keys were revoked.
+
+        The key from the environment is stored like any other (a revoked one stays
+        revoked); when it changes, the key it replaces stops working. Keys issued
+        with add() are left alone.
+        """
+        self.check_client_id(client_id)
+        key_hash = hash_key(key)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO api_keys (key_hash, client_id, created_at, is_active, configured) "
+                "VALUES (?, ?, ?, 1, 1)",
+                (key_hash, client_id, time.time()),
+            )
+            revoked = self._conn.execute(
+                "UPDATE api_keys SET is_active = 0 "
+                "WHERE client_id = ? AND configured = 1 AND key_hash != ? AND is_active = 1", (client_id, key_hash)
+            ).rowcount
+            self._conn.commit()
+            if revoked:
+                self._cache.clear()
+        return revoked
+
+    def revoke(self, client_id: str) -> int:
+        """Deactivate every key of client_id and return how many were active."""
+        with self._lock:
+            revoked = self._conn.execute(
+                "UPDATE api_keys SET is_active = 0 WHERE client_id = ? AND is_active = 1", (client_id,)
+            ).rowcount
+            self._conn.commit()
+            self._cache.clear()
+        return revoked
+
+    def lookup(self, key: str) -> Optional[dict]:
+        """Return {client_id, created_at, is_active} for a key, or None if it was never issued."""
+        key_hash = hash_key(key)
+        now = time.monotonic()
+        cached = self._cache.get(key_hash)
+        if cached is not None and cached[1] > now:
+            return cached[0]
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT client_id, created_at, is_active FROM api_keys WHERE key_hash = ?", (key_hash,)
+            ).fetchone()
+        if row is None:
+            # Not cached: random bad keys would grow the cache without bound, and the lookup is one index probe
+            return None
+        record = {"client_id": row["client_id"], "created_at": datetime.utcfromtimestamp(row["created_at"]),
+                  "is_active": bool(row["is_active"])}
+        self._cache[key_hash] = (record, now + self.cache_ttl)
+        return record
+
+    def list(self) -> List[dict]:
+        """Return one entry per client id with its number of active and revoked keys."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT client_id, SUM(is_active) AS active, SUM(1 - is_active) AS revoked, "
+                "MIN(created_at) AS created_at FROM api_keys GROUP BY client_id ORDER BY client_id"
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+
+if __name__ == "__main__":
+    from config import API_KEY_STORE_PATH
+
+    parser = argparse.ArgumentParser(description="Manage tenant API keys")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("create", help="issue a new key for a client id").add_argument("client_id")
+    commands.add_parser("revoke", help="revoke every key of a client id").add_argument("client_id")
+    commands.add_parser("list", help="list client ids and their key counts")
+    args = parser.parse_args()
+
+    store = KeyStore(API_KEY_STORE_PATH)
+    if args.command == "create":
+        print(f"X-Client-ID: {args.client_id}\nX-API-Key: {store.add(args.client_id)}")
+        print("The key is stored hashed and cannot be shown again.")
+    elif args.command == "revoke":
+        print(f"Revoked {store.revoke(args.client_id)} key(s) of {args.client_id}")
+    else:
+        for entry in store.list():
+            print(f"{entry['client_id']}: {entry['active']} active, {entry['revoked']} revoked")
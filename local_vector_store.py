@@ -0,0 +1,377 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from vector_backends import VectorBackend
+
+
+class LocalVectorStore(VectorBackend):
+    """Built-in engine: float32 vectors in a memory-mapped file, chunk data in SQLite.
+
+    Vectors are L2-normalized on write, so cosine similarity is a dot product. With
+    index="flat" a query is an exact, batched matrix-vector product over the mapped
+    rows, block_rows at a time; opening the store maps the file and reads the live
+    row numbers, and the OS page cache keeps hot pages. With index="hnsw" queries go
+    through an approximate hnswlib graph labelled by row number, saved next to the
+    vectors at most every hnsw_save_interval seconds and rebuilt from them if the
+    saved graph is missing or older than the data. Rows freed by deletes are reused
+    by later writes.
+
+    With read_only=True the store is a replica for reader processes: the file is
+    mapped read-only, so its pages are shared through the OS page cache with the
+    writer and every other reader, and refresh() picks up what the writer has
+    written since. A replica only uses a saved HNSW graph that is current and
+    falls back to exact scans until the writer saves the next one.
+    """
+
+    name = "local"
+
+    def __init__(self, directory: str, block_rows: int = 65536, initial_capacity: int = 1024,
+                 index: str = "flat", hnsw_m: int = 16, hnsw_ef_construction: int = 200,
+                 hnsw_ef_search: int = 100, hnsw_save_interval: float = 60.0, read_only: bool = False):
+        if index not in ("flat", "hnsw"):
+            raise ValueError(f"Unknown local vector index: {index}")
+        self.directory = directory
+        self.block_rows = block_rows
+        self.index = index
+        self.hnsw_m = hnsw_m
+        self.hnsw_ef_construction = hnsw_ef_construction
+        self.hnsw_ef_search = hnsw_ef_search
+        self.hnsw_save_interval = hnsw_save_interval
+        self.read_only = read_only
+        self._lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+        self._vectors_path = os.path.join(directory, "vectors.f32")
+        self._hnsw_path = os.path.join(directory, "hnsw.bin")
+        self._conn = sqlite3.connect(os.path.join(directory, "chunks.sqlite"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                row INTEGER PRIMARY KEY,
+                id TEXT NOT NULL UNIQUE,
+                url_hash TEXT,
+                document TEXT,
+                metadata TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS chunks_url_hash ON chunks(url_hash);
+            CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+        """)
+        self._conn.commit()
+        self._initial_capacity = initial_capacity
+        self._vectors = None
+        self._alive = np.zeros(0, dtype=bool)
+        self._hnsw = None
+        self._hnsw_saved_at = 0.0
+        self._load()
+        self._free_rows = list(np.flatnonzero(~self._alive)[::-1])
+        print(f"Opened local vector store in {directory} ({int(self._alive.sum())} chunks, {index} index"
+              f"{', read-only' if read_only else ''})")
+
+    def _settings(self) -> Dict[str, str]:
+        return dict(self._conn.execute("SELECT key, value FROM settings"))
+
+    def _load(self):
+        """Read the settings and live rows, map the vectors and open the HNSW graph"""
+        settings = self._settings()
+        self.dim = int(settings["dim"]) if "dim" in settings else None
+        # Bumped with every write, so a saved HNSW graph (or a replica) can tell whether it is current
+        self._writes = int(settings.get("writes", 0))
+        self._hnsw_saved_writes = int(settings.get("hnsw_writes", -1))
+        if self.dim is None:
+            return
+        # Rows first: the writer grows the file before committing rows that live in the new part
+        rows = np.fromiter((row for (row,) in self._conn.execute("SELECT row FROM chunks")), dtype=np.int64)
+        self._open_vectors()
+        self._alive = np.zeros(len(self._vectors), dtype=bool)
+        self._alive[rows] = True
+        if self.index == "hnsw":
+            self._open_hnsw()
+
+    def _open_vectors(self, capacity: Optional[int] = None):
+        """Map the vector file, growing it to at least capacity rows."""
+        row_bytes = self.dim * 4
+        size = os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+        if self.read_only:
+            self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(size // row_bytes, self.dim))
+            return
+        rows = max(size // row_bytes, capacity or 0, self._initial_capacity)
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+        if rows * row_bytes != size:
+            with open(self._vectors_path, "ab") as f:
+                f.truncate(rows * row_bytes)
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(rows, self.dim))
+
+    def _open_hnsw(self):
+        """Load the saved HNSW graph if it matches the data, else rebuild it from the vectors"""
+        import hnswlib
+
+        self._hnsw = hnswlib.Index(space="ip", dim=self.dim)
+        if os.path.exists(self._hnsw_path) and self._hnsw_saved_writes == self._writes:
+            self._hnsw.load_index(self._hnsw_path, max_elements=len(self._alive))
+            self._hnsw_saved_at = time.time()
+            return
+        if self.read_only:
+            # Rebuilding is the writer's job; scan exactly until it saves a current graph
+            self._hnsw = None
+            return
+        self._hnsw.init_index(max_elements=len(self._alive), M=self.hnsw_m, ef_construction=self.hnsw_ef_construction)
+        rows = np.flatnonzero(self._alive)
+        if len(rows):
+            print(f"Rebuilding HNSW index over {len(rows)} vectors in {self.directory}...")
+            for start in range(0, len(rows), self.block_rows):
+                block = rows[start:start + self.block_rows]
+                self._hnsw.add_items(np.asarray(self._vectors[block]), block)
+
+    def _check_writable(self):
+        if self.read_only:
+            raise RuntimeError(f"Local vector store in {self.directory} is open read-only")
+
+    def refresh(self) -> bool:
+        """Pick up writes another process made since the last load (read-only replicas); True if there were any.
+
+        While nothing changed this is one SQLite read. Queries already running keep
+        the mapping and live rows they started with.
+        """
+        if not self.read_only:
+            return False
+        settings = self._settings()
+        if (int(settings.get("writes", 0)) == self._writes
+                and int(settings.get("hnsw_writes", -1)) == self._hnsw_saved_writes):
+            return False
+        with self._lock:
+            self._load()
+        return True
+
+    def _bump_writes(self):
+        self._writes += 1
+        self._conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('writes', ?)", (str(self._writes),))
+
+    def _allocate_rows(self, count: int) -> List[int]:
+        """Take free rows, doubling the mapped file when they run out (lock held)."""
+        if len(self._free_rows) < count:
+            old_capacity = len(self._alive)
+            new_capacity = max(old_capacity * 2, old_capacity + count - len(self._free_rows), self._initial_capacity)
+            self._open_vectors(new_capacity)
+            self._alive = np.concatenate([self._alive, np.zeros(new_capacity - old_capacity, dtype=bool)])
+            if self._hnsw is not None:
+                self._hnsw.resize_index(new_capacity)
+            self._free_rows = list(range(new_capacity - 1, old_capacity - 1, -1)) + self._free_rows
+        return [int(self._free_rows.pop()) for _ in range(count)]
+
+    @staticmethod
+    def _where_sql(where: Optional[Dict[str, Any]]) -> Tuple[str, List[Any]]:
+        """Translate {key: value} and {key: {'$in': [...]}} filters (all keys ANDed) to SQL."""
+        if not where:
+            return "", []
+        clauses, params = [], []
+        for key, condition in where.items():
+            column = "url_hash" if key == "url_hash" else f"json_extract(metadata, '$.{key}')"
+            if isinstance(condition, dict):
+                if set(condition) != {"$in"}:
+                    raise ValueError(f"Unsupported filter on {key}: {condition}")
+                values = list(condition["$in"])
+                clauses.append(f"{column} IN ({', '.join('?' * len(values))})" if values else "0")
+                params.extend(values)
+            else:
+                clauses.append(f"{column} = ?")
+                params.append(condition)
+        return " WHERE " + " AND ".join(clauses), params
+
+    @staticmethod
+    def _result(rows, include: Sequence[str]) -> Dict[str, Any]:
+        return {
+            "ids": [row[0] for row in rows],
+            "metadatas": [json.loads(row[1]) for row in rows] if "metadatas" in include else None,
+            "documents": [row[2] for row in rows] if "documents" in include else None,
+        }
+
+    def count(self) -> int:
+        with self._lock:
+            return int(self._alive.sum())
+
+    def get(self, ids=None, where=None, include=("metadatas", "documents"), limit=None, offset=None):
+        sql, params = self._where_sql(where)
+        if ids is not None:
+            ids = list(ids)
+            sql += (" AND " if sql else " WHERE ") + (f"id IN ({', '.join('?' * len(ids))})" if ids else "0")
+            params.extend(ids)
+        sql += " ORDER BY row"
+        if limit is not None or offset:
+            sql += " LIMIT ? OFFSET ?"
+            params.extend([limit if limit is not None else -1, offset or 0])
+        with self._lock:
+            rows = self._conn.execute(f"SELECT id, metadata, document FROM chunks{sql}", params).fetchall()
+        return self._result(rows, include)
+
+    def upsert(self, ids, embeddings, metadatas, documents):
+        self._check_writable()
+        if not ids:
+            return
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms == 0, 1, norms)
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self._conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('dim', ?)", (str(self.dim),))
+                self._open_vectors()
+                self._alive = np.zeros(len(self._vectors), dtype=bool)
+                self._free_rows = list(range(len(self._alive) - 1, -1, -1))
+                if self.index == "hnsw":
+                    self._open_hnsw()
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match the store's {self.dim}")
+            existing = dict(self._conn.execute(
+                f"SELECT id, row FROM chunks WHERE id IN ({', '.join('?' * len(ids))})", list(ids)).fetchall())
+            new_rows = iter(self._allocate_rows(sum(1 for chunk_id in ids if chunk_id not in existing)))
+            rows = [existing[chunk_id] if chunk_id in existing else next(new_rows) for chunk_id in ids]
+            self._vectors[rows] = vectors
+            self._alive[rows] = True
+            if self._hnsw is not None:
+                # Re-adding a row's label replaces its vector, including rows freed by a delete
+                self._hnsw.add_items(vectors, rows)
+            self._bump_writes()
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (row, id, url_hash, document, metadata) VALUES (?, ?, ?, ?, ?)",
+                [(row, chunk_id, (meta or {}).get("url_hash"), document, json.dumps(meta or {}))
+                 for row, chunk_id, meta, document in zip(rows, ids, metadatas, documents)])
+            self._conn.commit()
+
+    def update(self, ids, metadatas):
+        self._check_writable()
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE chunks SET metadata = ?, url_hash = ? WHERE id = ?",
+                [(json.dumps(meta), meta.get("url_hash"), chunk_id) for chunk_id, meta in zip(ids, metadatas)])
+            self._conn.commit()
+
+    def delete(self, ids=None, where=None):
+        self._check_writable()
+        sql, params = self._where_sql(where)
+        if ids is not None:
+            ids = list(ids)
+            sql += (" AND " if sql else " WHERE ") + (f"id IN ({', '.join('?' * len(ids))})" if ids else "0")
+            params.extend(ids)
+        with self._lock:
+            rows = [row for (row,) in self._conn.execute(f"SELECT row FROM chunks{sql}", params)]
+            if not rows:
+                return
+            self._conn.execute(f"DELETE FROM chunks{sql}", params)
+            self._bump_writes()
+            self._conn.commit()
+            self._alive[rows] = False
+            self._free_rows.extend(rows)
+            if self._hnsw is not None:
+                for row in rows:
+                    self._hnsw.mark_deleted(row)
+
+    def _flat_search(self, queries: np.ndarray, n_results: int, vectors, alive) -> Tuple[np.ndarray, np.ndarray]:
+        """Exact top-n (scores, rows) per query, merged block by block up to the last live row"""
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+        end = int(np.flatnonzero(alive)[-1]) + 1
+        # Many queries at once score fewer rows per block, keeping the score matrix at most 64 * block_rows
+        block = max(1, self.block_rows * 64 // max(64, len(queries)))
+        for start in range(0, end, block):
+            stop = min(start + block, end)
+            scores = queries @ np.asarray(vectors[start:stop]).T
+            scores[:, ~alive[start:stop]] = -np.inf
+            best_scores = np.concatenate([best_scores, scores], axis=1)
+            best_rows = np.concatenate([best_rows, np.broadcast_to(np.arange(start, stop), scores.shape)], axis=1)
+            if best_scores.shape[1] > n_results:
+                keep = np.argpartition(-best_scores, n_results - 1, axis=1)[:, :n_results]
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+        return best_scores, best_rows
+
+    def _hnsw_search(self, queries: np.ndarray, n_results: int, live: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Approximate top-n (scores, rows) per query from the HNSW graph (lock held)"""
+        k = min(n_results, live)
+        self._hnsw.set_ef(max(self.hnsw_ef_search, k))
+        rows, distances = self._hnsw.knn_query(queries, k=k)
+        return 1.0 - distances, rows.astype(np.int64)
+
+    def query(self, query_embeddings, n_results=10, include=("metadatas", "documents", "distances")):
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries /= np.where(norms == 0, 1, norms)
+        result = {"ids": [], "metadatas": [], "documents": [], "distances": []}
+        with self._lock:
+            vectors, alive = self._vectors, self._alive
+            live = int(alive.sum())
+            best = None
+            if live and n_results > 0 and self._hnsw is not None:
+                try:
+                    best = self._hnsw_search(queries, n_results, live)
+                except RuntimeError:
+                    # hnswlib cannot fill k results when most rows are deleted; scan instead
+                    best = None
+        if not live or n_results <= 0:
+            for key in result:
+                result[key] = [[] for _ in queries]
+            return result
+        best_scores, best_rows = best or self._flat_search(queries, n_results, vectors, alive)
+
+        for scores, rows in zip(best_scores, best_rows):
+            order = np.argsort(-scores)
+            hits = [(int(rows[i]), float(scores[i])) for i in order if np.isfinite(scores[i])]
+            by_row = {}
+            if hits:
+                with self._lock:
+                    by_row = {row[0]: row[1:] for row in self._conn.execute(
+                        f"SELECT row, id, metadata, document FROM chunks WHERE row IN ({', '.join('?' * len(hits))})",
+                        [row for row, _ in hits])}
+            # A row deleted since the scan is skipped
+            hits = [(row, score) for row, score in hits if row in by_row]
+            result["ids"].append([by_row[row][0] for row, _ in hits])
+            result["metadatas"].append([json.loads(by_row[row][1]) for row, _ in hits])
+            result["documents"].append([by_row[row][2] for row, _ in hits])
+            result["distances"].append([1.0 - score for _, score in hits])
+        for key in ("metadatas", "documents", "distances"):
+            if key not in include:
+                result[key] = None
+        return result
+
+    def relevance_score(self, distance: float) -> float:
+        # Cosine distance, so relevance is the cosine similarity
+        return 1.0 - distance
+
+    def distances(self, query_embeddings, embeddings):
+        # Same cosine distance as query(), for vectors that are not stored yet
+        queries = np.array(query_embeddings, dtype=np.float32)
+        vectors = np.array(embeddings, dtype=np.float32)
+        for matrix in (queries, vectors):
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix /= np.where(norms == 0, 1, norms)
+        return 1.0 - queries @ vectors.T
+
+    def warm_up(self):
+        """Read the mapped vectors once, so the first flat scans hit the page cache rather than disk"""
+        if self.index != "flat" or self._vectors is None:
+            return
+        live = np.flatnonzero(self._alive)
+        end = int(live[-1]) + 1 if len(live) else 0
+        for start in range(0, end, self.block_rows):
+            np.asarray(self._vectors[start:min(start + self.block_rows, end)]).sum()
+
+    def persist(self):
+        if self.read_only:
+            return
+        with self._lock:
+            if self._vectors is not None:
+                self._vectors.flush()
+            if (self._hnsw is not None and self._hnsw_saved_writes != self._writes
+                    and time.time() - self._hnsw_saved_at >= self.hnsw_save_interval):
+                self._hnsw.save_index(self._hnsw_path)
+                self._hnsw_saved_writes = self._writes
+                self._hnsw_saved_at = time.time()
+                self._conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('hnsw_writes', ?)",
+                                   (str(self._writes),))
+                self._conn.commit()
@@ -1,15 +1,216 @@
-from fastapi import FastAPI, HTTPException, Depends
-from pydantic import BaseModel, HttpUrl
-from typing import List, Optional
-from rag_service import RAGService
-from config import PERSIST_DIRECTORY, port_no, host_name
+from fastapi import FastAPI, HTTPException, Depends, Request
+from fastapi.responses import StreamingResponse, PlainTextResponse, JSONResponse, Response
+from pydantic import BaseModel, HttpUrl, conlist
+from starlette.background import BackgroundTask
+from typing import List, Optional, Tuple, Dict
+from session_store import SessionStore
+from tracing import StageTimer, metrics
+from warmup import Warmup
+from tenants import TenantRegistry, build_tenant_service
+from tenant_limits import TenantLimiter, RateLimitExceeded
+from config import (port_no, host_name, JOB_QUEUE_PATH, JOB_WORKERS,
+                    JOB_MAX_PER_DOMAIN, JOB_MAX_ATTEMPTS, JOB_RETRY_BACKOFF_SECONDS,
+                    RECRAWL_ENABLED, RECRAWL_STATE_PATH, RECRAWL_DEFAULT_INTERVAL_SECONDS,
+                    RECRAWL_DOMAIN_INTERVALS, RECRAWL_MIN_DOMAIN_DELAY_SECONDS,
+                    RECRAWL_MAX_DOMAINS_IN_PARALLEL, RECRAWL_TICK_SECONDS,
+                    SESSION_STORE_PATH, SESSION_MAX_SESSIONS, SESSION_MAX_MESSAGES, SESSION_TTL_SECONDS,
+                    TIMING_HEADER, WARMUP_REQUEST_TIMEOUT_SECONDS, WARMUP_SHUTDOWN_TIMEOUT_SECONDS,
+                    SERVING_ROLE, SERVING_WORKERS, WRITER_PORT, WRITER_URL, API_CLIENT_ID,
+                    TENANT_CHAT_RATE, TENANT_CHAT_BURST, TENANT_CHAT_CONCURRENCY, TENANT_INDEX_RATE,
+                    TENANT_INDEX_BURST, TENANT_INDEX_CONCURRENCY, TENANT_BATCH_RATE, TENANT_BATCH_BURST,
+                    TENANT_BATCH_CONCURRENCY, TENANT_LIMITS)
 from auth_service import auth_service, get_api_key, APIKey
 import warnings
 warnings.filterwarnings('ignore')
 from datetime import datetime
+import asyncio
+import json
+import math
+import os
+import time
 
 app = FastAPI()
-rag_service = RAGService(PERSIST_DIRECTORY)
+
+# Built by the background warmup, so the server binds (and /healthz answers) at once
+# instead of after langchain, chromadb and the vector index have loaded
+tenants = None
+index_jobs = None
+recrawler = None
+
+sessions = SessionStore(
+    SESSION_STORE_PATH,
+    max_sessions=SESSION_MAX_SESSIONS,
+    max_messages=SESSION_MAX_MESSAGES,
+    ttl_seconds=SESSION_TTL_SECONDS,
+    # Consecutive turns of a conversation may land on different workers
+    shared=SERVING_ROLE != "single"
+)
+
+# Rate limits and concurrency caps on chat and index requests, per tenant
+tenant_limits = TenantLimiter({
+    "chat": {"rate": TENANT_CHAT_RATE, "burst": TENANT_CHAT_BURST, "concurrency": TENANT_CHAT_CONCURRENCY},
+    "index": {"rate": TENANT_INDEX_RATE, "burst": TENANT_INDEX_BURST, "concurrency": TENANT_INDEX_CONCURRENCY},
+    "batch": {"rate": TENANT_BATCH_RATE, "burst": TENANT_BATCH_BURST, "concurrency": TENANT_BATCH_CONCURRENCY},
+}, TENANT_LIMITS, exempt=[API_CLIENT_ID])
+metrics.add_collector(tenant_limits.collect_metrics)
+
+def build_rag_service(tenant: str):
+    return build_tenant_service(tenant, API_CLIENT_ID, read_only=SERVING_ROLE == "reader")
+
+def build_warm_rag_service(tenant: str):
+    """A tenant's RAG service with its vector index and default chain loaded."""
+    service = build_rag_service(tenant)
+    service.warm_up()
+    return service
+
+def warm_up(progress):
+    """Load the default tenant's service, index and chains, then start the background workers."""
+    global tenants, index_jobs, recrawler
+    from job_queue import JobQueue
+    from recrawler import RecrawlScheduler
+
+    progress("loading rag service and vector index")
+    registry = TenantRegistry(build_warm_rag_service, API_CLIENT_ID)
+    # Other tenants load on their first request
+    registry.get(API_CLIENT_ID)
+    metrics.add_collector(registry.collect_metrics)
+    # Readers forward index and job requests, so only the writer (or a single process) runs the queue and recrawler
+    if SERVING_ROLE != "reader":
+        jobs = JobQueue(
+            JOB_QUEUE_PATH,
+            registry.run_index_job,
+            workers=JOB_WORKERS,
+            max_per_domain=JOB_MAX_PER_DOMAIN,
+            max_per_tenant=TENANT_INDEX_CONCURRENCY,
+            # Jobs queued before tenants existed are the default tenant's, recorded as ''
+            exempt_tenants=[API_CLIENT_ID, ""],
+            max_attempts=JOB_MAX_ATTEMPTS,
+            backoff_seconds=JOB_RETRY_BACKOFF_SECONDS
+        )
+        scheduler = RecrawlScheduler(
+            RECRAWL_STATE_PATH,
+            registry.list_indexed_urls,
+            registry.refresh_url,
+            default_interval=RECRAWL_DEFAULT_INTERVAL_SECONDS,
+            domain_intervals=RECRAWL_DOMAIN_INTERVALS,
+            min_domain_delay=RECRAWL_MIN_DOMAIN_DELAY_SECONDS,
+            max_domains_in_parallel=RECRAWL_MAX_DOMAINS_IN_PARALLEL,
+            tick_seconds=RECRAWL_TICK_SECONDS
+        )
+        progress("starting workers")
+        jobs.start()
+        if RECRAWL_ENABLED:
+            scheduler.start()
+        index_jobs, recrawler = jobs, scheduler
+    tenants = registry
+
+warmup = Warmup(warm_up)
+
+metrics.describe("rag_http_requests_in_flight", "gauge", "HTTP requests being handled")
+metrics.describe("rag_http_requests_total", "counter", "HTTP requests by route and status")
+metrics.describe("rag_http_request_seconds", "histogram", "HTTP request latency by route (streams: time to first byte)")
+
+PROBE_PATHS = ("/healthz", "/readyz")
+WRITER_ROUTES = ("/api/v1/index", "/api/v1/jobs")
+
+def is_writer_request(request: Request) -> bool:
+    """Index and job requests, and stats reconciles (which rebuild the indexes), belong to the writer."""
+    if request.url.path.startswith(WRITER_ROUTES):
+        return True
+    return (request.url.path == "/api/v1/stats"
+            and request.query_params.get("reconcile", "").lower() in ("1", "true", "yes", "on"))
+
+@app.middleware("http")
+async def wait_for_warmup(request: Request, call_next):
+    """Hold API requests that arrive during warmup, answering 503 if it takes too long or failed."""
+    if not warmup.ready and request.url.path not in PROBE_PATHS:
+        if not await warmup.await_ready(WARMUP_REQUEST_TIMEOUT_SECONDS):
+            return JSONResponse(status_code=503, content={"detail": "Service is starting", **warmup.status()},
+                                headers={"Retry-After": "5"})
+    return await call_next(request)
+
+# Connection-level headers a proxy must not pass on, plus the body framing, which
+# aiohttp has already undone (decompressed, de-chunked) by the time the body is read
+UNFORWARDED_HEADERS = {"connection", "keep-alive", "proxy-authenticate", "proxy-authorization", "te", "trailer",
+                       "trailers", "transfer-encoding", "upgrade", "host", "content-length", "content-encoding"}
+
+# One connection pool to the writer for the worker's lifetime, opened at startup on readers
+writer_session = None
+
+def forwardable_headers(headers):
+    """(name, value) pairs of headers to pass through the proxy, repeated headers included."""
+    return [(name, value) for name, value in headers.items() if name.lower() not in UNFORWARDED_HEADERS]
+
+@app.middleware("http")
+async def forward_to_writer(request: Request, call_next):
+    """On reader workers, pass writer requests on to the writer process instead of serving them."""
+    if SERVING_ROLE != "reader" or not is_writer_request(request):
+        return await call_next(request)
+    import aiohttp
+    url = WRITER_URL + request.url.path + (f"?{request.url.query}" if request.url.query else "")
+    try:
+        async with writer_session.request(request.method, url, headers=forwardable_headers(request.headers),
+                                          data=await request.body()) as upstream:
+            response = Response(await upstream.read(), status_code=upstream.status)
+            # Set-Cookie and friends may repeat, so append rather than build a dict
+            for name, value in forwardable_headers(upstream.headers):
+                response.headers.append(name, value)
+            return response
+    except aiohttp.ClientError as e:
+        return JSONResponse(status_code=502, content={"detail": f"Index writer unavailable: {e}"})
+
+@app.middleware("http")
+async def instrument_requests(request: Request, call_next):
+    """Count requests in flight, time them per route and add the per-stage X-Timing header."""
+    timer = StageTimer()
+    start = time.perf_counter()
+    with metrics.in_flight("rag_http_requests_in_flight"), timer.bound():
+        response = await call_next(request)
+    elapsed = time.perf_counter() - start
+    # The route template, not the raw path, so ids don't explode the label set
+    route = request.scope.get("route")
+    route_path = route.path if route is not None else "unmatched"
+    metrics.inc("rag_http_requests_total", method=request.method, route=route_path, status=response.status_code)
+    metrics.observe("rag_http_request_seconds", elapsed, route=route_path)
+    if TIMING_HEADER:
+        timing = ", ".join(filter(None, [timer.header(), f"total={elapsed * 1000:.1f}"]))
+        # A response forwarded from the writer carries the writer's own breakdown; keep it, prefixed
+        writer_timing = response.headers.get("X-Timing")
+        if writer_timing:
+            timing += ", " + ", ".join(f"writer_{pair.strip()}" for pair in writer_timing.split(","))
+        response.headers["X-Timing"] = timing
+    return response
+
+@app.on_event("startup")
+async def start_background_workers():
+    global writer_session
+    if SERVING_ROLE == "reader":
+        import aiohttp
+        writer_session = aiohttp.ClientSession()
+    warmup.start()
+
+@app.on_event("shutdown")
+async def stop_background_workers():
+    if writer_session is not None:
+        await writer_session.close()
+    if not warmup.wait(WARMUP_SHUTDOWN_TIMEOUT_SECONDS):
+        return
+    if recrawler is not None:
+        recrawler.stop()
+        index_jobs.stop()
+    tenants.close()
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and serving, whether or not warmup has finished."""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: 200 once the vector index and chains are loaded, 503 with the warmup stage until then."""
+    if warmup.ready:
+        return warmup.status()
+    return JSONResponse(status_code=503, content=warmup.status())
 
 # Existing model definitions...
 class URLInput(BaseModel):
@@ -20,6 +221,31 @@ class URLResponse(BaseModel):
     status: str
     message: str
     was_indexed: bool
+    job_id: Optional[str] = None
+
+class JobStatus(BaseModel):
+    id: str
+    url: str
+    status: str  # queued, running, succeeded or failed
+    progress: Optional[str] = None
+    result: Optional[str] = None  # indexed, updated, unchanged or skipped once succeeded
+    error: Optional[str] = None
+    attempts: int
+    created_at: float
+    updated_at: float
+
+class URLBatchInput(BaseModel):
+    urls: List[HttpUrl]
+    force_update: bool = False
+
+class URLStatus(BaseModel):
+    url: str
+    status: str  # indexed, updated, unchanged, skipped or failed
+    chunks: int
+    error: Optional[str] = None
+
+class URLBatchResponse(BaseModel):
+    results: List[URLStatus]
 
 class ChatMessage(BaseModel):
     role: str
@@ -27,20 +253,63 @@ class ChatMessage(BaseModel):
 
 class ChatInput(BaseModel):
     query: str
-    chat_history: Optional[List[ChatMessage]] = []
+    session_id: Optional[str] = None  # History is kept server-side once a session exists
+    chat_history: Optional[List[ChatMessage]] = []  # Only used to seed a new session
 
 class ChatResponse(BaseModel):
     response: str
     sources: Optional[List[str]] = None
+    session_id: Optional[str] = None
+
+class ChatBatchInput(BaseModel):
+    queries: conlist(str, min_items=1)  # Standalone questions; answered without chat history or sessions
+
+class SessionHistory(BaseModel):
+    session_id: str
+    messages: List[ChatMessage]
+
+@app.exception_handler(RateLimitExceeded)
+async def rate_limit_exceeded(request: Request, exc: RateLimitExceeded):
+    headers = {"Retry-After": str(math.ceil(exc.retry_after))} if exc.retry_after is not None else None
+    return JSONResponse(status_code=429, content={"detail": str(exc)}, headers=headers)
+
+async def tenant_service(api_key: APIKey = Depends(get_api_key)):
+    """The caller's RAG service, searching only its own collection; a first request loads it off the event loop."""
+    service = tenants.get_loaded(api_key.client_id)
+    if service is None:
+        service = await asyncio.to_thread(tenants.get, api_key.client_id)
+    return service
+
+def tenant_limit(action: str):
+    """Dependency admitting the request against the caller's limits for action; the slot is
+    held until the response, a stream included, has been sent."""
+    async def admit(api_key: APIKey = Depends(get_api_key)):
+        with tenant_limits.acquire(api_key.client_id, action):
+            yield
+    return admit
+
+def resolve_session(chat_input: ChatInput, api_key: APIKey) -> Tuple[str, List[Dict[str, str]]]:
+    """Return the session id and stored history for a chat request, starting a session if none is given."""
+    if chat_input.session_id:
+        chat_history = sessions.get(chat_input.session_id, api_key.client_id)
+        if chat_history is None:
+            raise HTTPException(status_code=404, detail="Unknown or expired session")
+        return chat_input.session_id, chat_history
+    chat_history = [
+        {"role": msg.role, "content": msg.content}
+        for msg in chat_input.chat_history
+    ]
+    return sessions.create(api_key.client_id, chat_history), chat_history
 
  
 # Modified existing endpoints to require authentication
-@app.post("/api/v1/index", response_model=URLResponse)
-async def index_url(url_input: URLInput, api_key: APIKey = Depends(get_api_key)):
-    """Index a new URL or update an existing one in the vector store."""
+@app.post("/api/v1/index", response_model=URLResponse, dependencies=[Depends(tenant_limit("index"))])
+async def index_url(url_input: URLInput, api_key: APIKey = Depends(get_api_key),
+                    rag_service=Depends(tenant_service)):
+    """Queue a new URL, or an update of an existing one, for background indexing."""
     try:
         url_str = str(url_input.url)
-        url_exists = rag_service.url_exists(url_str)
+        url_exists = await rag_service.aurl_exists(url_str)
         
         if url_exists and not url_input.force_update:
             return URLResponse(
@@ -49,51 +318,211 @@ async def index_url(url_input: URLInput, api_key: APIKey = Depends(get_api_key))
                 was_indexed=False
             )
         
-        success = rag_service.process_url(
+        job_id = index_jobs.submit(
             url_str,
-            force_update=url_input.force_update
+            rag_service.vector_store_manager.get_url_hash(url_str),
+            force_update=url_input.force_update,
+            tenant=api_key.client_id
         )
         
-        if success:
-            action = "updated" if url_exists else "indexed"
-            return URLResponse(
-                status="success",
-                message=f"Successfully {action} {url_str}",
-                was_indexed=True
-            )
-        else:
-            raise HTTPException(status_code=400, detail="Failed to process URL")
+        action = "update" if url_exists else "indexing"
+        return URLResponse(
+            status="queued",
+            message=f"Queued {action} of {url_str}. Poll /api/v1/jobs/{job_id} for progress.",
+            was_indexed=False,
+            job_id=job_id
+        )
             
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/api/v1/chat")
-async def chat(chat_input: ChatInput, api_key: APIKey = Depends(get_api_key)):
+@app.get("/api/v1/jobs/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str, api_key: APIKey = Depends(get_api_key)):
+    """Get the status and progress of a background indexing job."""
+    job = index_jobs.get(job_id)
+    # Jobs queued before tenants existed belong to the default tenant
+    if job is None or (job["tenant"] or API_CLIENT_ID) != api_key.client_id:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return JobStatus(**job)
+
+@app.post("/api/v1/index/batch", response_model=URLBatchResponse)
+async def index_urls(batch_input: URLBatchInput, api_key: APIKey = Depends(get_api_key),
+                     rag_service=Depends(tenant_service)):
+    """Index many URLs at once with concurrent fetching and batched embedding."""
+    # A batch draws one index token per URL
+    with tenant_limits.acquire(api_key.client_id, "index", cost=len(batch_input.urls)):
+        try:
+            results = await rag_service.aprocess_urls(
+                [str(url) for url in batch_input.urls],
+                force_update=batch_input.force_update
+            )
+            return URLBatchResponse(results=[URLStatus(**result) for result in results])
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/v1/index/flush")
+async def flush_index(api_key: APIKey = Depends(get_api_key), rag_service=Depends(tenant_service)):
+    """Persist buffered vector store writes now instead of waiting for the flush timer."""
+    try:
+        return {"status": "flushed", "write_buffer": await rag_service.aflush_index()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/v1/chat", dependencies=[Depends(tenant_limit("chat"))])
+async def chat(chat_input: ChatInput, api_key: APIKey = Depends(get_api_key), rag_service=Depends(tenant_service)):
     """Process a chat query and return response with sources."""
+    session_id, chat_history = resolve_session(chat_input, api_key)
     try:
-        chat_history = [
-            {"role": msg.role, "content": msg.content}
-            for msg in chat_input.chat_history
-        ]
-        
-        response_text, sources = rag_service.get_response(
+        response_text, sources = await rag_service.aget_response(
             chat_input.query,
             chat_history
         )
         
-        return ChatResponse(response=response_text, sources=sources)
+        sessions.append(session_id, api_key.client_id,
+                        {"role": "user", "content": chat_input.query},
+                        {"role": "assistant", "content": response_text})
+        return ChatResponse(response=response_text, sources=sources, session_id=session_id)
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/v1/chat/stream", dependencies=[Depends(tenant_limit("chat"))])
+async def chat_stream(chat_input: ChatInput, api_key: APIKey = Depends(get_api_key),
+                      rag_service=Depends(tenant_service)):
+    """Stream a chat answer as server-sent events: session, token, citation, then a final sources event."""
+    session_id, chat_history = resolve_session(chat_input, api_key)
+    
+    async def event_stream():
+        yield f"event: session\ndata: {json.dumps({'session_id': session_id})}\n\n"
+        answer = ""
+        try:
+            async for event, data in rag_service.astream_response(chat_input.query, chat_history):
+                if event == "token":
+                    answer += data["text"]
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+            sessions.append(session_id, api_key.client_id,
+                            {"role": "user", "content": chat_input.query},
+                            {"role": "assistant", "content": answer})
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+@app.post("/api/v1/chat/batch")
+async def chat_batch(batch_input: ChatBatchInput, api_key: APIKey = Depends(get_api_key),
+                     rag_service=Depends(tenant_service)):
+    """Answer many questions in one request, streamed as JSON lines in the order they finish.
+
+    Each line carries the question's index in the request with its response and
+    sources, or an error for that question alone.
+    """
+    # A batch draws one batch token per question; the slot is held until the last line is sent
+    slot = tenant_limits.acquire(api_key.client_id, "batch", cost=len(batch_input.queries))
+    
+    async def result_lines():
+        try:
+            async for result in rag_service.aget_responses(batch_input.queries):
+                yield json.dumps(result) + "\n"
+        except Exception as e:
+            yield json.dumps({"error": str(e)}) + "\n"
+        finally:
+            # Runs on a failed send or a disconnect too, when the background task is skipped
+            slot.release()
+    
+    # The background task covers a stream that never started; release() only counts once
+    return StreamingResponse(result_lines(), media_type="application/x-ndjson", background=BackgroundTask(slot.release))
+
+@app.get("/api/v1/sessions/{session_id}", response_model=SessionHistory)
+async def get_session(session_id: str, api_key: APIKey = Depends(get_api_key)):
+    """Get the stored transcript of a chat session."""
+    messages = sessions.get(session_id, api_key.client_id)
+    if messages is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired session")
+    return SessionHistory(session_id=session_id, messages=messages)
+
+@app.delete("/api/v1/sessions/{session_id}")
+async def delete_session(session_id: str, api_key: APIKey = Depends(get_api_key)):
+    """End a chat session and discard its transcript."""
+    if not sessions.delete(session_id, api_key.client_id):
+        raise HTTPException(status_code=404, detail="Unknown or expired session")
+    return {"status": "deleted", "session_id": session_id}
+
 @app.get("/api/v1/stats")
-async def get_stats(api_key: APIKey = Depends(get_api_key)):
-    """Get statistics about the vector store collection."""
+async def get_stats(reconcile: bool = False, api_key: APIKey = Depends(get_api_key),
+                    rag_service=Depends(tenant_service)):
+    """Get collection statistics; reconcile=true rebuilds them from a full rescan first."""
+    try:
+        return await rag_service.aget_collection_stats(reconcile)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/v1/stats/chains")
+async def get_chain_stats(api_key: APIKey = Depends(get_api_key),
+                          rag_service=Depends(tenant_service)):
+    """Get cached RAG chain variants and the per-request setup time they save."""
     try:
-        return rag_service.get_collection_stats()
+        return rag_service.get_chain_stats()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/v1/stats/cache")
+async def get_cache_stats(api_key: APIKey = Depends(get_api_key),
+                          rag_service=Depends(tenant_service)):
+    """Get hit/miss counters for the embedding and response caches."""
+    try:
+        return rag_service.get_cache_stats()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/v1/stats/timings")
+async def get_timing_stats(api_key: APIKey = Depends(get_api_key),
+                           rag_service=Depends(tenant_service)):
+    """Get per-stage chat latency by query path, including LLM rewrite time skipped."""
+    try:
+        return rag_service.get_timing_stats()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/v1/stats/ingest")
+async def get_ingest_stats(api_key: APIKey = Depends(get_api_key),
+                           rag_service=Depends(tenant_service)):
+    """Get pages or chunks processed and busy time per ingestion pipeline stage."""
+    try:
+        return rag_service.get_ingest_stats()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/v1/metrics", response_class=PlainTextResponse)
+async def get_metrics(api_key: APIKey = Depends(get_api_key)):
+    """Get request, stage latency, token, cache and ingestion metrics in the Prometheus text format."""
+    # Samples are labelled by tenant, so only the deployment's own client may read them
+    if api_key.client_id != API_CLIENT_ID:
+        raise HTTPException(status_code=403, detail="Metrics are only available to the admin client")
+    try:
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def serve_workers():
+    """Run SERVING_WORKERS read-only workers on port_no and one writer process on WRITER_PORT."""
+    import subprocess
+    import sys
+    import uvicorn
+    writer = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(WRITER_PORT)],
+        env={**os.environ, "RAG_SERVING_ROLE": "writer"}
+    )
+    # Worker processes import main afresh and read their role from the environment
+    os.environ["RAG_SERVING_ROLE"] = "reader"
+    try:
+        uvicorn.run("main:app", host=host_name, port=port_no, workers=SERVING_WORKERS)
+    finally:
+        writer.terminate()
+        writer.wait()
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host=host_name, port=port_no)
\ No newline at end of file
+    if SERVING_WORKERS > 1:
+        serve_workers()
+    else:
+        uvicorn.run(app, host=host_name, port=port_no)
\ No newline at end of file
@@ -0,0 +1,106 @@
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+
+from langchain_core.messages import BaseMessage
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+
+from response_cache import ResponseCache
+
+# Pronouns and demonstratives that point back into the conversation ("how does it scale?"); words
+# like "one" or "more" are just as common in self-contained questions, so they don't count
+REFERRING_WORDS = re.compile(
+    r"\b(it|its|they|them|their|theirs|he|him|his|she|her|hers|this|that|these|those|former|latter)\b",
+    re.IGNORECASE)
+FOLLOW_UP_OPENERS = re.compile(r"^\s*(and|also|but|so|then|what about|how about)\b", re.IGNORECASE)
+# "Why does X ...?" stands on its own; only a bare "why?" or "why not?" leans on the last answer
+BARE_FOLLOW_UPS = re.compile(r"^\s*why(\s+not)?\s*[?!.]*\s*$", re.IGNORECASE)
+
+
+class QueryRewriter:
+    """Decide whether a query needs the history-aware LLM rewrite, and cache rewrites.
+
+    mode is 'auto' (rewrite only follow-ups the heuristic flags), 'always' (the old
+    behaviour whenever there is history) or 'never'. A query is never rewritten on
+    the first turn. Rewrites are cached on (history fingerprint, normalized query).
+    """
+
+    PROMPT = ChatPromptTemplate.from_messages([
+        MessagesPlaceholder(variable_name="chat_history"),
+        ("user", "{input}"),
+        ("user", "Given the above conversation, generate a focused and specific search query to find the most relevant information. Avoid broad or generic queries.")
+    ])
+
+    def __init__(self, llm, mode: str = "auto", max_entries: int = 1000, min_words: int = 4):
+        if mode not in ("auto", "always", "never"):
+            raise ValueError(f"Unknown query rewrite mode: {mode}")
+        self.chain = self.PROMPT | llm | StrOutputParser()
+        self.mode = mode
+        self.max_entries = max_entries
+        self.min_words = min_words
+        self._cache: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def route(self, query: str, chat_history: List[Dict[str, str]]) -> str:
+        """Return the path a query takes: no_history, self_contained or rewrite."""
+        if not chat_history or self.mode == "never":
+            return "no_history" if not chat_history else "self_contained"
+        if self.mode == "always":
+            return "rewrite"
+        if (len(query.split()) < self.min_words
+                or REFERRING_WORDS.search(query)
+                or FOLLOW_UP_OPENERS.match(query)
+                or BARE_FOLLOW_UPS.match(query)):
+            return "rewrite"
+        return "self_contained"
+
+    @staticmethod
+    def cache_key(query: str, chat_history: List[Dict[str, str]]) -> Tuple[str, str]:
+        return ResponseCache.fingerprint(chat_history), ResponseCache.normalize_query(query)
+
+    def get_cached(self, key: Tuple[str, str]):
+        with self._lock:
+            rewritten = self._cache.get(key)
+            if rewritten is not None:
+                self._cache.move_to_end(key)
+            return rewritten
+
+    def put_cached(self, key: Tuple[str, str], rewritten: str):
+        with self._lock:
+            self._cache[key] = rewritten
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def rewrite(self, query: str, chat_history: List[Dict[str, str]],
+                messages: List[BaseMessage]) -> Tuple[str, str]:
+        """Return (search query, path), where path also tells cache hits apart."""
+        path = self.route(query, chat_history)
+        if path != "rewrite":
+            return query, path
+        key = self.cache_key(query, chat_history)
+        rewritten = self.get_cached(key)
+        if rewritten is not None:
+            return rewritten, "rewrite_cached"
+        rewritten = self.chain.invoke({"chat_history": messages, "input": query})
+        self.put_cached(key, rewritten)
+        return rewritten, "rewritten"
+
+    async def arewrite(self, query: str, chat_history: List[Dict[str, str]],
+                       messages: List[BaseMessage]) -> Tuple[str, str]:
+        """Async variant of rewrite."""
+        path = self.route(query, chat_history)
+        if path != "rewrite":
+            return query, path
+        key = self.cache_key(query, chat_history)
+        rewritten = self.get_cached(key)
+        if rewritten is not None:
+            return rewritten, "rewrite_cached"
+        rewritten = await self.chain.ainvoke({"chat_history": messages, "input": query})
+        self.put_cached(key, rewritten)
+        return rewritten, "rewritten"
+
+    def stats(self) -> Dict[str, Any]:
+        return {"mode": self.mode, "cached_rewrites": len(self._cache), "max_entries": self.max_entries}
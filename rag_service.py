@@ -1,43 +1,114 @@
 from langchain_core.messages import AIMessage, HumanMessage
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain.chains import create_history_aware_retriever, create_retrieval_chain
-from langchain.chains.combine_documents import create_stuff_documents_chain
-from typing import List, Tuple, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple, Dict, Any, Optional, AsyncIterator, NamedTuple
+import asyncio
+import contextvars
 import re
 import warnings
 warnings.filterwarnings('ignore')
 
-from config import OPENAI_API_KEY
+from config import (OPENAI_API_KEY, CHAT_MODEL, RETRIEVER_K, RETRIEVER_SCORE_THRESHOLD,
+                    RETRIEVER_HYBRID, HYBRID_CANDIDATES, RRF_K, RETRIEVER_MMR, MMR_FETCH_K, MMR_LAMBDA,
+                    QUERY_REWRITE_MODE, QUERY_REWRITE_CACHE_MAX_ENTRIES,
+                    HISTORY_TOKEN_BUDGET, HISTORY_SUMMARY_TOKENS, CONTEXT_TOKEN_BUDGET, CHUNK_OVERLAP,
+                    RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL_SECONDS,
+                    RESPONSE_CACHE_SEMANTIC, RESPONSE_CACHE_SIMILARITY_THRESHOLD, CHAT_BATCH_CONCURRENCY)
 from index_service import VectorStoreManager
+from chain_registry import ChainKey, ChainRegistry
+from response_cache import ResponseCache
+from hybrid_retriever import HybridRetriever, VectorRetriever
+from query_rewriter import QueryRewriter
+from tracing import StageTimer, StageStats, metrics, record_tokens
+from context_budget import ContextBudget, counter_name, load_encoding, token_counter
+
+class CitationTracker:
+    """Detect citation numbers incrementally as answer tokens arrive."""
+
+    def __init__(self):
+        self.text = ""
+        self._scan_from = 0
+        self._seen = set()
+
+    def feed(self, token: str) -> List[int]:
+        """Append a token and return citation numbers that appeared for the first time."""
+        self.text += token
+        tail = self.text[self._scan_from:]
+        new_citations = [c for c in RAGService.extract_citations(tail) if c not in self._seen]
+        self._seen.update(new_citations)
+        # Rescan from an unclosed '[' next time, since a citation may span tokens
+        open_bracket = tail.rfind("[")
+        if open_bracket != -1 and "]" not in tail[open_bracket:]:
+            self._scan_from += open_bracket
+        else:
+            self._scan_from = len(self.text)
+        return new_citations
+
+class RAGPipeline(NamedTuple):
+    """The three stages of answering (query rewrite, retrieval, generation) and their token budget."""
+    rewriter: QueryRewriter
+    retriever: Any
+    answer_chain: Any
+    budget: ContextBudget
 
 class RAGService:
-    def __init__(self, persist_directory: str):
-        self.vector_store_manager = VectorStoreManager(persist_directory)
-        
-    def get_context_retriever_chain(self):
-        """Create a context-aware retriever chain."""
-        llm = ChatOpenAI(api_key=OPENAI_API_KEY)
-        
-        retriever = self.vector_store_manager.vector_store.as_retriever(
-            search_type="similarity_score_threshold",
-            search_kwargs={
-                "k": 5,
-                "score_threshold": 0.6,
-            }
+    def __init__(self, persist_directory: str, vector_store_manager: Optional[VectorStoreManager] = None, llm_factory=None,
+                 read_only: bool = False):
+        self.vector_store_manager = vector_store_manager or VectorStoreManager(persist_directory, read_only=read_only)
+        self.llm_factory = llm_factory or self.openai_chat_model
+        self.chain_registry = ChainRegistry(self.build_chain)
+        self.response_cache = ResponseCache(
+            max_entries=RESPONSE_CACHE_MAX_ENTRIES,
+            ttl_seconds=RESPONSE_CACHE_TTL_SECONDS,
+            embed_query=self.vector_store_manager.embedding_function.embed_query if RESPONSE_CACHE_SEMANTIC else None,
+            similarity_threshold=RESPONSE_CACHE_SIMILARITY_THRESHOLD,
         )
+        self.stage_stats = StageStats()
+        # A replica cannot tell which URLs the writer changed, so a reload drops every cached answer
+        self.vector_store_manager.add_refresh_listener(self.response_cache.clear)
         
-        prompt = ChatPromptTemplate.from_messages([
-            MessagesPlaceholder(variable_name="chat_history"),
-            ("user", "{input}"),
-            ("user", "Given the above conversation, generate a focused and specific search query to find the most relevant information. Avoid broad or generic queries.")
-        ])
-        
-        return create_history_aware_retriever(llm, retriever, prompt)
+    @staticmethod
+    def openai_chat_model(model: str):
+        """Default LLM factory; langchain_openai takes over a second to import, so it loads on first use."""
+        from langchain_openai import ChatOpenAI
+        return ChatOpenAI(api_key=OPENAI_API_KEY, model=model)
+
+    def warm_up(self):
+        """Load the vector index, the token encoding and the default chain, so the first request does none of them."""
+        self.vector_store_manager.warm_up()
+        load_encoding(CHAT_MODEL)
+        self.get_chain()
 
-    def get_conversational_rag_chain(self, retriever_chain):
-        """Create a conversational RAG chain."""
-        llm = ChatOpenAI(api_key=OPENAI_API_KEY)
+    def get_retriever(self, k: int = RETRIEVER_K, score_threshold: float = RETRIEVER_SCORE_THRESHOLD,
+                      hybrid: bool = RETRIEVER_HYBRID, mmr: bool = RETRIEVER_MMR):
+        """Create the document retriever: vector-only, or vector fused with BM25, optionally MMR re-ranked."""
+        if hybrid:
+            return HybridRetriever(
+                vector_store_manager=self.vector_store_manager,
+                k=k,
+                score_threshold=score_threshold,
+                mmr=mmr,
+                fetch_k=MMR_FETCH_K,
+                mmr_lambda=MMR_LAMBDA,
+                candidates=max(HYBRID_CANDIDATES, k),
+                rrf_k=RRF_K,
+            )
+        return VectorRetriever(
+            vector_store_manager=self.vector_store_manager,
+            k=k,
+            score_threshold=score_threshold,
+            mmr=mmr,
+            fetch_k=MMR_FETCH_K,
+            mmr_lambda=MMR_LAMBDA,
+        )
+
+    def get_query_rewriter(self, llm, mode: str = QUERY_REWRITE_MODE):
+        """Create the adaptive history-aware query rewriter."""
+        return QueryRewriter(llm, mode=mode, max_entries=QUERY_REWRITE_CACHE_MAX_ENTRIES)
+
+    def get_answer_chain(self, llm):
+        """Create the chain that answers from retrieved context and chat history."""
+        from langchain.chains.combine_documents import create_stuff_documents_chain
         
         prompt = ChatPromptTemplate.from_messages([
             ("system", """You are a helpful assistant that answers questions based STRICTLY on the provided context. 
@@ -58,8 +129,57 @@ class RAGService:
             ("user", "{input}"),
         ])
         
-        stuff_documents_chain = create_stuff_documents_chain(llm, prompt)
-        return create_retrieval_chain(retriever_chain, stuff_documents_chain)
+        return create_stuff_documents_chain(llm, prompt)
+
+    def get_context_budget(self, model: str) -> ContextBudget:
+        """Create the token budget that bounds history and retrieved context in the prompts."""
+        return ContextBudget(
+            token_counter(model),
+            history_tokens=HISTORY_TOKEN_BUDGET,
+            summary_tokens=HISTORY_SUMMARY_TOKENS,
+            context_tokens=CONTEXT_TOKEN_BUDGET,
+            max_overlap=2 * CHUNK_OVERLAP,
+        )
+
+    def build_chain(self, key: ChainKey) -> RAGPipeline:
+        """Build the RAG pipeline for one registry key, sharing a single LLM client."""
+        llm = self.llm_factory(key.model)
+        return RAGPipeline(
+            rewriter=self.get_query_rewriter(llm),
+            retriever=self.get_retriever(key.k, key.score_threshold),
+            answer_chain=self.get_answer_chain(llm),
+            budget=self.get_context_budget(key.model),
+        )
+
+    @staticmethod
+    def make_chain_key(k: Optional[int] = None, score_threshold: Optional[float] = None, model: Optional[str] = None) -> ChainKey:
+        """Resolve retriever settings against the config defaults."""
+        return ChainKey(
+            k=k if k is not None else RETRIEVER_K,
+            score_threshold=score_threshold if score_threshold is not None else RETRIEVER_SCORE_THRESHOLD,
+            model=model or CHAT_MODEL,
+        )
+
+    def get_chain(self, **chain_settings) -> RAGPipeline:
+        """Get a cached RAG pipeline for the given retriever settings (defaults from config)."""
+        return self.chain_registry.get(self.make_chain_key(**chain_settings))
+
+    def response_fingerprint(self, chat_history: List[Dict[str, str]], **chain_settings) -> str:
+        """Fingerprint of everything besides the query that a cached answer depends on."""
+        return ResponseCache.fingerprint(chat_history, *self.make_chain_key(**chain_settings))
+
+    async def aget_cached_response(self, query: str, fingerprint: str) -> Optional[Tuple[str, List[str]]]:
+        """Look up the response cache, moving the query embedding off the event loop if needed."""
+        if self.response_cache.semantic:
+            return await self.vector_store_manager.run_blocking(self.response_cache.get, query, fingerprint)
+        return self.response_cache.get(query, fingerprint)
+
+    async def aput_cached_response(self, query: str, fingerprint: str, response_text: str, sources: List[str]):
+        """Store an answer in the response cache without blocking the event loop."""
+        if self.response_cache.semantic:
+            await self.vector_store_manager.run_blocking(self.response_cache.put, query, fingerprint, response_text, sources)
+        else:
+            self.response_cache.put(query, fingerprint, response_text, sources)
 
     @staticmethod
     def extract_citations(text: str) -> List[int]:
@@ -97,35 +217,327 @@ class RAGService:
         url_hash = self.vector_store_manager.get_url_hash(url)
         return self.vector_store_manager.url_already_exists(url_hash)
 
+    async def aurl_exists(self, url: str) -> bool:
+        """Check if a URL is already indexed without blocking the event loop."""
+        url_hash = self.vector_store_manager.get_url_hash(url)
+        return await self.vector_store_manager.aurl_already_exists(url_hash)
+
     def process_url(self, url: str, force_update: bool = False) -> bool:
         """Process and index a URL."""
-        return self.vector_store_manager.process_url(url, force_update)
+        try:
+            success = self.vector_store_manager.process_url(url, force_update)
+        except Exception:
+            return False
+        if success:
+            self.response_cache.invalidate_url(url)
+        return success
 
-    def get_response(self, query: str, chat_history: List[Dict[str, str]]) -> Tuple[str, List[str]]:
-        """Get response for a query with chat history."""
-        # Convert chat history to LangChain message format
+    def run_index_job(self, url: str, force_update: bool, progress) -> str:
+        """Index a URL for the background job queue; raises so failed attempts are retried with the error recorded."""
+        status = self.vector_store_manager.index_url(url, force_update, progress)
+        if status in ("indexed", "updated"):
+            self.response_cache.invalidate_url(url)
+        return status
+
+    def refresh_url(self, url: str) -> str:
+        """Re-crawl an indexed URL, dropping cached answers if its content changed."""
+        status = self.vector_store_manager.refresh_url(url)
+        if status != "unchanged":
+            self.response_cache.invalidate_url(url)
+        return status
+
+    def process_urls(self, urls: List[str], force_update: bool = False) -> List[Dict[str, Any]]:
+        """Index many URLs in one batch and return a status per URL."""
+        results = self.vector_store_manager.process_urls(urls, force_update)
+        for result in results:
+            if result["status"] in ("indexed", "updated"):
+                self.response_cache.invalidate_url(result["url"])
+        return results
+
+    async def aprocess_urls(self, urls: List[str], force_update: bool = False) -> List[Dict[str, Any]]:
+        """Index many URLs in one batch without blocking the event loop."""
+        return await self.vector_store_manager.run_blocking(self.process_urls, urls, force_update)
+
+    @staticmethod
+    def format_chat_history(chat_history: List[Dict[str, str]]) -> List:
+        """Convert chat history to LangChain message format."""
         formatted_history = []
         for msg in chat_history:
             if msg["role"].lower() == "user":
                 formatted_history.append(HumanMessage(content=msg["content"]))
             else:
                 formatted_history.append(AIMessage(content=msg["content"]))
+        return formatted_history
 
-        # Get response using RAG chain
-        retriever_chain = self.get_context_retriever_chain()
-        conversation_rag_chain = self.get_conversational_rag_chain(retriever_chain)
+    def get_response(self, query: str, chat_history: List[Dict[str, str]], **chain_settings) -> Tuple[str, List[str]]:
+        """Get response for a query with chat history."""
+        # Only the windowed history reaches the prompts, so it is also what answers are cached on
+        pipeline = self.get_chain(**chain_settings)
+        chat_history = pipeline.budget.fit_history(chat_history)
+        fingerprint = self.response_fingerprint(chat_history, **chain_settings)
+        timer = StageTimer.current() or StageTimer()
+        with timer.stage("cache"), timer.bound():
+            cached = self.response_cache.get(query, fingerprint)
+        if cached is not None:
+            self.stage_stats.record("response_cached", timer)
+            return cached
         
-        response = conversation_rag_chain.invoke({
-            "chat_history": formatted_history,
-            "input": query
-        })
+        # Rewrite (only if needed), retrieve, then generate
+        messages = self.format_chat_history(chat_history)
+        with timer.stage("rewrite"):
+            search_query, path = pipeline.rewriter.rewrite(query, chat_history, messages)
+        with timer.stage("retrieve"), timer.bound():
+            context = pipeline.budget.fit_documents(pipeline.retriever.invoke(search_query))
+        with timer.stage("generate"):
+            answer = pipeline.answer_chain.invoke({"context": context, "chat_history": messages, "input": query})
+        record_tokens("answer", pipeline.budget.count_tokens(answer))
         
         # Format response and extract sources
-        return self.format_response_with_citations(
-            response['answer'],
-            response['context']
-        )
+        with timer.stage("format"):
+            response_text, sources = self.format_response_with_citations(answer, context)
+        self.stage_stats.record(path, timer)
+        self.response_cache.put(query, fingerprint, response_text, sources)
+        return response_text, sources
+
+    async def aget_response(self, query: str, chat_history: List[Dict[str, str]], **chain_settings) -> Tuple[str, List[str]]:
+        """Async variant of get_response using the chain's ainvoke."""
+        # Only the windowed history reaches the prompts, so it is also what answers are cached on
+        pipeline = self.get_chain(**chain_settings)
+        chat_history = pipeline.budget.fit_history(chat_history)
+        fingerprint = self.response_fingerprint(chat_history, **chain_settings)
+        timer = StageTimer.current() or StageTimer()
+        with timer.stage("cache"), timer.bound():
+            cached = await self.aget_cached_response(query, fingerprint)
+        if cached is not None:
+            self.stage_stats.record("response_cached", timer)
+            return cached
+        
+        messages = self.format_chat_history(chat_history)
+        with timer.stage("rewrite"):
+            search_query, path = await pipeline.rewriter.arewrite(query, chat_history, messages)
+        with timer.stage("retrieve"), timer.bound():
+            context = pipeline.budget.fit_documents(await pipeline.retriever.ainvoke(search_query))
+        with timer.stage("generate"):
+            answer = await pipeline.answer_chain.ainvoke({"context": context, "chat_history": messages, "input": query})
+        record_tokens("answer", pipeline.budget.count_tokens(answer))
+        
+        with timer.stage("format"):
+            response_text, sources = self.format_response_with_citations(answer, context)
+        self.stage_stats.record(path, timer)
+        await self.aput_cached_response(query, fingerprint, response_text, sources)
+        return response_text, sources
+
+    async def astream_response(self, query: str, chat_history: List[Dict[str, str]], **chain_settings) -> AsyncIterator[Tuple[str, Any]]:
+        """Stream (event, data) pairs: answer tokens, citations as they appear, then the final sources."""
+        # Only the windowed history reaches the prompts, so it is also what answers are cached on
+        pipeline = self.get_chain(**chain_settings)
+        chat_history = pipeline.budget.fit_history(chat_history)
+        fingerprint = self.response_fingerprint(chat_history, **chain_settings)
+        timer = StageTimer.current() or StageTimer()
+        with timer.stage("cache"), timer.bound():
+            cached = await self.aget_cached_response(query, fingerprint)
+        if cached is not None:
+            self.stage_stats.record("response_cached", timer)
+            yield "token", {"text": cached[0]}
+            yield "sources", {"sources": cached[1]}
+            return
+        
+        messages = self.format_chat_history(chat_history)
+        with timer.stage("rewrite"):
+            search_query, path = await pipeline.rewriter.arewrite(query, chat_history, messages)
+        with timer.stage("retrieve"), timer.bound():
+            context = pipeline.budget.fit_documents(await pipeline.retriever.ainvoke(search_query))
+        tracker = CitationTracker()
+        
+        # Generation time here includes time the client takes to consume the stream
+        with timer.stage("generate"):
+            async for token in pipeline.answer_chain.astream({"context": context, "chat_history": messages, "input": query}):
+                if not token:
+                    continue
+                yield "token", {"text": token}
+                for citation_num in tracker.feed(token):
+                    if citation_num <= len(context) and 'url' in context[citation_num - 1].metadata:
+                        yield "citation", {"number": citation_num, "url": context[citation_num - 1].metadata['url']}
+        record_tokens("answer", pipeline.budget.count_tokens(tracker.text))
+        
+        with timer.stage("format"):
+            response_text, sources = self.format_response_with_citations(tracker.text, context)
+        self.stage_stats.record(path, timer)
+        await self.aput_cached_response(query, fingerprint, response_text, sources)
+        yield "sources", {"sources": sources}
+
+    def finish_answer(self, pipeline: RAGPipeline, query: str, fingerprint: str, answer: str,
+                      context: List) -> Tuple[str, List[str]]:
+        """Format one generated answer with its sources and cache it."""
+        record_tokens("answer", pipeline.budget.count_tokens(answer))
+        response_text, sources = self.format_response_with_citations(answer, context)
+        self.response_cache.put(query, fingerprint, response_text, sources)
+        return response_text, sources
+
+    def get_responses(self, queries: List[str], concurrency: int = CHAT_BATCH_CONCURRENCY,
+                      **chain_settings) -> List[Tuple[str, List[str]]]:
+        """Answer many standalone queries (no chat history) in input order.
+
+        Cached answers are reused; the rest share one embedding call and one
+        vector search, then up to `concurrency` of them are ranked and answered
+        at a time.
+        """
+        pipeline = self.get_chain(**chain_settings)
+        fingerprint = self.response_fingerprint([], **chain_settings)
+        timer = StageTimer.current() or StageTimer()
+        with timer.stage("cache"), timer.bound():
+            results = {query: self.response_cache.get(query, fingerprint) for query in queries}
+        pending = [query for query, cached in results.items() if cached is None]
+        if pending:
+            with timer.stage("retrieve"), timer.bound():
+                vector_hits = pipeline.retriever.vector_hits_many(pending)
+
+            def answer(query, hits):
+                context = pipeline.budget.fit_documents(pipeline.retriever.rank(query, hits))
+                text = pipeline.answer_chain.invoke({"context": context, "chat_history": [], "input": query})
+                return self.finish_answer(pipeline, query, fingerprint, text, context)
+
+            with timer.stage("generate"), timer.bound(), ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+                # Each answer runs in its own copy of this context, so its traces reach the bound timer
+                futures = [pool.submit(contextvars.copy_context().run, answer, query, hits)
+                           for query, hits in zip(pending, vector_hits)]
+                results.update(zip(pending, [future.result() for future in futures]))
+        self.stage_stats.record("batch", timer)
+        return [results[query] for query in queries]
+
+    async def aget_responses(self, queries: List[str], concurrency: int = CHAT_BATCH_CONCURRENCY,
+                             **chain_settings) -> AsyncIterator[Dict[str, Any]]:
+        """Async variant of get_responses yielding each answer as soon as it is ready, in completion order.
+
+        Items are {"index", "query", "response", "sources"}, or {"index", "query",
+        "error"} when answering that query failed; repeated queries are answered
+        once and reported at each of their indexes.
+        """
+        pipeline = self.get_chain(**chain_settings)
+        fingerprint = self.response_fingerprint([], **chain_settings)
+        timer = StageTimer.current() or StageTimer()
+        positions: Dict[str, List[int]] = {}
+        for index, query in enumerate(queries):
+            positions.setdefault(query, []).append(index)
+
+        def results(query, **fields):
+            return [{"index": index, "query": query, **fields} for index in positions[query]]
+
+        pending = []
+        with timer.stage("cache"), timer.bound():
+            for query in positions:
+                cached = await self.aget_cached_response(query, fingerprint)
+                if cached is None:
+                    pending.append(query)
+                    continue
+                for result in results(query, response=cached[0], sources=cached[1]):
+                    yield result
+        if not pending:
+            self.stage_stats.record("batch", timer)
+            return
+
+        with timer.stage("retrieve"), timer.bound():
+            vector_hits = await self.vector_store_manager.run_blocking(pipeline.retriever.vector_hits_many, pending)
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        run_blocking = self.vector_store_manager.run_blocking
+
+        async def answer(query, hits):
+            try:
+                async with semaphore:
+                    context = pipeline.budget.fit_documents(await run_blocking(pipeline.retriever.rank, query, hits))
+                    text = await pipeline.answer_chain.ainvoke({"context": context, "chat_history": [], "input": query})
+                response_text, sources = await run_blocking(
+                    self.finish_answer, pipeline, query, fingerprint, text, context)
+            except Exception as e:
+                return results(query, error=str(e))
+            return results(query, response=response_text, sources=sources)
+
+        with timer.bound():
+            tasks = [asyncio.ensure_future(answer(query, hits)) for query, hits in zip(pending, vector_hits)]
+        try:
+            # Generation time includes ranking each query and the time the client takes to consume the results
+            with timer.stage("generate"):
+                for finished in asyncio.as_completed(tasks):
+                    for result in await finished:
+                        yield result
+        finally:
+            # A client that disconnects mid-batch stops the remaining answers
+            for task in tasks:
+                task.cancel()
+        self.stage_stats.record("batch", timer)
+
+    def flush_index(self) -> Dict[str, Any]:
+        """Persist buffered vector store writes now."""
+        return self.vector_store_manager.flush()
+
+    async def aflush_index(self) -> Dict[str, Any]:
+        """Persist buffered vector store writes without blocking the event loop."""
+        return await self.vector_store_manager.run_blocking(self.flush_index)
+
+    async def aget_collection_stats(self, reconcile: bool = False) -> Dict[str, Any]:
+        """Get collection statistics without blocking the event loop."""
+        if not reconcile:
+            return self.get_collection_stats()
+        return await self.vector_store_manager.run_blocking(self.get_collection_stats, True)
+
+    def get_collection_stats(self, reconcile: bool = False) -> Dict[str, Any]:
+        """Get statistics about the vector store collection, and which token counter the prompt budgets use."""
+        return {**self.vector_store_manager.get_collection_stats(reconcile), "token_counter": counter_name(CHAT_MODEL)}
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters for the caches in front of the models."""
+        return {
+            "embeddings": self.vector_store_manager.get_embedding_cache_stats(),
+            "responses": self.response_cache.stats(),
+        }
+
+    def get_ingest_stats(self) -> Dict[str, Any]:
+        """Get per-stage throughput counters of the ingestion pipeline."""
+        return self.vector_store_manager.get_ingest_stats()
+
+    def get_chain_stats(self) -> Dict[str, Any]:
+        """Get cached chain variants and the setup time saved by reusing them."""
+        return self.chain_registry.stats()
+
+    def collect_metrics(self) -> List[Tuple[str, str, str, Dict[str, str], float]]:
+        """Cache, ingestion, write buffer and collection counters as metric samples, read at scrape time."""
+        samples = []
+        for cache, stats in self.get_cache_stats().items():
+            if stats is None:
+                continue
+            # The response cache splits its hits into exact and semantic ones
+            hits = stats.get("hits", stats.get("exact_hits", 0) + stats.get("semantic_hits", 0))
+            samples += [
+                ("rag_cache_hits_total", "counter", "Cache lookups answered from the cache", {"cache": cache}, hits),
+                ("rag_cache_misses_total", "counter", "Cache lookups that missed", {"cache": cache}, stats["misses"]),
+                ("rag_cache_entries", "gauge", "Entries held by the cache", {"cache": cache}, stats["entries"]),
+            ]
+        for stage, counters in self.get_ingest_stats().items():
+            samples += [
+                ("rag_ingest_items_total", "counter", "Pages or chunks processed per ingestion stage",
+                 {"stage": stage}, counters["items"]),
+                ("rag_ingest_busy_seconds_total", "counter", "Busy time per ingestion stage",
+                 {"stage": stage}, counters["busy_seconds"]),
+            ]
+        write_buffer = self.vector_store_manager.vector_store.stats()
+        samples.append(("rag_write_buffer_pending_rows", "gauge", "Logged vector store writes not yet applied",
+                        {}, write_buffer["pending_rows"]))
+        collection = self.vector_store_manager.stats_store.snapshot()
+        samples += [
+            ("rag_indexed_urls", "gauge", "Indexed pages", {}, collection["unique_urls"]),
+            ("rag_indexed_chunks", "gauge", "Chunks across indexed pages", {}, collection["total_chunks"]),
+        ]
+        return samples
+
+    def get_timing_stats(self) -> Dict[str, Any]:
+        """Get mean per-stage latency for each query path and the rewrite time each path saved.
 
-    def get_collection_stats(self) -> Dict[str, Any]:
-        """Get statistics about the vector store collection."""
-        return self.vector_store_manager.print_collection_stats()
\ No newline at end of file
+        Savings are measured against the mean rewrite time of queries that did go to the LLM.
+        """
+        paths = self.stage_stats.stats()
+        rewrite_ms = self.stage_stats.mean_ms("rewritten", "rewrite")
+        for path in ("no_history", "self_contained", "rewrite_cached"):
+            if path in paths:
+                saved = rewrite_ms - self.stage_stats.mean_ms(path, "rewrite")
+                paths[path]["rewrite_ms_saved"] = round(max(0.0, saved) * paths[path]["requests"], 3)
+        return {"paths": paths, "llm_rewrite_mean_ms": round(rewrite_ms, 3)}
\ No newline at end of file
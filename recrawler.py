@@ -0,0 +1,147 @@
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+
+class RecrawlScheduler:
+    """Keep indexed pages fresh by re-crawling them on a per-domain cadence.
+
+    list_urls returns (url, key) pairs for everything indexed, the key naming the
+    page (its url_hash, prefixed with the tenant outside the default collection),
+    and refresh(url, key) re-crawls one page and returns its status ('unchanged',
+    'updated', 'indexed'). Refreshes use conditional GETs, so unchanged pages cost one 304.
+    Domains are crawled in parallel, but requests to one domain are sequential and
+    spaced by at least min_domain_delay seconds. Crawl state lives in SQLite so
+    cadences survive restarts.
+    """
+
+    def __init__(self, path: str, list_urls: Callable[[], Iterable[Tuple[str, str]]],
+                 refresh: Callable[[str, str], str], default_interval: float = 86400,
+                 domain_intervals: Optional[Dict[str, float]] = None, min_domain_delay: float = 2.0,
+                 max_domains_in_parallel: int = 4, tick_seconds: float = 60,
+                 clock: Callable[[], float] = time.time, sleep: Callable[[float], None] = time.sleep):
+        self.list_urls = list_urls
+        self.refresh = refresh
+        self.default_interval = default_interval
+        self.domain_intervals = domain_intervals or {}
+        self.min_domain_delay = min_domain_delay
+        self.max_domains_in_parallel = max_domains_in_parallel
+        self.tick_seconds = tick_seconds
+        self.clock = clock
+        self.sleep = sleep
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS recrawl_state (
+                url_hash TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                domain TEXT NOT NULL,
+                next_due REAL NOT NULL,
+                last_checked REAL,
+                last_status TEXT,
+                last_error TEXT
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS recrawl_due ON recrawl_state(next_due)")
+        self._conn.commit()
+
+    def interval_for(self, domain: str) -> float:
+        return self.domain_intervals.get(domain, self.default_interval)
+
+    def sync_known_urls(self):
+        """Track URLs newly added to the collection and forget removed ones."""
+        known = {url_hash: url for url, url_hash in self.list_urls()}
+        now = self.clock()
+        with self._lock:
+            tracked = {row[0] for row in self._conn.execute("SELECT url_hash FROM recrawl_state")}
+            # Newly indexed pages were just fetched, so their first recrawl is a full interval away
+            self._conn.executemany(
+                "INSERT INTO recrawl_state (url_hash, url, domain, next_due) VALUES (?, ?, ?, ?)",
+                [(url_hash, url, urlparse(url).netloc, now + self.interval_for(urlparse(url).netloc))
+                 for url_hash, url in known.items() if url_hash not in tracked],
+            )
+            self._conn.executemany(
+                "DELETE FROM recrawl_state WHERE url_hash = ?",
+                [(url_hash,) for url_hash in tracked - known.keys()],
+            )
+            self._conn.commit()
+
+    def due_urls(self) -> Dict[str, List[Tuple[str, str]]]:
+        """Return {domain: [(url_hash, url), ...]} for pages whose recrawl is due."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT url_hash, url, domain FROM recrawl_state WHERE next_due <= ? ORDER BY next_due",
+                (self.clock(),),
+            ).fetchall()
+        by_domain: Dict[str, List[Tuple[str, str]]] = {}
+        for row in rows:
+            by_domain.setdefault(row["domain"], []).append((row["url_hash"], row["url"]))
+        return by_domain
+
+    def _crawl_domain(self, domain: str, pages: List[Tuple[str, str]]) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        last_request_at = None
+        for url_hash, url in pages:
+            if self._stop.is_set():
+                break
+            if last_request_at is not None:
+                wait = self.min_domain_delay - (self.clock() - last_request_at)
+                if wait > 0:
+                    self.sleep(wait)
+            last_request_at = self.clock()
+            error = None
+            try:
+                status = self.refresh(url, url_hash)
+            except Exception as e:
+                status, error = "failed", str(e)
+                print(f"Recrawl of {url} failed: {error}")
+            counts[status] = counts.get(status, 0) + 1
+            now = self.clock()
+            with self._lock:
+                self._conn.execute(
+                    "UPDATE recrawl_state SET last_checked = ?, last_status = ?, last_error = ?, next_due = ? "
+                    "WHERE url_hash = ?",
+                    (now, status, error, now + self.interval_for(domain), url_hash),
+                )
+                self._conn.commit()
+        return counts
+
+    def run_once(self) -> Dict[str, int]:
+        """Recrawl every due page once and return counts per status."""
+        self.sync_known_urls()
+        due = self.due_urls()
+        totals: Dict[str, int] = {}
+        if not due:
+            return totals
+        with ThreadPoolExecutor(max_workers=self.max_domains_in_parallel, thread_name_prefix="recrawl") as pool:
+            for counts in pool.map(lambda item: self._crawl_domain(*item), due.items()):
+                for status, count in counts.items():
+                    totals[status] = totals.get(status, 0) + count
+        print(f"Recrawl finished: {totals}")
+        return totals
+
+    def start(self):
+        """Run the scheduler in a background thread, checking for due pages every tick."""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="recrawler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Recrawl run failed: {e}")
+            self._stop.wait(self.tick_seconds)
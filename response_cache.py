@@ -0,0 +1,144 @@
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+import numpy as np
+
+
+class CacheEntry(NamedTuple):
+    response_text: str
+    sources: List[str]
+    created_at: float
+    embedding: Optional[np.ndarray]
+
+
+class ResponseCache:
+    """TTL + LRU cache of chat answers with an optional semantic (embedding) tier.
+
+    Entries are keyed on the normalized query plus a fingerprint of the chat
+    history and chain settings. When embed_query is given, a miss on the exact key
+    falls back to the most similar cached query with the same fingerprint, if its
+    cosine similarity is at least similarity_threshold.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 3600,
+                 embed_query: Optional[Callable[[str], List[float]]] = None,
+                 similarity_threshold: float = 0.95):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.embed_query = embed_query
+        self.similarity_threshold = similarity_threshold
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[str, str], CacheEntry]" = OrderedDict()
+        self._keys_by_url: Dict[str, Set[Tuple[str, str]]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def semantic(self) -> bool:
+        return self.embed_query is not None
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """Lowercase, collapse whitespace and drop trailing punctuation."""
+        return re.sub(r"\s+", " ", query.lower()).strip().rstrip("?!. ")
+
+    @staticmethod
+    def fingerprint(chat_history: List[Dict[str, str]], *extra) -> str:
+        """Hash the chat history (and any chain settings) that an answer depends on."""
+        payload = json.dumps([[m["role"].lower(), m["content"]] for m in chat_history] + [list(map(str, extra))])
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _embed(self, query: str) -> np.ndarray:
+        vector = np.asarray(self.embed_query(query), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, query: str, fingerprint: str) -> Optional[Tuple[str, List[str]]]:
+        """Return (response_text, sources) for a cached answer, or None."""
+        key = (self.normalize_query(query), fingerprint)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry.created_at > self.ttl_seconds:
+                self._remove(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return entry.response_text, list(entry.sources)
+            if not self.semantic:
+                self.misses += 1
+                return None
+            candidates = [(k, e) for k, e in self._entries.items()
+                          if k[1] == fingerprint and e.embedding is not None
+                          and now - e.created_at <= self.ttl_seconds]
+
+        if candidates:
+            query_embedding = self._embed(query)
+            similarities = np.stack([e.embedding for _, e in candidates]) @ query_embedding
+            best = int(np.argmax(similarities))
+            if similarities[best] >= self.similarity_threshold:
+                best_key, best_entry = candidates[best]
+                with self._lock:
+                    if best_key in self._entries:
+                        self._entries.move_to_end(best_key)
+                    self.semantic_hits += 1
+                return best_entry.response_text, list(best_entry.sources)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, query: str, fingerprint: str, response_text: str, sources: List[str]):
+        """Cache an answer and remember which URLs it cites for invalidation."""
+        key = (self.normalize_query(query), fingerprint)
+        embedding = self._embed(query) if self.semantic else None
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = CacheEntry(response_text, list(sources), time.time(), embedding)
+            for url in sources:
+                self._keys_by_url.setdefault(url, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_url(self, url: str) -> int:
+        """Drop answers citing url, plus answers without sources that new content may now answer."""
+        with self._lock:
+            keys = self._keys_by_url.pop(url, set())
+            keys.update(k for k, e in self._entries.items() if not e.sources)
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_url.clear()
+
+    def _remove(self, key: Tuple[str, str]):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for url in entry.sources:
+            keys = self._keys_by_url.get(url)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_url[url]
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.exact_hits + self.semantic_hits) / lookups, 4) if lookups else 0.0,
+        }
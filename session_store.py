@@ -0,0 +1,122 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional
+
+
+class Session(NamedTuple):
+    client_id: str
+    messages: List[Dict[str, str]]
+    updated_at: float
+
+
+class SessionStore:
+    """Server-side chat transcripts, so clients send only the new message.
+
+    Sessions live in an in-memory LRU of at most max_sessions; each keeps its last
+    max_messages messages. With a path they are also written through to SQLite,
+    so sessions evicted from memory (or from before a restart) are reloaded on
+    demand. Sessions idle for longer than ttl_seconds expire. With shared=True,
+    for several worker processes writing one SQLite file, sessions are always
+    read from SQLite, since another worker may have extended the copy in memory.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_sessions: int = 10000,
+                 max_messages: int = 200, ttl_seconds: float = 7 * 24 * 3600, shared: bool = False):
+        if shared and not path:
+            raise ValueError("Sessions shared between processes need a SQLite path")
+        self.shared = shared
+        self.max_sessions = max_sessions
+        self.max_messages = max_messages
+        self.ttl_seconds = ttl_seconds
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS sessions (
+                    id TEXT PRIMARY KEY,
+                    client_id TEXT NOT NULL,
+                    messages TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )""")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON sessions(updated_at)")
+            self._conn.execute("DELETE FROM sessions WHERE updated_at < ?", (time.time() - ttl_seconds,))
+            self._conn.commit()
+
+    def _load(self, session_id: str) -> Optional[Session]:
+        """Find a session in memory or SQLite (lock held)."""
+        session = None if self.shared else self._sessions.get(session_id)
+        if session is None and self._conn is not None:
+            row = self._conn.execute(
+                "SELECT client_id, messages, updated_at FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            if row is not None:
+                session = Session(row[0], json.loads(row[1]), row[2])
+        if session is None:
+            return None
+        if time.time() - session.updated_at > self.ttl_seconds:
+            self._delete(session_id)
+            return None
+        self._cache(session_id, session)
+        return session
+
+    def _cache(self, session_id: str, session: Session):
+        self._sessions[session_id] = session
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    def _save(self, session_id: str, session: Session):
+        self._cache(session_id, session)
+        if self._conn is not None:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (id, client_id, messages, updated_at) VALUES (?, ?, ?, ?)",
+                (session_id, session.client_id, json.dumps(session.messages), session.updated_at))
+            self._conn.commit()
+
+    def _delete(self, session_id: str):
+        self._sessions.pop(session_id, None)
+        if self._conn is not None:
+            self._conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            self._conn.commit()
+
+    def create(self, client_id: str, messages: Optional[List[Dict[str, str]]] = None) -> str:
+        """Start a session, optionally seeded with an existing transcript, and return its id."""
+        session_id = uuid.uuid4().hex
+        with self._lock:
+            self._save(session_id, Session(client_id, list(messages or [])[-self.max_messages:], time.time()))
+        return session_id
+
+    def get(self, session_id: str, client_id: str) -> Optional[List[Dict[str, str]]]:
+        """Return a copy of the transcript, or None if the session is unknown, expired or not the client's."""
+        with self._lock:
+            session = self._load(session_id)
+            if session is None or session.client_id != client_id:
+                return None
+            return list(session.messages)
+
+    def append(self, session_id: str, client_id: str, *messages: Dict[str, str]) -> bool:
+        """Add messages to a session; returns False if it is unknown, expired or not the client's."""
+        with self._lock:
+            session = self._load(session_id)
+            if session is None or session.client_id != client_id:
+                return False
+            transcript = (session.messages + list(messages))[-self.max_messages:]
+            self._save(session_id, Session(client_id, transcript, time.time()))
+            return True
+
+    def delete(self, session_id: str, client_id: str) -> bool:
+        with self._lock:
+            session = self._load(session_id)
+            if session is None or session.client_id != client_id:
+                return False
+            self._delete(session_id)
+            return True
+
+    def stats(self) -> Dict[str, int]:
+        return {"sessions_in_memory": len(self._sessions), "max_sessions": self.max_sessions}
@@ -0,0 +1,140 @@
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+class StatsStore:
+    """Collection statistics maintained incrementally as URLs are written and deleted.
+
+    Per-URL rows hold the URL's current chunk count and text size; per-domain and
+    collection totals are updated by delta in the same transaction, so reading
+    the totals never scans the collection.
+    """
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS url_stats (
+                url_hash TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                domain TEXT NOT NULL,
+                chunks INTEGER NOT NULL,
+                text_bytes INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS domain_stats (
+                domain TEXT PRIMARY KEY,
+                urls INTEGER NOT NULL,
+                chunks INTEGER NOT NULL,
+                text_bytes INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS totals (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                urls INTEGER NOT NULL,
+                chunks INTEGER NOT NULL,
+                text_bytes INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO totals (id, urls, chunks, text_bytes) VALUES (0, 0, 0, 0);
+        """)
+        self._conn.commit()
+
+    def _apply_delta(self, domain: str, urls: int, chunks: int, text_bytes: int):
+        self._conn.execute(
+            "INSERT INTO domain_stats (domain, urls, chunks, text_bytes) VALUES (?, 0, 0, 0) "
+            "ON CONFLICT(domain) DO NOTHING", (domain,))
+        self._conn.execute(
+            "UPDATE domain_stats SET urls = urls + ?, chunks = chunks + ?, text_bytes = text_bytes + ? "
+            "WHERE domain = ?", (urls, chunks, text_bytes, domain))
+        self._conn.execute("DELETE FROM domain_stats WHERE domain = ? AND urls <= 0", (domain,))
+        self._conn.execute(
+            "UPDATE totals SET urls = urls + ?, chunks = chunks + ?, text_bytes = text_bytes + ? WHERE id = 0",
+            (urls, chunks, text_bytes))
+
+    def _record(self, url_hash: str, url: str, domain: str, chunks: int, text_bytes: int):
+        old = self._conn.execute("SELECT * FROM url_stats WHERE url_hash = ?", (url_hash,)).fetchone()
+        if old is not None:
+            self._apply_delta(old["domain"], -1, -old["chunks"], -old["text_bytes"])
+        self._apply_delta(domain, 1, chunks, text_bytes)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO url_stats (url_hash, url, domain, chunks, text_bytes) VALUES (?, ?, ?, ?, ?)",
+            (url_hash, url, domain, chunks, text_bytes))
+
+    def record_url(self, url_hash: str, url: str, domain: str, chunks: int, text_bytes: int):
+        """Set a URL's current chunk count and text size, adjusting the totals by the difference."""
+        with self._lock:
+            self._record(url_hash, url, domain, chunks, text_bytes)
+            self._conn.commit()
+
+    def remove_url(self, url_hash: str):
+        """Forget a deleted URL and subtract it from the totals."""
+        with self._lock:
+            old = self._conn.execute("SELECT * FROM url_stats WHERE url_hash = ?", (url_hash,)).fetchone()
+            if old is not None:
+                self._apply_delta(old["domain"], -1, -old["chunks"], -old["text_bytes"])
+                self._conn.execute("DELETE FROM url_stats WHERE url_hash = ?", (url_hash,))
+            self._conn.commit()
+
+    def has_url(self, url_hash: str) -> bool:
+        """Whether a URL is currently counted, by primary key."""
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM url_stats WHERE url_hash = ?", (url_hash,)).fetchone() is not None
+
+    def url_hashes(self) -> List[str]:
+        """Return the url_hash of every URL currently counted."""
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT url_hash FROM url_stats")]
+
+    def urls(self) -> List[Tuple[str, str]]:
+        """Return (url, url_hash) for every URL currently counted."""
+        with self._lock:
+            return [(row["url"], row["url_hash"]) for row in self._conn.execute("SELECT url, url_hash FROM url_stats")]
+
+    @staticmethod
+    def read_urls(path: str) -> List[Tuple[str, str]]:
+        """(url, url_hash) of every URL in a store file, read without opening it for writing; [] if it has none."""
+        if not os.path.exists(path):
+            return []
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            return conn.execute("SELECT url, url_hash FROM url_stats").fetchall()
+        except sqlite3.OperationalError:
+            return []
+        finally:
+            conn.close()
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT urls FROM totals WHERE id = 0").fetchone()[0] == 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return totals and per-domain counts without touching the collection."""
+        with self._lock:
+            totals = self._conn.execute("SELECT * FROM totals WHERE id = 0").fetchone()
+            domains = self._conn.execute("SELECT * FROM domain_stats ORDER BY chunks DESC").fetchall()
+        return {
+            "total_chunks": totals["chunks"],
+            "unique_urls": totals["urls"],
+            "unique_domains": len(domains),
+            "text_bytes": totals["text_bytes"],
+            "domains": [dict(row) for row in domains],
+        }
+
+    def rebuild(self, pages: Iterable[Dict[str, Any]]) -> Dict[str, Optional[int]]:
+        """Replace all statistics with a full rescan of the collection.
+
+        pages yields dicts with url_hash, url, domain, chunks and text_bytes. Returns
+        how far the incremental totals had drifted from the rescan.
+        """
+        with self._lock:
+            before = self._conn.execute("SELECT * FROM totals WHERE id = 0").fetchone()
+            self._conn.execute("DELETE FROM url_stats")
+            self._conn.execute("DELETE FROM domain_stats")
+            self._conn.execute("UPDATE totals SET urls = 0, chunks = 0, text_bytes = 0 WHERE id = 0")
+            for page in pages:
+                self._record(page["url_hash"], page["url"], page["domain"], page["chunks"], page["text_bytes"])
+            self._conn.commit()
+            after = self._conn.execute("SELECT * FROM totals WHERE id = 0").fetchone()
+        return {field: after[field] - before[field] for field in ("urls", "chunks", "text_bytes")}
@@ -1,8 +1,10 @@
 import streamlit as st
 import requests
 import json
-from typing import List, Dict
-from config import CHAT_API_URL, API_KEY, API_CLIENT_ID
+import time
+from typing import List, Dict, Iterator, Tuple, Optional
+from config import CHAT_API_URL, CHAT_STREAM_API_URL, SESSIONS_API_URL
+from auth_service import auth_service
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -22,21 +24,27 @@ if "is_authenticated" not in st.session_state:
     st.session_state.is_authenticated = False
 if "current_page" not in st.session_state:
     st.session_state.current_page = "chat"
+if "chat_session_id" not in st.session_state:
+    st.session_state.chat_session_id = None
 
 def format_message(role: str, content: str) -> Dict[str, str]:
     """Format message for API request"""
     return {"role": role, "content": content}
 
+def chat_request_body(query: str, chat_history: List[Dict[str, str]], session_id: Optional[str]) -> Dict:
+    """Send only the new query once the server holds the session; otherwise seed it with the history"""
+    if session_id:
+        return {"query": query, "session_id": session_id}
+    return {"query": query, "chat_history": chat_history}
+
 # Update existing functions to include client_id
-def get_chat_response(query: str, chat_history: List[Dict[str, str]], api_key: str, client_id: str) -> tuple:
+def get_chat_response(query: str, chat_history: List[Dict[str, str]], api_key: str, client_id: str,
+                      session_id: Optional[str] = None) -> tuple:
     """Get response from API with authentication"""
     try:
         response = requests.post(
             CHAT_API_URL,
-            json={
-                "query": query,
-                "chat_history": chat_history
-            },
+            json=chat_request_body(query, chat_history, session_id),
             headers={
                 "X-API-Key": api_key,
                 "X-Client-ID": client_id
@@ -50,6 +58,68 @@ def get_chat_response(query: str, chat_history: List[Dict[str, str]], api_key: s
             return None, "Authentication failed. Please check your credentials."
         return None, f"Error communicating with API: {str(e)}"
 
+def stream_chat_response(query: str, chat_history: List[Dict[str, str]], api_key: str, client_id: str,
+                         session_id: Optional[str] = None) -> Iterator[Tuple[str, Dict]]:
+    """Yield (event, data) pairs from the server-sent event chat stream"""
+    with requests.post(
+        CHAT_STREAM_API_URL,
+        json=chat_request_body(query, chat_history, session_id),
+        headers={
+            "X-API-Key": api_key,
+            "X-Client-ID": client_id
+        },
+        stream=True
+    ) as response:
+        if response.status_code == 403:
+            st.session_state.is_authenticated = False
+            yield "error", {"detail": "Authentication failed. Please check your credentials."}
+            return
+        if response.status_code == 404 and session_id:
+            yield "session_expired", {}
+            return
+        response.raise_for_status()
+        
+        event = "message"
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith("event:"):
+                event = line[len("event:"):].strip()
+            elif line.startswith("data:"):
+                yield event, json.loads(line[len("data:"):].strip())
+                event = "message"
+
+def stream_session_chat(query: str, chat_history: List[Dict[str, str]], api_key: str, client_id: str) -> Iterator[Tuple[str, Dict]]:
+    """Stream a chat turn in the current server session, starting a new one if it has expired"""
+    # A second attempt only happens after an expired session, and then without a session id
+    for _ in range(2):
+        for event, data in stream_chat_response(query, chat_history, api_key, client_id,
+                                                st.session_state.chat_session_id):
+            if event == "session_expired":
+                # Seed a fresh session from the local transcript
+                st.session_state.chat_session_id = None
+                break
+            if event == "session":
+                st.session_state.chat_session_id = data["session_id"]
+            yield event, data
+        else:
+            return
+
+def end_chat_session(api_key: str, client_id: str):
+    """Discard the server-side transcript of the current chat, if any"""
+    session_id = st.session_state.chat_session_id
+    st.session_state.chat_session_id = None
+    if not session_id:
+        return
+    try:
+        requests.delete(
+            f"{SESSIONS_API_URL}/{session_id}",
+            headers={
+                "X-API-Key": api_key,
+                "X-Client-ID": client_id
+            }
+        )
+    except requests.exceptions.RequestException:
+        pass  # The session expires on the server anyway
+
 def submit_url(url: str, force_update: bool = False, api_key: str = None, client_id: str = None) -> tuple:
     """Submit URL to be indexed"""
     try:
@@ -72,6 +142,28 @@ def submit_url(url: str, force_update: bool = False, api_key: str = None, client
             return None, "Authentication failed. Please check your credentials."
         return None, f"Error submitting URL: {str(e)}"
 
+def wait_for_job(job_id: str, api_key: str, client_id: str, timeout: float = 300) -> tuple:
+    """Poll an indexing job until it finishes or the timeout passes"""
+    deadline = time.time() + timeout
+    job = None
+    while time.time() < deadline:
+        try:
+            response = requests.get(
+                f"{CHAT_API_URL.rsplit('/', 1)[0]}/jobs/{job_id}",
+                headers={
+                    "X-API-Key": api_key,
+                    "X-Client-ID": client_id
+                }
+            )
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            return None, f"Error checking job status: {str(e)}"
+        job = response.json()
+        if job["status"] in ("succeeded", "failed"):
+            return job, None
+        time.sleep(1)
+    return job, None
+
 # Update session state initialization
 if "client_id" not in st.session_state:
     st.session_state.client_id = None
@@ -86,7 +178,8 @@ with st.sidebar:
         api_key = st.text_input("Enter API Key", type="password")
         
         if st.button("Login"):
-            if api_key == API_KEY and client_id == API_CLIENT_ID:
+            # Any tenant's key from the key store logs in; the chat then runs against that tenant's collection
+            if auth_service.validate_credentials(api_key, client_id):
                 st.session_state.api_key = api_key
                 st.session_state.client_id = client_id
                 st.session_state.is_authenticated = True
@@ -98,6 +191,7 @@ with st.sidebar:
     else:
         st.success("Authenticated ✅")
         if st.button("Logout"):
+            end_chat_session(st.session_state.api_key, st.session_state.client_id)
             st.session_state.api_key = None
             st.session_state.is_authenticated = False
             st.session_state.messages = []
@@ -140,6 +234,7 @@ with st.sidebar:
     
     if st.session_state.is_authenticated:
         if st.button("Clear Chat"):
+            end_chat_session(st.session_state.api_key, st.session_state.client_id)
             st.session_state.messages = []
             st.rerun()
 
@@ -167,35 +262,48 @@ if st.session_state.is_authenticated:
             with st.chat_message("user"):
                 st.write(prompt)
 
+            # Prior turns only; they are sent just to seed a session the server no longer has
             chat_history = [
-                msg for msg in st.session_state.messages 
+                format_message(msg["role"], msg["content"]) for msg in st.session_state.messages[:-1]
                 if msg["role"] in ["user", "assistant"]
             ]
 
             with st.chat_message("assistant"):
-                with st.spinner("Thinking..."):
-                    response_data, error = get_chat_response(
-                        prompt, 
+                # Render tokens as they arrive instead of waiting for the full answer
+                answer_placeholder = st.empty()
+                answer, sources, error = "", [], None
+                try:
+                    for event, data in stream_session_chat(
+                        prompt,
                         chat_history,
                         st.session_state.api_key,
                         st.session_state.client_id
-                    )
+                    ):
+                        if event == "token":
+                            answer += data["text"]
+                            answer_placeholder.markdown(answer + "▌")
+                        elif event == "sources":
+                            sources = data["sources"]
+                        elif event == "error":
+                            error = data["detail"]
+                except requests.exceptions.RequestException as e:
+                    error = f"Error communicating with API: {str(e)}"
+                
+                if error:
+                    st.error(error)
+                else:
+                    answer_placeholder.markdown(answer)
+                    
+                    if sources:
+                        with st.expander("View Sources"):
+                            for source in sources:
+                                st.write(f"- {source}")
                     
-                    if error:
-                        st.error(error)
-                    else:
-                        st.write(response_data["response"])
-                        
-                        if response_data.get("sources"):
-                            with st.expander("View Sources"):
-                                for source in response_data["sources"]:
-                                    st.write(f"- {source}")
-                        
-                        st.session_state.messages.append({
-                            "role": "assistant",
-                            "content": response_data["response"],
-                            "sources": response_data.get("sources", [])
-                        })
+                    st.session_state.messages.append({
+                        "role": "assistant",
+                        "content": answer,
+                        "sources": sources
+                    })
     
     else:
         # URL Submission Interface
@@ -219,6 +327,20 @@ if st.session_state.is_authenticated:
                         )
                         if error:
                             st.error(error)
+                        elif result.get("job_id"):
+                            job, error = wait_for_job(
+                                result["job_id"],
+                                st.session_state.api_key,
+                                st.session_state.client_id
+                            )
+                            if error:
+                                st.error(error)
+                            elif job["status"] == "succeeded":
+                                st.success(f"Successfully {job['result']} {url}")
+                            elif job["status"] == "failed":
+                                st.error(f"Failed to index {url}: {job['error']}")
+                            else:
+                                st.info(f"{result['message']} (still {job['status']})")
                         else:
                             st.success(result["message"])
                 else:
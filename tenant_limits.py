@@ -0,0 +1,123 @@
+import math
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+
+class RateLimitExceeded(Exception):
+    """A tenant is over its request rate or concurrency cap; retry_after is in seconds, None if retrying won't help."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Allow `rate` units per second on average and bursts of up to `burst` units."""
+
+    def __init__(self, rate: float, burst: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = float(burst)
+        self.updated_at = clock()
+
+    def take(self, cost: float = 1.0) -> float:
+        """Take cost tokens and return 0, or take nothing and return the seconds until they are available."""
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate if self.rate > 0 else math.inf
+
+
+class Slot:
+    """One admitted request; release() (or leaving the with block) frees its concurrency slot, once."""
+
+    def __init__(self, release: Callable[[], None]):
+        self._release = release
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class TenantLimiter:
+    """Token-bucket rate limits and concurrency caps per tenant and action.
+
+    limits maps an action ('chat', 'index') to its rate (units per second),
+    burst and concurrency; overrides maps a tenant to '<action>_<limit>' values,
+    e.g. {"acme": {"chat_rate": 20}}. Exempt tenants are unlimited except for
+    their overrides, so the default tenant of an existing single-tenant
+    deployment is only throttled if configured to be. Admission is a dict
+    lookup and a few additions under one lock. State is per process, so with
+    several workers each enforces the limits on the requests it serves.
+    """
+
+    def __init__(self, limits: Dict[str, Dict[str, float]], overrides: Optional[Dict[str, Dict[str, float]]] = None,
+                 exempt: Iterable[str] = (), clock: Callable[[], float] = time.monotonic):
+        self.limits = limits
+        self.overrides = overrides or {}
+        self.exempt = set(exempt)
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._buckets: Dict[Tuple[str, str], TokenBucket] = {}
+        self._in_flight: Dict[Tuple[str, str], int] = {}
+        self._rejected: Dict[Tuple[str, str, str], int] = {}  # (tenant, action, reason) -> count
+
+    def limits_for(self, tenant: str, action: str) -> Dict[str, float]:
+        overrides = self.overrides.get(tenant, {})
+        return {name: overrides.get(f"{action}_{name}", math.inf if tenant in self.exempt else value)
+                for name, value in self.limits[action].items()}
+
+    def _reject(self, tenant: str, action: str, reason: str, message: str, retry_after: Optional[float]):
+        key = (tenant, action, reason)
+        self._rejected[key] = self._rejected.get(key, 0) + 1
+        raise RateLimitExceeded(message, retry_after)
+
+    def acquire(self, tenant: str, action: str, cost: float = 1.0) -> Slot:
+        """Admit a request costing `cost` rate units or raise RateLimitExceeded; release the returned slot when done."""
+        key = (tenant, action)
+        with self._lock:
+            limits = self.limits_for(tenant, action)
+            if cost > limits["burst"]:
+                self._reject(tenant, action, "too_large",
+                             f"Request of {cost:g} exceeds the {action} burst limit of {limits['burst']:g}", None)
+            if self._in_flight.get(key, 0) >= limits["concurrency"]:
+                self._reject(tenant, action, "concurrency",
+                             f"Too many concurrent {action} requests (limit {limits['concurrency']:g})", 1.0)
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(limits["rate"], limits["burst"], self.clock)
+            wait = bucket.take(cost)
+            if wait:
+                self._reject(tenant, action, "rate",
+                             f"{action.capitalize()} rate limit of {limits['rate']:g}/s exceeded", wait)
+            self._in_flight[key] = self._in_flight.get(key, 0) + 1
+        return Slot(lambda: self._release(key))
+
+    def _release(self, key: Tuple[str, str]):
+        with self._lock:
+            self._in_flight[key] -= 1
+
+    def collect_metrics(self):
+        """Requests in flight and rejections per tenant and action, as metric samples."""
+        with self._lock:
+            in_flight = dict(self._in_flight)
+            rejected = dict(self._rejected)
+        samples = [("rag_tenant_requests_in_flight", "gauge", "Admitted tenant requests still running",
+                    {"tenant": tenant, "action": action}, count) for (tenant, action), count in in_flight.items()]
+        samples += [("rag_tenant_rejections_total", "counter", "Tenant requests refused by rate or concurrency limits",
+                     {"tenant": tenant, "action": action, "reason": reason}, count)
+                    for (tenant, action, reason), count in rejected.items()]
+        return samples
@@ -0,0 +1,135 @@
+import os
+import threading
+from typing import Callable, Dict, List, Tuple
+
+from config import (PERSIST_DIRECTORY, TENANTS_DIRECTORY, EMBEDDING_CACHE_PATH, STATS_STORE_PATH, BM25_INDEX_PATH,
+                    VECTOR_STORE_WAL_PATH, DEDUP_INDEX_PATH)
+from key_store import KeyStore
+from stats_store import StatsStore
+
+
+def tenant_directory(tenant: str) -> str:
+    """Directory holding a tenant's collection and its index, stats, dedup, WAL and embedding cache files."""
+    KeyStore.check_client_id(tenant)
+    return os.path.join(TENANTS_DIRECTORY, tenant)
+
+
+def tenant_file(tenant: str, default_tenant: str, default_path: str) -> str:
+    """Where one of the top-level index files (default_path) lives for a tenant."""
+    if tenant == default_tenant:
+        return default_path
+    return os.path.join(tenant_directory(tenant), os.path.basename(default_path))
+
+
+def build_tenant_service(tenant: str, default_tenant: str, read_only: bool = False):
+    """Build the RAGService of one tenant.
+
+    The default tenant keeps PERSIST_DIRECTORY and the top-level files, so a
+    single-tenant deployment's existing index stays in use unchanged.
+    """
+    from index_service import VectorStoreManager
+    from rag_service import RAGService
+
+    if tenant == default_tenant:
+        return RAGService(PERSIST_DIRECTORY, read_only=read_only)
+    directory = tenant_directory(tenant)
+    os.makedirs(directory, exist_ok=True)
+
+    def path(default):
+        return tenant_file(tenant, default_tenant, default) if default else None
+
+    manager = VectorStoreManager(
+        directory,
+        embedding_cache_path=path(EMBEDDING_CACHE_PATH),
+        stats_store_path=path(STATS_STORE_PATH),
+        bm25_index_path=path(BM25_INDEX_PATH),
+        wal_path=path(VECTOR_STORE_WAL_PATH),
+        dedup_index_path=path(DEDUP_INDEX_PATH),
+        read_only=read_only
+    )
+    return RAGService(directory, vector_store_manager=manager)
+
+
+class TenantRegistry:
+    """One RAGService, and so one collection with its own indexes and caches, per client id.
+
+    A tenant's retrieval only ever searches its own chunks, and one tenant's
+    writes never touch another's vector, BM25 or dedup indexes. Services are
+    built on a tenant's first request (build(tenant) may take seconds for a large
+    index; other tenants are not held up meanwhile) and kept for the process
+    lifetime. Background work addresses pages as "<tenant>/<url_hash>" keys,
+    with the default tenant's keys left as the bare url_hash.
+    """
+
+    def __init__(self, build: Callable[[str], object], default_tenant: str):
+        self.build = build
+        self.default_tenant = default_tenant
+        self._services: Dict[str, object] = {}
+        self._lock = threading.Lock()
+        self._build_locks: Dict[str, threading.Lock] = {}
+
+    def get(self, tenant: str):
+        """Return the tenant's service, building it on first use."""
+        tenant = tenant or self.default_tenant
+        service = self._services.get(tenant)
+        if service is not None:
+            return service
+        with self._lock:
+            build_lock = self._build_locks.setdefault(tenant, threading.Lock())
+        with build_lock:
+            service = self._services.get(tenant)
+            if service is None:
+                service = self.build(tenant)
+                with self._lock:
+                    self._services[tenant] = service
+        return service
+
+    def get_loaded(self, tenant: str):
+        """The tenant's service if it is already built, else None; never blocks on a build."""
+        return self._services.get(tenant or self.default_tenant)
+
+    def loaded(self) -> Dict[str, object]:
+        with self._lock:
+            return dict(self._services)
+
+    def tenants(self) -> List[str]:
+        """Tenants with data on disk or a service in this process."""
+        on_disk = os.listdir(TENANTS_DIRECTORY) if os.path.isdir(TENANTS_DIRECTORY) else []
+        return sorted({self.default_tenant, *on_disk, *self.loaded()})
+
+    def run_index_job(self, tenant: str, url: str, force_update: bool, progress) -> str:
+        """JobQueue handler: index a URL into the collection of the tenant that submitted it."""
+        return self.get(tenant).run_index_job(url, force_update, progress)
+
+    def page_key(self, tenant: str, url_hash: str) -> str:
+        return url_hash if tenant == self.default_tenant else f"{tenant}/{url_hash}"
+
+    def indexed_urls(self, tenant: str) -> List[Tuple[str, str]]:
+        """(url, url_hash) of a tenant's pages; read from its stats file unless the tenant is loaded."""
+        service = self.get_loaded(tenant)
+        if service is not None:
+            return service.vector_store_manager.get_indexed_urls()
+        return StatsStore.read_urls(tenant_file(tenant, self.default_tenant, STATS_STORE_PATH))
+
+    def list_indexed_urls(self) -> List[Tuple[str, str]]:
+        """(url, page key) for every page of every tenant, for the recrawler.
+
+        Tenants are not loaded for this; only refreshing a due page loads its tenant.
+        """
+        return [(url, self.page_key(tenant, url_hash))
+                for tenant in self.tenants()
+                for url, url_hash in self.indexed_urls(tenant)]
+
+    def refresh_url(self, url: str, key: str) -> str:
+        tenant = key.split("/", 1)[0] if "/" in key else self.default_tenant
+        return self.get(tenant).refresh_url(url)
+
+    def collect_metrics(self):
+        """Every loaded tenant's service metrics, labelled with the tenant."""
+        return [(name, kind, help, {**labels, "tenant": tenant}, value)
+                for tenant, service in self.loaded().items()
+                for name, kind, help, labels, value in service.collect_metrics()]
+
+    def close(self):
+        for service in self.loaded().values():
+            service.vector_store_manager.close()
@@ -0,0 +1,24 @@
+import os
+
+import pytest
+
+from benchmarks.fakes import make_rag_service
+
+
+@pytest.fixture
+def make_service(tmp_path):
+    """Build RAGServices over the local backend in tmp_path/<name>, closed after the test."""
+    services = []
+
+    def make(name="db", **kwargs):
+        kwargs.setdefault("backend", "local")
+        kwargs.setdefault("flush_interval", 0)
+        directory = os.path.join(tmp_path, name)
+        os.makedirs(directory, exist_ok=True)
+        service = make_rag_service(directory, **kwargs)
+        services.append(service)
+        return service
+
+    yield make
+    for service in services:
+        service.vector_store_manager.close()
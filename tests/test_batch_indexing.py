@@ -0,0 +1,41 @@
+import threading
+from collections import Counter
+
+from benchmarks.fixtures import make_html_page, serve_pages
+
+
+def chunks_per_page(manager):
+    return Counter(meta["url_hash"] for meta in manager.vector_store.get(include=["metadatas"])["metadatas"])
+
+
+def test_batch_statuses_follow_input_order(make_service):
+    manager = make_service().vector_store_manager
+    pages = {f"p{i}.html": make_html_page(f"P{i}") for i in range(3)}
+    with serve_pages(pages) as base:
+        urls = [base + "p2.html", base + "missing.html", base + "p0.html", base + "p2.html"]
+        assert manager.process_url(urls[2])
+        results = manager.process_urls(urls)
+    assert [result["url"] for result in results] == urls[:3]
+    assert [result["status"] for result in results] == ["indexed", "failed", "skipped"]
+    assert "404" in results[1]["error"]
+
+
+def test_concurrent_batches_index_each_page_once(make_service):
+    manager = make_service(embed_latency=0.05).vector_store_manager
+    reference = make_service("reference").vector_store_manager
+    pages = {f"p{i}.html": make_html_page(f"P{i}", paragraphs=30) for i in range(3)}
+    with serve_pages(pages) as base:
+        urls = [base + path for path in pages]
+        threads = [threading.Thread(target=manager.process_urls, args=(urls,)),
+                   threading.Thread(target=manager.process_urls, args=(urls,)),
+                   threading.Thread(target=manager.process_url, args=(urls[0],))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        reference.process_urls(urls)
+
+    expected = chunks_per_page(reference)
+    assert len(expected) == 3
+    assert chunks_per_page(manager) == expected
+    assert manager.get_collection_stats()["total_chunks"] == sum(expected.values())
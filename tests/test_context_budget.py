@@ -0,0 +1,29 @@
+import tiktoken
+
+import context_budget
+
+
+class FakeEncoding:
+    def encode(self, text):
+        return text.split()
+
+
+def test_warmup_load_switches_counters_from_the_estimate(tmp_path, monkeypatch):
+    monkeypatch.setattr(context_budget, "_encoders", {})
+    monkeypatch.setenv("TIKTOKEN_CACHE_DIR", str(tmp_path))  # Empty cache: nothing to load offline
+    loaded = []
+    monkeypatch.setattr(tiktoken, "get_encoding", lambda name: loaded.append(name) or FakeEncoding())
+
+    count = context_budget.token_counter("some-model")
+    assert count("one two three four five six") == 7  # ~4 characters per token
+    assert context_budget.counter_name("some-model") == "estimate" and not loaded
+
+    assert context_budget.load_encoding("some-model") == "tiktoken/cl100k_base"
+    assert count("one two three four five six") == 6
+    assert context_budget.counter_name("some-model") == "tiktoken/cl100k_base"
+    assert context_budget.load_encoding("some-model") == "tiktoken/cl100k_base" and loaded == ["cl100k_base"]
+
+
+def test_stats_report_the_active_counter(make_service, monkeypatch):
+    monkeypatch.setattr(context_budget, "_encoders", {})
+    assert make_service().get_collection_stats()["token_counter"] == "estimate"
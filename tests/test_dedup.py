@@ -0,0 +1,35 @@
+from benchmarks.fixtures import make_html_page, serve_pages
+
+BANNER = "<p>" + " ".join(["We use cookies to improve your experience on this website, please accept them."] * 12) + "</p>"
+
+
+def banner_chunks(manager):
+    stored = manager.vector_store.get(include=["metadatas", "documents"])
+    return [(chunk_id, meta) for chunk_id, meta, text in zip(stored["ids"], stored["metadatas"], stored["documents"])
+            if "cookies" in text]
+
+
+def test_deleting_the_owner_hands_a_shared_chunk_to_a_referrer(make_service):
+    service = make_service()
+    manager = service.vector_store_manager
+    pages = {f"p{i}.html": make_html_page(f"Page {i}", paragraphs=6).replace("</article>", BANNER + "</article>")
+             for i in range(3)}
+    with serve_pages(pages) as base:
+        urls = [base + path for path in pages]
+        assert [result["status"] for result in manager.process_urls(urls)] == ["indexed"] * 3
+
+    [(chunk_id, meta)] = banner_chunks(manager)
+    owner = meta["url"]
+    assert sorted(url for _, url, _ in manager.dedup_index.referrers(chunk_id)) == sorted(set(urls) - {owner})
+
+    manager.delete_url(owner)
+    [(handed_over_id, meta)] = banner_chunks(manager)
+    assert handed_over_id == chunk_id
+    assert meta["url"] in urls and meta["url"] != owner
+    assert meta["url_hash"] == manager.get_url_hash(meta["url"])
+    assert [url for _, url, _ in manager.dedup_index.referrers(chunk_id)] == sorted(set(urls) - {owner, meta["url"]})
+
+    docs = service.get_retriever(score_threshold=0.0).invoke("cookies improve your experience accept")
+    assert owner not in {doc.metadata["url"] for doc in docs}
+    assert owner not in {url for doc in docs for url in doc.metadata.get("source_urls", [])}
+    assert not any(manager.reconcile()["stats_drift"].values())
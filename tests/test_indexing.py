@@ -0,0 +1,59 @@
+import os
+import random
+
+from benchmarks.fixtures import WORDS, make_html_page, serve_pages
+
+
+def touch_forward(path, seconds=10):
+    # Last-Modified has one-second resolution, so move the mtime well past the stored validator
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime + seconds, stat.st_mtime + seconds))
+
+
+def test_unmodified_page_is_not_downloaded_again(tmp_path, make_service):
+    manager = make_service().vector_store_manager
+    with serve_pages({"a.html": make_html_page("A")}, directory=str(tmp_path)) as base:
+        url = base + "a.html"
+        assert manager.process_url(url)
+        fingerprint = manager.get_page_fingerprint(manager.get_url_hash(url))
+        assert fingerprint["page_last_modified"]
+
+        plan = manager.prepare_url(url, fingerprint)
+        assert plan.status == "unchanged" and plan.chunk_count == 0  # 304, nothing parsed
+
+        touch_forward(tmp_path / "a.html")
+        plan = manager.prepare_url(url, fingerprint)
+        assert plan.status == "unchanged" and plan.chunk_count > 0  # same body behind a new validator
+        assert not plan.add and not plan.delete_ids
+
+
+def test_edited_page_only_reembeds_changed_chunks(tmp_path, make_service):
+    manager = make_service().vector_store_manager
+    rng = random.Random(0)
+    paragraphs = [" ".join(rng.choices(WORDS, k=80)) + "." for _ in range(30)]
+
+    def write_page(version):
+        path = tmp_path / "a.html"
+        path.write_text("<html><body><article>" + "".join(f"<p>{p}</p>" for p in paragraphs)
+                        + "</article></body></html>")
+        touch_forward(path, seconds=10 * version)
+
+    write_page(0)
+    with serve_pages({}, directory=str(tmp_path)) as base:
+        url = base + "a.html"
+        assert manager.process_url(url)
+        before = manager.vector_store.count()
+
+        # Same length, so the splitter keeps every other chunk boundary where it was
+        edited = "The zebra migration starts in July. " + paragraphs[15]
+        paragraphs[15] = edited[:len(paragraphs[15])]
+        write_page(1)
+        plan = manager.prepare_url(url, manager.get_page_fingerprint(manager.get_url_hash(url)))
+        assert plan.status == "updated"
+        assert 1 <= len(plan.add) <= 2 and len(plan.delete_ids) == len(plan.add)
+        assert len(plan.update_ids) >= before - 2
+
+        assert manager.process_url(url, force_update=True)
+        assert manager.vector_store.count() == before
+        hits = manager.vector_store.get(where={"url_hash": manager.get_url_hash(url)}, include=["documents"])
+        assert any("zebra migration" in text for text in hits["documents"])
@@ -0,0 +1,126 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from benchmarks.fixtures import make_html_page, serve_pages
+from job_queue import JobQueue
+
+
+def wait_for(queue, job_id, status, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while queue.get(job_id)["status"] != status:
+        assert time.monotonic() < deadline, f"job {job_id} never reached {status}"
+        time.sleep(0.01)
+    return queue.get(job_id)
+
+
+class GatedHandler:
+    """Job handler that records its calls and blocks until the gate is opened."""
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.calls = []
+
+    def __call__(self, tenant, url, force_update, progress):
+        self.calls.append((tenant, url, force_update))
+        self.gate.wait(10)
+        if "bad" in url:
+            raise RuntimeError(f"404 Client Error for url: {url}")
+        return "indexed"
+
+
+@pytest.fixture
+def handler():
+    handler = GatedHandler()
+    yield handler
+    handler.gate.set()
+
+
+@pytest.fixture
+def queue(tmp_path, handler):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite"), handler, workers=1, max_attempts=1)
+    yield queue
+    queue.stop()
+
+
+def test_submits_for_a_queued_url_share_one_job(queue, handler):
+    first = queue.submit("http://a.com/1", "h1")
+    assert queue.submit("http://a.com/1", "h1") == first
+    assert queue.submit("http://a.com/1", "h1", force_update=True) == first
+    assert queue.get(first)["force_update"] is True
+    other_tenant = queue.submit("http://a.com/1", "h1", tenant="acme")
+    assert other_tenant != first
+
+    handler.gate.set()
+    queue.start()
+    assert wait_for(queue, first, "succeeded")["result"] == "indexed"
+    wait_for(queue, other_tenant, "succeeded")
+    assert sorted(handler.calls) == [("", "http://a.com/1", True), ("acme", "http://a.com/1", False)]
+
+
+def test_forced_submit_while_running_queues_one_follow_up(queue, handler):
+    queue.start()
+    running = queue.submit("http://a.com/1", "h1")
+    wait_for(queue, running, "running")
+    assert queue.submit("http://a.com/1", "h1") == running
+
+    follow_up = queue.submit("http://a.com/1", "h1", force_update=True)
+    assert follow_up != running
+    assert queue.submit("http://a.com/1", "h1", force_update=True) == follow_up
+    assert queue.submit("http://a.com/1", "h1") == follow_up
+
+    handler.gate.set()
+    wait_for(queue, follow_up, "succeeded")
+    assert [force for _, _, force in handler.calls] == [False, True]
+
+
+def test_failed_job_records_the_handler_error(queue, handler):
+    handler.gate.set()
+    queue.start()
+    job = wait_for(queue, queue.submit("http://a.com/bad", "h2"), "failed")
+    assert "404 Client Error" in job["error"]
+
+
+def test_failed_attempt_hands_over_to_a_queued_follow_up(tmp_path, handler):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite"), handler, workers=1, max_attempts=3, backoff_seconds=0.01)
+    try:
+        queue.start()
+        first = queue.submit("http://a.com/bad", "h1")
+        wait_for(queue, first, "running")
+        follow_up = queue.submit("http://a.com/bad", "h1", force_update=True)
+
+        handler.gate.set()
+        job = wait_for(queue, first, "failed")
+        assert job["attempts"] == 1 and f"superseded by job {follow_up}" in job["error"]
+        assert wait_for(queue, follow_up, "failed")["attempts"] == 3
+        assert len(handler.calls) == 4
+    finally:
+        queue.stop()
+
+
+def test_worker_survives_a_failed_claim(queue, handler, monkeypatch):
+    claim = queue._claim
+    failures = []
+
+    def flaky_claim():
+        if not failures:
+            failures.append(1)
+            raise sqlite3.OperationalError("database is locked")
+        return claim()
+
+    monkeypatch.setattr(queue, "_claim", flaky_claim)
+    handler.gate.set()
+    queue.start()
+    assert wait_for(queue, queue.submit("http://a.com/1", "h1"), "succeeded")["result"] == "indexed"
+    assert failures
+
+
+def test_index_job_reports_an_unmodified_page_as_unchanged(tmp_path, make_service):
+    service = make_service()
+    with serve_pages({"a.html": make_html_page("A")}, directory=str(tmp_path)) as base:
+        url = base + "a.html"
+        assert service.run_index_job(url, False, print) == "indexed"
+        assert service.run_index_job(url, False, print) == "skipped"
+        assert service.run_index_job(url, True, print) == "unchanged"
@@ -0,0 +1,36 @@
+import pytest
+
+from benchmarks.fakes import FakeChatModel
+from query_rewriter import QueryRewriter
+
+HISTORY = [{"role": "user", "content": "What is a vector index?"},
+           {"role": "assistant", "content": "A structure for nearest neighbour search [1]."}]
+
+
+@pytest.mark.parametrize("query", [
+    "How does it scale to billions of rows?",
+    "Which of these supports filtering by metadata?",
+    "Is the former faster than a flat index?",
+    "And what about memory usage on disk?",
+    "Why so slow?",
+])
+def test_follow_ups_are_rewritten(query):
+    assert QueryRewriter(FakeChatModel()).route(query, HISTORY) == "rewrite"
+
+
+@pytest.mark.parametrize("query", [
+    "Which Python library has more than one ANN index type?",
+    "How many shards does one Elasticsearch node hold?",
+    "What is the default chunk size of the text splitter?",
+    "Why does HNSW use more memory than IVF?",
+    "Why not use a flat index below a million vectors?",
+])
+def test_self_contained_questions_skip_the_rewrite(query):
+    assert QueryRewriter(FakeChatModel()).route(query, HISTORY) == "self_contained"
+    assert QueryRewriter(FakeChatModel()).route(query, []) == "no_history"
+
+
+@pytest.mark.parametrize("query", ["Why?", "why not?", "Why not", "  WHY?! "])
+def test_bare_why_is_a_follow_up(query):
+    # min_words=1 so the word count alone does not send these to the rewrite
+    assert QueryRewriter(FakeChatModel(), min_words=1).route(query, HISTORY) == "rewrite"
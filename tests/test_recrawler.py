@@ -0,0 +1,108 @@
+import os
+
+import pytest
+
+from benchmarks.fixtures import make_html_page, serve_pages
+from recrawler import RecrawlScheduler
+
+
+class FakeClock:
+    """Clock whose sleep() advances time instantly, recording each wait."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.waits = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.waits.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def site(tmp_path, make_service):
+    """Three indexed pages on 127.0.0.1 and one on localhost, served from a directory the test can edit."""
+    directory = tmp_path / "site"
+    directory.mkdir()
+    pages = {f"{name}.html": make_html_page(f"Page {name}", paragraphs=6) for name in ("a", "b", "c", "d")}
+    with serve_pages(pages, directory=str(directory)) as base:
+        urls = [base + name for name in ("a.html", "b.html", "c.html")]
+        urls.append(base.replace("127.0.0.1", "localhost") + "d.html")
+        service = make_service()
+        assert [result["status"] for result in service.process_urls(urls)] == ["indexed"] * 4
+        yield service, urls, directory
+
+
+def make_scheduler(path, service, clock, requests, **kwargs):
+    def refresh(url, key):
+        requests.append((url, clock()))
+        return service.refresh_url(url)
+
+    return RecrawlScheduler(str(path), service.vector_store_manager.get_indexed_urls, refresh,
+                            clock=clock, sleep=clock.sleep, max_domains_in_parallel=1, **kwargs)
+
+
+def test_pages_are_recrawled_on_their_domain_cadence(tmp_path, site):
+    service, urls, _ = site
+    clock, requests = FakeClock(), []
+    localhost = urls[3].split("/")[2]
+    scheduler = make_scheduler(tmp_path / "recrawl.sqlite", service, clock, requests,
+                               default_interval=100, domain_intervals={localhost: 50}, min_domain_delay=0)
+
+    assert scheduler.run_once() == {}  # just indexed, so a full interval away
+    clock.now += 60
+    assert scheduler.run_once() == {"unchanged": 1}
+    assert [url for url, _ in requests] == [urls[3]]
+
+    clock.now += 50
+    requests.clear()
+    assert scheduler.run_once() == {"unchanged": 4}
+    assert sorted(url for url, _ in requests) == sorted(urls)
+
+    # The cadence is persisted: a new scheduler over the same state has nothing due
+    reopened = make_scheduler(tmp_path / "recrawl.sqlite", service, clock, requests, default_interval=100,
+                              domain_intervals={localhost: 50})
+    assert reopened.due_urls() == {}
+    clock.now += 50
+    assert [url for _, url in sum(reopened.due_urls().values(), [])] == [urls[3]]
+
+
+def test_requests_to_one_domain_are_spaced(tmp_path, site):
+    service, urls, _ = site
+    clock, requests = FakeClock(), []
+    scheduler = make_scheduler(tmp_path / "recrawl.sqlite", service, clock, requests,
+                               default_interval=100, min_domain_delay=5)
+    scheduler.run_once()
+    clock.now += 100
+    scheduler.run_once()
+
+    times = [at for url, at in requests if "127.0.0.1" in url]
+    assert len(times) == 3
+    assert all(later - earlier >= 5 for earlier, later in zip(times, times[1:]))
+    assert clock.waits == [5, 5]  # the other domain's page is not held up by them
+
+
+def test_unmodified_pages_cost_a_304_and_edited_ones_are_updated(tmp_path, site):
+    service, urls, directory = site
+    manager = service.vector_store_manager
+    clock, requests = FakeClock(), []
+    scheduler = make_scheduler(tmp_path / "recrawl.sqlite", service, clock, requests,
+                               default_interval=100, min_domain_delay=0)
+    scheduler.run_once()
+
+    parsed = manager.get_ingest_stats()["parse"]["items"]
+    embedded = manager.embedding_function.calls
+    clock.now += 100
+    assert scheduler.run_once() == {"unchanged": 4}
+    assert manager.get_ingest_stats()["parse"]["items"] == parsed  # every page answered 304
+    assert manager.embedding_function.calls == embedded
+
+    path = directory / "b.html"
+    path.write_text(make_html_page("Page b", paragraphs=6, facts=["The b page now documents zebras."]))
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime + 10, stat.st_mtime + 10))
+    clock.now += 100
+    assert scheduler.run_once() == {"unchanged": 3, "updated": 1}
+    assert manager.get_ingest_stats()["parse"]["items"] == parsed + 1
@@ -0,0 +1,37 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fakes import FakeEmbeddings
+from benchmarks.fixtures import make_html_page, serve_pages
+from embedding_cache import CachedEmbeddings, EmbeddingCache
+
+
+def test_sync_hybrid_search_on_a_saturated_executor(make_service):
+    service = make_service()
+    manager = service.vector_store_manager
+    page = make_html_page("Errors", paragraphs=4, facts=["Error code ERR-42 means the disk is full."])
+    with serve_pages({"errors.html": page}) as base:
+        assert manager.process_url(base + "errors.html")
+
+    # Batch answers run the sync retriever on the manager's executor; with every worker busy
+    # doing so, a retriever waiting on a task queued behind them would never finish
+    manager.executor = ThreadPoolExecutor(max_workers=1)
+    retriever = service.get_retriever(score_threshold=0.0, hybrid=True)
+    docs = manager.executor.submit(retriever.invoke, "What does ERR-42 mean?").result(timeout=30)
+    assert any("ERR-42" in doc.page_content for doc in docs)
+    manager.executor.shutdown()
+
+
+def test_async_embeddings_use_the_cache(tmp_path):
+    embeddings = FakeEmbeddings()
+    cached = CachedEmbeddings(embeddings, EmbeddingCache(str(tmp_path / "cache.sqlite")))
+
+    async def embed():
+        first = await cached.aembed_documents(["alpha", "beta", "alpha"])
+        second = await cached.aembed_query("beta")
+        return first, second
+
+    first, second = asyncio.run(embed())
+    assert first[0] == first[2] and second == first[1]
+    assert embeddings.calls == 1
+    assert cached.cache.stats()["hits"] == 1
@@ -0,0 +1,85 @@
+import math
+
+import pytest
+
+from benchmarks.fixtures import make_html_page, serve_pages
+from key_store import KeyStore
+from tenant_limits import RateLimitExceeded, TenantLimiter
+from tenants import TenantRegistry
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_tenants_only_see_their_own_pages(make_service):
+    registry = TenantRegistry(make_service, default_tenant="default")
+    page = make_html_page("Zebras", paragraphs=4, facts=["Zebra code ZX-7 is only documented here."])
+    with serve_pages({"zebras.html": page}) as base:
+        url = base + "zebras.html"
+        assert registry.run_index_job("acme", url, False, lambda stage: None) == "indexed"
+        url_hash = registry.get("acme").vector_store_manager.get_url_hash(url)
+        assert registry.refresh_url(url, registry.page_key("acme", url_hash)) == "unchanged"
+
+    acme, globex = registry.get("acme"), registry.get("globex")
+    assert acme.url_exists(url) and not globex.url_exists(url)
+    assert registry.indexed_urls("acme") == [(url, url_hash)]
+    assert registry.indexed_urls("globex") == []
+    assert acme.get_retriever(score_threshold=0.0).invoke("What is ZX-7?")
+    assert globex.get_retriever(score_threshold=0.0).invoke("What is ZX-7?") == []
+    assert registry.page_key("acme", url_hash) == f"acme/{url_hash}"
+    assert registry.page_key("default", url_hash) == url_hash
+
+
+def test_keys_authenticate_one_tenant(tmp_path):
+    keys = KeyStore(str(tmp_path / "keys.sqlite"))
+    acme = keys.add("acme")
+    assert keys.lookup(acme)["client_id"] == "acme"
+    assert keys.lookup("not-a-key") is None
+    with pytest.raises(ValueError):
+        keys.add("../globex")
+
+    assert keys.ensure_configured("default", "old") == 0
+    assert keys.ensure_configured("default", "new") == 1
+    assert not keys.lookup("old")["is_active"] and keys.lookup("new")["is_active"]
+    assert keys.lookup(acme)["is_active"]
+
+
+def test_rate_limit_refills_over_time():
+    clock = FakeClock()
+    limiter = TenantLimiter({"chat": {"rate": 1, "burst": 2, "concurrency": 10}}, clock=clock)
+    limiter.acquire("acme", "chat").release()
+    limiter.acquire("acme", "chat").release()
+    with pytest.raises(RateLimitExceeded) as rejected:
+        limiter.acquire("acme", "chat")
+    assert rejected.value.retry_after == pytest.approx(1.0)
+    limiter.acquire("globex", "chat").release()  # buckets are per tenant
+
+    clock.now += 1.0
+    limiter.acquire("acme", "chat").release()
+    with pytest.raises(RateLimitExceeded) as rejected:
+        limiter.acquire("acme", "chat", cost=3)
+    assert rejected.value.retry_after is None
+
+
+def test_concurrency_cap_and_exempt_tenants():
+    limiter = TenantLimiter({"index": {"rate": math.inf, "burst": math.inf, "concurrency": 1}},
+                            overrides={"globex": {"index_concurrency": 2}, "initech": {"index_concurrency": 1}},
+                            exempt=["default", "initech"])
+    with limiter.acquire("acme", "index"):
+        with pytest.raises(RateLimitExceeded):
+            limiter.acquire("acme", "index")
+        with limiter.acquire("globex", "index"), limiter.acquire("globex", "index"):
+            pass
+    limiter.acquire("acme", "index").release()
+
+    slots = [limiter.acquire("default", "index") for _ in range(5)]
+    for slot in slots:
+        slot.release()
+    with limiter.acquire("initech", "index"):  # an override still limits an exempt tenant
+        with pytest.raises(RateLimitExceeded):
+            limiter.acquire("initech", "index")
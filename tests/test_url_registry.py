@@ -0,0 +1,53 @@
+import hashlib
+
+import index_service
+from benchmarks.fixtures import make_html_page, serve_pages
+from stats_store import StatsStore
+from url_registry import UrlRegistry
+
+
+def url_hash(i):
+    return hashlib.md5(f"http://a.com/{i}".encode()).hexdigest()
+
+
+def test_bloom_positives_are_confirmed_against_the_stats_store(tmp_path):
+    store = StatsStore(str(tmp_path / "stats.sqlite"))
+    lookups = []
+
+    def confirm(digest):
+        lookups.append(digest)
+        return store.has_url(digest)
+
+    registry = UrlRegistry(use_bloom=True, expected_items=100, confirm=confirm)
+    for i in range(20):
+        store.record_url(url_hash(i), f"http://a.com/{i}", "a.com", 1, 10)
+        registry.add(url_hash(i))
+
+    assert url_hash(3) in registry
+    assert url_hash(500) not in registry
+    assert lookups == [url_hash(3)]  # The negative never left memory
+
+    for i in range(3):
+        store.remove_url(url_hash(i))
+        registry.discard(url_hash(i))
+        assert url_hash(i) not in registry
+    assert registry.needs_rebuild()
+    registry.rebuild(store.url_hashes())
+    assert not registry.needs_rebuild()
+    assert not registry.might_contain(url_hash(0))
+
+
+def test_bloom_registry_follows_indexing_and_deletes(tmp_path, make_service, monkeypatch):
+    monkeypatch.setattr(index_service, "URL_REGISTRY_BLOOM", True)
+    manager = make_service().vector_store_manager
+    assert manager.url_registry.use_bloom
+    pages = {f"{i}.html": make_html_page(str(i)) for i in range(3)}
+    with serve_pages(pages, directory=str(tmp_path)) as base:
+        urls = [base + name for name in pages]
+        for url in urls:
+            assert manager.process_url(url)
+        manager.delete_url(urls[0])
+    hashes = [manager.get_url_hash(url) for url in urls]
+    assert [manager.url_already_exists(h) for h in hashes] == [False, True, True]
+    # One discard out of three entries passes the rebuild threshold, so the filter forgot it
+    assert not manager.url_registry.might_contain(hashes[0])
@@ -0,0 +1,123 @@
+import os
+import random
+import subprocess
+import sys
+import textwrap
+
+import pytest
+from langchain_core.documents import Document
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def write_chunks(manager, count):
+    manager.write_chunks([Document(page_content=f"chunk {i} about zebras",
+                                   metadata={"url": f"http://x.com/{i % 5}", "url_hash": f"{i % 5:032x}"})
+                          for i in range(count)])
+
+
+class CountingBackend:
+    """Proxy that counts the write calls reaching a backend."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.writes = 0
+
+    def __getattr__(self, name):
+        attribute = getattr(self.backend, name)
+        if name not in ("upsert", "update", "delete"):
+            return attribute
+
+        def write(*args, **kwargs):
+            self.writes += 1
+            return attribute(*args, **kwargs)
+        return write
+
+
+def snapshot(buffer, queries, ids):
+    result = buffer.query(queries, n_results=8)
+    stored = buffer.get(ids=ids)
+    return (buffer.count(), result["ids"], [[round(d, 3) for d in row] for row in result["distances"]],
+            result["metadatas"], stored["ids"], stored["metadatas"], stored["documents"])
+
+
+def test_reads_see_queued_writes(make_service):
+    manager = make_service(flush_interval=3600).vector_store_manager
+    manager.vector_store.max_pending_rows = 10 ** 9
+    write_chunks(manager, 20)
+    assert len(manager.vector_store.get(ids=[f"{i}" for i in range(3)])["ids"]) == 0
+    assert manager.vector_store.count() == 20
+    assert manager.vector_store.stats()["pending_rows"] == 20  # answered from the queue, not drained
+    assert len(manager.vector_store.get(where={"url_hash": f"{1:032x}"})["ids"]) == 4
+    assert manager.vector_store.stats()["pending_rows"] == 0
+
+
+@pytest.mark.parametrize("backend", ["local", "chroma"])
+def test_queries_overlay_queued_writes_like_applied_ones(make_service, backend):
+    buffer = make_service(backend=backend, flush_interval=3600).vector_store_manager.vector_store
+    buffer.max_pending_rows = 10 ** 9
+    rng = random.Random(0)
+
+    def embed(count):
+        return [[rng.gauss(0, 1) for _ in range(16)] for _ in range(count)]
+
+    ids = [f"c{i}" for i in range(42)]
+    texts = [f"chunk {i}" for i in range(42)]
+    metadatas = [{"url_hash": f"{i % 4:032x}", "n": i} for i in range(42)]
+    buffer.upsert(ids[:30], embed(30), metadatas[:30], texts[:30])
+    buffer.flush()
+
+    # Replace, delete and re-describe stored rows, add new ones, and delete one of those again
+    buffer.upsert(ids[25:40], embed(15), metadatas[25:40], [text + " revised" for text in texts[25:40]])
+    buffer.delete(ids=ids[:5] + ids[38:39])
+    buffer.update(ids=ids[10:15], metadatas=[{**meta, "n": -1} for meta in metadatas[10:15]])
+    buffer.upsert(ids[3:4], embed(1), metadatas[3:4], texts[3:4])
+    queries = embed(3)
+    requested = ids[:2] + ids[3:4] + ids[10:12] + ids[28:30] + ids[38:42]
+
+    overlaid = snapshot(buffer, queries, requested)
+    assert buffer.stats()["pending_writes"] == 4
+    buffer.flush()
+    assert overlaid == snapshot(buffer, queries, requested)
+
+
+def test_queued_writes_are_coalesced_while_queries_run(make_service):
+    manager = make_service(flush_interval=3600).vector_store_manager
+    buffer = manager.vector_store
+    buffer.max_pending_rows = 10 ** 9
+    buffer.backend = CountingBackend(buffer.backend)
+    query = [manager.embedding_function.embed_query("chunk about zebras")]
+    for page in range(10):
+        manager.write_chunks([Document(page_content=f"page {page} chunk {i} about zebras",
+                                       metadata={"url": f"http://x.com/{page}", "url_hash": f"{page:032x}"})
+                              for i in range(5)])
+        assert len(buffer.query(query, n_results=100)["ids"][0]) == 5 * (page + 1)
+    assert buffer.backend.writes == 0
+
+    buffer.flush()
+    assert buffer.backend.writes == 1  # ten pages' upserts in one backend call
+    assert len(buffer.query(query, n_results=100)["ids"][0]) == 50
+
+
+def test_logged_writes_are_replayed_after_a_crash(tmp_path, make_service):
+    directory = tmp_path / "db"
+    crash = textwrap.dedent(f"""
+        import os
+        from benchmarks.fakes import make_rag_service
+        from tests.test_write_buffer import write_chunks
+
+        manager = make_rag_service({str(directory)!r}, backend="local", flush_interval=3600).vector_store_manager
+        manager.vector_store.max_pending_rows = 10 ** 9
+        write_chunks(manager, 50)
+        manager.vector_store.delete(where={{"url_hash": "{0:032x}"}})
+        assert manager.vector_store.backend.count() == 0
+        os._exit(1)
+    """)
+    result = subprocess.run([sys.executable, "-c", crash], cwd=ROOT, capture_output=True, text=True)
+    assert result.returncode == 1, result.stderr
+
+    manager = make_service("db").vector_store_manager
+    assert manager.vector_store.stats()["pending_rows"] == 0
+    assert manager.vector_store.backend.count() == 40
+    assert manager.vector_store.get(where={"url_hash": f"{0:032x}"})["ids"] == []
@@ -0,0 +1,263 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# Seconds; spans cache lookups through slow LLM generations
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Sample = Tuple[str, str, str, Dict[str, str], float]  # name, type, help, labels, value
+
+
+def _format_labels(labels: Iterable[Tuple[str, Any]]) -> str:
+    labels = [(name, str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+              for name, value in labels]
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels) + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metrics:
+    """Counters, gauges and histograms rendered in the Prometheus text exposition format.
+
+    An update is a dict lookup and an add under one lock, so instrumentation can
+    stay on in production. Collectors run only when metrics are rendered, which
+    exports counters other components already keep (cache hits, ingestion
+    stages) without bookkeeping on their hot paths.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._meta: Dict[str, Tuple[str, str]] = {}  # name -> (type, help)
+        self._values: Dict[str, Dict[tuple, float]] = {}
+        self._histograms: Dict[str, Dict[tuple, List[float]]] = {}  # per labels: bucket counts, sum, count
+        self._collectors: List[Callable[[], Iterable[Sample]]] = []
+
+    def describe(self, name: str, kind: str, help: str):
+        """Declare a metric's type (counter, gauge or histogram) and help text."""
+        self._meta[name] = (kind, help)
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            values = self._values.setdefault(name, {})
+            values[key] = values.get(key, 0.0) + value
+
+    def set(self, name: str, value: float, **labels):
+        with self._lock:
+            self._values.setdefault(name, {})[tuple(sorted(labels.items()))] = value
+
+    def observe(self, name: str, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            entry = series.get(key)
+            if entry is None:
+                entry = series[key] = [0.0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                entry[index] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    @contextmanager
+    def in_flight(self, name: str, **labels):
+        """Count the block as in flight on a gauge while it runs."""
+        self.inc(name, 1, **labels)
+        try:
+            yield
+        finally:
+            self.inc(name, -1, **labels)
+
+    def add_collector(self, collector: Callable[[], Iterable[Sample]]):
+        """Register a callable returning (name, type, help, labels, value) samples at render time."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+
+        def header(name, kind, help):
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            values = {name: dict(series) for name, series in self._values.items()}
+            histograms = {name: {key: list(entry) for key, entry in series.items()}
+                          for name, series in self._histograms.items()}
+        for name, series in sorted(values.items()):
+            header(name, *self._meta.get(name, ("untyped", name)))
+            for key, value in series.items():
+                lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+        for name, series in sorted(histograms.items()):
+            header(name, *self._meta.get(name, ("histogram", name)))
+            for key, entry in series.items():
+                cumulative = 0.0
+                for bound, count in zip(self.buckets, entry):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(key + (('le', _format_value(bound)),))} "
+                                 f"{_format_value(cumulative)}")
+                lines.append(f"{name}_bucket{_format_labels(key + (('le', '+Inf'),))} {_format_value(entry[-1])}")
+                lines.append(f"{name}_sum{_format_labels(key)} {_format_value(entry[-2])}")
+                lines.append(f"{name}_count{_format_labels(key)} {_format_value(entry[-1])}")
+        collected: Dict[str, List[Sample]] = {}
+        for collector in self._collectors:
+            try:
+                for sample in collector():
+                    collected.setdefault(sample[0], []).append(sample)
+            except Exception as e:
+                print(f"Metrics collector failed: {e}")
+        for name, samples in sorted(collected.items()):
+            header(name, samples[0][1], samples[0][2])
+            for _, _, _, labels, value in samples:
+                lines.append(f"{name}{_format_labels(sorted(labels.items()))} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+metrics.describe("rag_stage_seconds", "histogram", "Time spent per request stage")
+metrics.describe("rag_tokens_total", "counter", "Prompt and answer tokens by part")
+metrics.describe("rag_query_paths_total", "counter", "Answered queries by path (cached, rewritten, ...)")
+
+_current_timer: ContextVar[Optional["StageTimer"]] = ContextVar("stage_timer", default=None)
+
+
+class StageTimer:
+    """Wall-clock milliseconds per named stage of one request.
+
+    Stages are also observed into the rag_stage_seconds histogram. While a timer
+    is bound, trace() blocks deeper in the stack (embedding, vector search) record
+    into it too; those nest inside the stage that called them.
+    """
+
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+
+    @staticmethod
+    def current() -> Optional["StageTimer"]:
+        """The timer bound to the running request, if any."""
+        return _current_timer.get()
+
+    @contextmanager
+    def bound(self):
+        """Bind this timer for the block, so trace() calls reach it."""
+        token = _current_timer.set(self)
+        try:
+            yield self
+        finally:
+            _current_timer.reset(token)
+
+    def add(self, name: str, seconds: float):
+        self.timings[name] = self.timings.get(name, 0.0) + seconds * 1000
+        metrics.observe("rag_stage_seconds", seconds, stage=name)
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def header(self) -> str:
+        """Stage breakdown for the X-Timing response header: name=ms pairs."""
+        return ", ".join(f"{name}={ms:.1f}" for name, ms in self.timings.items())
+
+
+@contextmanager
+def trace(stage: str):
+    """Time a stage into the bound request timer, or only into the stage histogram if none is bound."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        timer = _current_timer.get()
+        if timer is not None:
+            timer.add(stage, seconds)
+        else:
+            metrics.observe("rag_stage_seconds", seconds, stage=stage)
+
+
+def record_tokens(part: str, tokens: int):
+    """Count prompt (history, context) or answer tokens."""
+    metrics.inc("rag_tokens_total", tokens, part=part)
+
+
+class StageStats:
+    """Running per-path averages of stage timings across requests."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._paths: Dict[str, Dict[str, Any]] = {}
+
+    def record(self, path: str, timer: StageTimer):
+        with self._lock:
+            entry = self._paths.setdefault(path, {"requests": 0, "stage_ms": {}})
+            entry["requests"] += 1
+            for name, ms in timer.timings.items():
+                entry["stage_ms"][name] = entry["stage_ms"].get(name, 0.0) + ms
+        metrics.inc("rag_query_paths_total", path=path)
+
+    def mean_ms(self, path: str, stage: str) -> float:
+        with self._lock:
+            entry = self._paths.get(path)
+            if not entry or stage not in entry["stage_ms"]:
+                return 0.0
+            return entry["stage_ms"][stage] / entry["requests"]
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per path: request count and mean milliseconds per stage."""
+        with self._lock:
+            return {
+                path: {
+                    "requests": entry["requests"],
+                    "mean_ms": {name: round(total / entry["requests"], 3)
+                                for name, total in entry["stage_ms"].items()},
+                }
+                for path, entry in self._paths.items()
+            }
+
+
+class StageCounters:
+    """Cumulative items processed and busy time per pipeline stage.
+
+    items_per_second is per busy worker (items / busy seconds), so a stage that
+    runs on several workers at once can exceed it in wall-clock terms.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages: Dict[str, Dict[str, float]] = {}
+
+    def add(self, stage: str, items: int, seconds: float):
+        with self._lock:
+            entry = self._stages.setdefault(stage, {"items": 0, "busy_seconds": 0.0})
+            entry["items"] += items
+            entry["busy_seconds"] += seconds
+
+    @contextmanager
+    def time(self, stage: str, items: int = 1):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, items, time.perf_counter() - start)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                stage: {
+                    "items": int(entry["items"]),
+                    "busy_seconds": round(entry["busy_seconds"], 3),
+                    "items_per_second": round(entry["items"] / entry["busy_seconds"], 1)
+                    if entry["busy_seconds"] else 0.0,
+                }
+                for stage, entry in self._stages.items()
+            }
@@ -0,0 +1,111 @@
+import math
+import threading
+from typing import Callable, Dict, Iterable, Optional
+
+
+class BloomFilter:
+    """Fixed-size bloom filter over hex digests (such as url_hash), using double hashing."""
+
+    def __init__(self, expected_items: int, false_positive_rate: float = 0.001):
+        expected_items = max(1, expected_items)
+        self.size = max(8, int(-expected_items * math.log(false_positive_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / expected_items * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, digest: str):
+        h1 = int(digest[:16], 16)
+        h2 = int(digest[16:32], 16) | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, digest: str):
+        for position in self._positions(digest):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, digest: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(digest))
+
+
+class UrlRegistry:
+    """In-memory index of the url_hashes present in the vector store.
+
+    By default it is an exact hash set. With use_bloom=True a bloom filter is kept
+    instead, which is far smaller for very large collections: it is a negative
+    pre-filter, and its positives are checked with the confirm callback against an
+    exact on-disk lookup (the statistics store) to rule out false positives. Bloom
+    filters cannot forget, so discards are counted and needs_rebuild() reports when
+    enough have built up that the filter should be rebuilt from the exact set.
+    """
+
+    def __init__(self, use_bloom: bool = False, expected_items: int = 1_000_000,
+                 false_positive_rate: float = 0.001,
+                 confirm: Optional[Callable[[str], bool]] = None,
+                 rebuild_after_discarded: float = 0.1):
+        if use_bloom and confirm is None:
+            raise ValueError("Bloom filter mode needs a confirm callback for positives")
+        self.use_bloom = use_bloom
+        self.expected_items = expected_items
+        self.false_positive_rate = false_positive_rate
+        self.confirm = confirm
+        self.rebuild_after_discarded = rebuild_after_discarded
+        self._lock = threading.Lock()
+        self._hashes = set()
+        self._bloom = BloomFilter(expected_items, false_positive_rate) if use_bloom else None
+        self._bloom_items = 0
+        self._discarded = 0
+
+    def __contains__(self, url_hash: str) -> bool:
+        if not self.use_bloom:
+            return url_hash in self._hashes
+        return url_hash in self._bloom and self.confirm(url_hash)
+
+    def might_contain(self, url_hash: str) -> bool:
+        """Membership without confirming bloom positives; False is always exact."""
+        if not self.use_bloom:
+            return url_hash in self._hashes
+        return url_hash in self._bloom
+
+    def add(self, url_hash: str):
+        with self._lock:
+            if self.use_bloom:
+                if url_hash not in self._bloom:
+                    self._bloom.add(url_hash)
+                    self._bloom_items += 1
+            else:
+                self._hashes.add(url_hash)
+
+    def discard(self, url_hash: str):
+        with self._lock:
+            if self.use_bloom:
+                # The bits stay set, so the hash keeps reaching confirm until the next rebuild
+                self._discarded += 1
+            else:
+                self._hashes.discard(url_hash)
+
+    def needs_rebuild(self) -> bool:
+        """True once discarded hashes make up rebuild_after_discarded of the bloom filter's entries."""
+        return self.use_bloom and self._discarded > self.rebuild_after_discarded * self._bloom_items
+
+    def rebuild(self, url_hashes: Iterable[str]):
+        """Replace the registry contents with url_hashes."""
+        url_hashes = set(url_hashes)
+        with self._lock:
+            if self.use_bloom:
+                self._bloom = BloomFilter(max(self.expected_items, len(url_hashes)), self.false_positive_rate)
+                for url_hash in url_hashes:
+                    self._bloom.add(url_hash)
+                self._bloom_items = len(url_hashes)
+                self._discarded = 0
+            else:
+                self._hashes = url_hashes
+
+    def reconcile(self, actual_url_hashes: Iterable[str]) -> Dict[str, Optional[int]]:
+        """Compare against the authoritative set of url_hashes, fix drift and report it."""
+        actual = set(actual_url_hashes)
+        if self.use_bloom:
+            missing = sum(1 for url_hash in actual if url_hash not in self._bloom)
+            stale = None  # Not measurable without the exact set
+        else:
+            missing = len(actual - self._hashes)
+            stale = len(self._hashes - actual)
+        self.rebuild(actual)
+        return {"missing": missing, "stale": stale, "total": len(actual)}
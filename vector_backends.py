@@ -0,0 +1,130 @@
+import os
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+class VectorBackend(ABC):
+    """Storage engine behind VectorStoreManager.
+
+    The interface is the subset of a Chroma collection that the manager uses, and
+    results have the same dict shapes ('ids', 'metadatas', 'documents', and for
+    query() 'distances', nested one list per query embedding), so callers do not
+    care which engine they talk to.
+    """
+
+    name = ""
+
+    @abstractmethod
+    def count(self) -> int:
+        ...
+
+    @abstractmethod
+    def get(self, ids: Optional[Sequence[str]] = None, where: Optional[Dict[str, Any]] = None,
+            include: Sequence[str] = ("metadatas", "documents"), limit: Optional[int] = None,
+            offset: Optional[int] = None) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    def upsert(self, ids: List[str], embeddings: List[List[float]], metadatas: List[dict], documents: List[str]):
+        ...
+
+    @abstractmethod
+    def update(self, ids: List[str], metadatas: List[dict]):
+        ...
+
+    @abstractmethod
+    def delete(self, ids: Optional[Sequence[str]] = None, where: Optional[Dict[str, Any]] = None):
+        ...
+
+    @abstractmethod
+    def query(self, query_embeddings: List[List[float]], n_results: int = 10,
+              include: Sequence[str] = ("metadatas", "documents", "distances")) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    def relevance_score(self, distance: float) -> float:
+        """Map a query() distance to a 0-1 relevance score (higher is more similar)."""
+
+    def distances(self, query_embeddings: List[List[float]], embeddings: List[List[float]]) -> np.ndarray:
+        """query() distances from each query embedding to each given vector, as a queries x vectors array.
+
+        Lets a write buffer rank rows the engine has not stored yet alongside its results.
+        """
+        raise NotImplementedError
+
+    def persist(self):
+        """Flush pending writes to disk, for engines that buffer them."""
+
+    def warm_up(self):
+        """Load indexes into memory ahead of the first query, for engines that load them lazily."""
+
+    def refresh(self) -> bool:
+        """Pick up writes another process has made, for engines with read-only replicas; True if any."""
+        return False
+
+
+class ChromaBackend(VectorBackend):
+    """The Chroma collection managed through LangChain's Chroma wrapper."""
+
+    name = "chroma"
+
+    def __init__(self, persist_directory: str, embedding_function, client_settings):
+        # chromadb takes about a second to import, so only deployments using it pay for it
+        from langchain_community.vectorstores import Chroma
+
+        if os.path.exists(persist_directory):
+            print(f"Loading existing vector store from {persist_directory}...")
+        else:
+            print(f"Creating new vector store in {persist_directory}...")
+        self.store = Chroma(
+            persist_directory=persist_directory,
+            embedding_function=embedding_function,
+            client_settings=client_settings
+        )
+        self.collection = self.store._collection
+        self._relevance = self.store._select_relevance_score_fn()
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def get(self, ids=None, where=None, include=("metadatas", "documents"), limit=None, offset=None):
+        return self.collection.get(ids=ids, where=where, include=list(include), limit=limit, offset=offset)
+
+    def upsert(self, ids, embeddings, metadatas, documents):
+        self.collection.upsert(ids=ids, embeddings=embeddings, metadatas=metadatas, documents=documents)
+
+    def update(self, ids, metadatas):
+        self.collection.update(ids=ids, metadatas=metadatas)
+
+    def delete(self, ids=None, where=None):
+        self.collection.delete(ids=ids, where=where)
+
+    def query(self, query_embeddings, n_results=10, include=("metadatas", "documents", "distances")):
+        return self.collection.query(query_embeddings=query_embeddings, n_results=n_results, include=list(include))
+
+    def relevance_score(self, distance: float) -> float:
+        return self._relevance(distance)
+
+    def distances(self, query_embeddings, embeddings):
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        space = (self.collection.metadata or {}).get("hnsw:space", "l2")
+        if space == "l2":
+            # Chroma reports squared L2 distances
+            return ((queries[:, None, :] - vectors[None, :, :]) ** 2).sum(axis=2)
+        if space == "ip":
+            return 1.0 - queries @ vectors.T
+        norms = np.linalg.norm(queries, axis=1)[:, None] * np.linalg.norm(vectors, axis=1)[None, :]
+        return 1.0 - (queries @ vectors.T) / np.where(norms == 0, 1, norms)
+
+    def persist(self):
+        self.store.persist()
+
+    def warm_up(self):
+        # Chroma loads a collection's HNSW segment on its first query; query with a stored vector
+        stored = self.collection.get(limit=1, include=["embeddings"])
+        if stored["embeddings"] is not None and len(stored["embeddings"]):
+            self.collection.query(query_embeddings=[[float(v) for v in stored["embeddings"][0]]],
+                                  n_results=1, include=[])
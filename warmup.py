@@ -0,0 +1,73 @@
+import asyncio
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+
+class Warmup:
+    """Run slow service initialization in a background thread and report readiness.
+
+    task(progress) builds whatever the app needs and may call progress(stage) to
+    say what it is doing. The server starts accepting connections at once, so
+    liveness probes pass immediately while readiness follows the task.
+    """
+
+    def __init__(self, task: Callable[[Callable[[str], None]], None]):
+        self.task = task
+        self.stage = "pending"
+        self.error: Optional[str] = None
+        self.seconds: Optional[float] = None
+        self._done = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started_at = 0.0
+
+    def start(self):
+        if self._thread is None:
+            self._started_at = time.perf_counter()
+            self._thread = threading.Thread(target=self._run, name="warmup", daemon=True)
+            self._thread.start()
+
+    def _progress(self, stage: str):
+        self.stage = stage
+        print(f"Warmup: {stage} ({time.perf_counter() - self._started_at:.2f}s)")
+
+    def _run(self):
+        try:
+            self.task(self._progress)
+            self.stage = "ready"
+        except Exception as e:
+            self.error = str(e)
+            self.stage = "failed"
+            print(f"Warmup failed: {e}")
+        finally:
+            self.seconds = time.perf_counter() - self._started_at
+            self._done.set()
+            print(f"Warmup {self.stage} after {self.seconds:.2f}s")
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    @property
+    def ready(self) -> bool:
+        return self._done.is_set() and self.error is None
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the task has finished; True if it succeeded."""
+        self._done.wait(timeout)
+        return self.ready
+
+    async def await_ready(self, timeout: float, poll_interval: float = 0.05) -> bool:
+        """Wait without blocking the event loop (or an executor thread per waiting request)."""
+        deadline = time.monotonic() + timeout
+        while not self._done.is_set() and time.monotonic() < deadline:
+            await asyncio.sleep(poll_interval)
+        return self.ready
+
+    def status(self) -> Dict[str, Any]:
+        status = {"status": self.stage}
+        if self.error is not None:
+            status["error"] = self.error
+        if self.seconds is not None:
+            status["warmup_seconds"] = round(self.seconds, 3)
+        return status
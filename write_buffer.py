@@ -0,0 +1,331 @@
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from vector_backends import VectorBackend
+
+
+class WriteBehindBuffer(VectorBackend):
+    """Write-behind buffer in front of a vector backend.
+
+    Writes are appended to a SQLite write-ahead log and queued in memory. Queued
+    writes are applied to the backend in coalesced calls once max_pending_rows are
+    waiting or on the background timer. Reads do not wait for that: count(), query()
+    and get() by ids answer from the backend overlaid with the net effect of the
+    queue (pending upserts ranked with the backend's own distance, pending updates
+    and deletes applied), so they see every accepted write without draining it.
+    The backend's persist(), which the legacy duckdb+parquet
+    Chroma implements by rewriting the whole collection, runs at most every
+    flush_interval seconds and on flush()/close(); the log is cleared once the
+    backend has persisted. Writes still in the log after a crash are replayed on
+    startup. Every logged operation is an absolute upsert, update or delete, so
+    replaying one that had already reached the backend is harmless.
+
+    get() by a where filter, and any read while a delete by where filter is
+    queued, applies the queue first; the manager only issues those on the
+    indexing path.
+    """
+
+    def __init__(self, backend: VectorBackend, wal_path: Optional[str] = None, max_pending_rows: int = 5000,
+                 flush_interval: float = 30.0, max_batch_rows: int = 5000):
+        self.backend = backend
+        self.name = backend.name
+        self.max_pending_rows = max_pending_rows
+        self.flush_interval = flush_interval
+        self.max_batch_rows = max_batch_rows
+        self._lock = threading.RLock()
+        self._pending: List[tuple] = []  # (seq, op, payload)
+        self._pending_rows = 0
+        self._seq = 0
+        self._applied_seq = 0
+        self._dirty = False
+        self._last_flush = time.time()
+        self._flushes = 0
+        self._overlay_cache = None  # ((seq, applied seq), overlay)
+        self._conn = None
+        if wal_path:
+            self._conn = sqlite3.connect(wal_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS wal (
+                    seq INTEGER PRIMARY KEY,
+                    op TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    embeddings BLOB
+                )""")
+            self._conn.commit()
+            self._replay()
+        self._stop = threading.Event()
+        self._timer = None
+        if flush_interval > 0:
+            self._timer = threading.Thread(target=self._flush_periodically, name="vector-store-flush", daemon=True)
+            self._timer.start()
+
+    def _replay(self):
+        """Apply writes left in the log by a crash, then persist and clear it"""
+        rows = self._conn.execute("SELECT seq, op, payload, embeddings FROM wal ORDER BY seq").fetchall()
+        if not rows:
+            return
+        print(f"Replaying {len(rows)} logged vector store writes...")
+        for seq, op, payload, blob in rows:
+            payload = json.loads(payload)
+            if blob is not None:
+                payload["embeddings"] = np.frombuffer(blob, dtype=np.float32).reshape(len(payload["ids"]), -1).tolist()
+            self._pending.append((seq, op, payload))
+        self._seq = rows[-1][0]
+        self.flush()
+
+    def _log(self, op: str, payload: Dict[str, Any]):
+        """Append a write to the log and the in-memory queue (lock held)"""
+        self._seq += 1
+        if self._conn is not None:
+            embeddings = payload.get("embeddings")
+            self._conn.execute(
+                "INSERT INTO wal (seq, op, payload, embeddings) VALUES (?, ?, ?, ?)",
+                (self._seq, op, json.dumps({k: v for k, v in payload.items() if k != "embeddings"}),
+                 np.asarray(embeddings, dtype=np.float32).tobytes() if embeddings is not None else None))
+            self._conn.commit()
+        self._pending.append((self._seq, op, payload))
+        self._pending_rows += len(payload.get("ids") or [None])
+        self._dirty = True
+        if self._pending_rows >= self.max_pending_rows:
+            self._apply_pending()
+
+    @staticmethod
+    def _coalesce(pending: List[tuple]) -> List[tuple]:
+        """Merge runs of adjacent writes of the same kind; a later write to an id wins"""
+        groups: List[tuple] = []
+        for _, op, payload in pending:
+            last = groups[-1] if groups else None
+            if op == "upsert":
+                if last is None or last[0] != "upsert":
+                    last = ("upsert", {})
+                    groups.append(last)
+                for row in zip(payload["ids"], payload["embeddings"], payload["metadatas"], payload["documents"]):
+                    last[1].pop(row[0], None)
+                    last[1][row[0]] = row
+            elif op == "update":
+                if last is None or last[0] != "update":
+                    last = ("update", {})
+                    groups.append(last)
+                for chunk_id, meta in zip(payload["ids"], payload["metadatas"]):
+                    last[1][chunk_id] = meta
+            elif payload.get("where") is None:
+                if last is None or last[0] != "delete_ids":
+                    last = ("delete_ids", {})
+                    groups.append(last)
+                last[1].update(dict.fromkeys(payload["ids"]))
+            else:
+                groups.append(("delete", payload))
+        return groups
+
+    def _apply_pending(self):
+        """Apply queued writes to the backend in coalesced batches (lock held)"""
+        if not self._pending:
+            return
+        batch = self.max_batch_rows
+        for op, group in self._coalesce(self._pending):
+            if op == "upsert":
+                rows = list(group.values())
+                for i in range(0, len(rows), batch):
+                    ids, embeddings, metadatas, documents = zip(*rows[i:i + batch])
+                    self.backend.upsert(ids=list(ids), embeddings=list(embeddings),
+                                        metadatas=list(metadatas), documents=list(documents))
+            elif op == "update":
+                ids = list(group)
+                for i in range(0, len(ids), batch):
+                    self.backend.update(ids=ids[i:i + batch], metadatas=[group[chunk_id] for chunk_id in ids[i:i + batch]])
+            elif op == "delete_ids":
+                ids = list(group)
+                for i in range(0, len(ids), batch):
+                    self.backend.delete(ids=ids[i:i + batch])
+            else:
+                self.backend.delete(ids=group.get("ids"), where=group["where"])
+        # Only dropped once everything is applied; a failed apply is retried whole
+        self._applied_seq = self._pending[-1][0]
+        self._pending = []
+        self._pending_rows = 0
+
+    def _overlay(self):
+        """Net effect of the queued writes for reads, or None if reads must apply the queue first.
+
+        Returns (upserts {id: (id, embedding, metadata, document)}, updates {id: metadata},
+        deleted ids, ids of those upserted or deleted rows the backend holds), cached until
+        the queue changes.
+        """
+        with self._lock:
+            key = (self._seq, self._applied_seq)
+            if self._overlay_cache is not None and self._overlay_cache[0] == key:
+                return self._overlay_cache[1]
+            upserts, updates, deleted = {}, {}, set()
+            overlay = (upserts, updates, deleted, set())
+            for _, op, payload in self._pending:
+                if op == "upsert":
+                    for row in zip(payload["ids"], payload["embeddings"], payload["metadatas"], payload["documents"]):
+                        upserts[row[0]] = row
+                        updates.pop(row[0], None)
+                        deleted.discard(row[0])
+                elif op == "update":
+                    for chunk_id, meta in zip(payload["ids"], payload["metadatas"]):
+                        if chunk_id in upserts:
+                            upserts[chunk_id] = (chunk_id, upserts[chunk_id][1], meta, upserts[chunk_id][3])
+                        elif chunk_id not in deleted:
+                            updates[chunk_id] = meta
+                elif payload.get("where") is None:
+                    for chunk_id in payload["ids"]:
+                        upserts.pop(chunk_id, None)
+                        updates.pop(chunk_id, None)
+                        deleted.add(chunk_id)
+                else:
+                    overlay = None
+                    break
+            if overlay is not None and (upserts or deleted):
+                overlay[3].update(self.backend.get(ids=list(upserts.keys() | deleted), include=[])["ids"])
+            self._overlay_cache = (key, overlay)
+            return overlay
+
+    def _flush_periodically(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.persist()
+            except Exception as e:
+                print(f"Background vector store flush failed: {e}")
+
+    def flush(self):
+        """Apply queued writes, persist the backend and clear the log"""
+        with self._lock:
+            self._apply_pending()
+            self.backend.persist()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM wal WHERE seq <= ?", (self._applied_seq,))
+                self._conn.commit()
+            self._dirty = False
+            self._last_flush = time.time()
+            self._flushes += 1
+
+    def warm_up(self):
+        with self._lock:
+            self._apply_pending()
+        self.backend.warm_up()
+
+    def refresh(self) -> bool:
+        return self.backend.refresh()
+
+    def close(self):
+        """Stop the background timer and flush"""
+        self._stop.set()
+        if self._timer is not None:
+            self._timer.join()
+            self._timer = None
+        self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "pending_writes": len(self._pending),
+                "pending_rows": self._pending_rows,
+                "unflushed": self._dirty,
+                "seconds_since_flush": round(time.time() - self._last_flush, 3),
+                "flushes": self._flushes,
+            }
+
+    def count(self) -> int:
+        # Under the lock, so the queue cannot be applied between the overlay and the backend count
+        with self._lock:
+            overlay = self._overlay()
+            if overlay is None:
+                self._apply_pending()
+                return self.backend.count()
+            upserts, _, deleted, stored = overlay
+            return (self.backend.count() + sum(1 for chunk_id in upserts if chunk_id not in stored)
+                    - sum(1 for chunk_id in deleted if chunk_id in stored))
+
+    def get(self, ids=None, where=None, include=("metadatas", "documents"), limit=None, offset=None):
+        overlay = self._overlay() if ids is not None and where is None and limit is None and not offset else None
+        if overlay is None:
+            with self._lock:
+                self._apply_pending()
+            return self.backend.get(ids=ids, where=where, include=include, limit=limit, offset=offset)
+        upserts, updates, deleted, _ = overlay
+        ids = list(ids)
+        stored_ids = [chunk_id for chunk_id in ids if chunk_id not in upserts and chunk_id not in deleted]
+        # Chroma rejects an empty id list
+        stored = self.backend.get(ids=stored_ids, include=include) if stored_ids else {"ids": []}
+        rows = {}
+        for i, chunk_id in enumerate(stored["ids"]):
+            rows[chunk_id] = {key: stored[key][i] for key in ("embeddings", "metadatas", "documents")
+                              if key in include and stored.get(key) is not None}
+            if chunk_id in updates and "metadatas" in include:
+                rows[chunk_id]["metadatas"] = updates[chunk_id]
+        for chunk_id in ids:
+            if chunk_id in upserts:
+                _, embedding, meta, document = upserts[chunk_id]
+                rows[chunk_id] = {"embeddings": embedding, "metadatas": meta, "documents": document}
+        result_ids = [chunk_id for chunk_id in dict.fromkeys(ids) if chunk_id in rows]
+        return {"ids": result_ids, **{key: [rows[chunk_id][key] for chunk_id in result_ids] if key in include else None
+                                      for key in ("embeddings", "metadatas", "documents")}}
+
+    def query(self, query_embeddings, n_results=10, include=("metadatas", "documents", "distances")):
+        overlay = self._overlay()
+        if overlay is not None and (overlay[0] or overlay[1] or overlay[2]):
+            try:
+                return self._query_overlaid(overlay, query_embeddings, n_results, include)
+            except NotImplementedError:
+                overlay = None
+        if overlay is None:
+            with self._lock:
+                self._apply_pending()
+        return self.backend.query(query_embeddings=query_embeddings, n_results=n_results, include=include)
+
+    def _query_overlaid(self, overlay, query_embeddings, n_results, include):
+        """query() over the backend and the queued writes: stored rows the queue replaced or deleted are
+        dropped (over-fetching to make up for them), and pending upserts are ranked by the backend's distance"""
+        upserts, updates, deleted, stored = overlay
+        pending = list(upserts.values())
+        pending_distances = (self.backend.distances(query_embeddings, [row[1] for row in pending])
+                             if pending else [[] for _ in query_embeddings])
+        result = self.backend.query(query_embeddings=query_embeddings, n_results=n_results + len(stored),
+                                    include=("metadatas", "documents", "distances"))
+        merged = {"ids": [], "metadatas": [], "documents": [], "distances": []}
+        for i in range(len(query_embeddings)):
+            hits = [(distance, chunk_id, updates.get(chunk_id, meta), document)
+                    for chunk_id, meta, document, distance in zip(
+                        result["ids"][i], result["metadatas"][i], result["documents"][i], result["distances"][i])
+                    if chunk_id not in upserts and chunk_id not in deleted]
+            hits += [(float(distance), chunk_id, meta, document)
+                     for (chunk_id, _, meta, document), distance in zip(pending, pending_distances[i])]
+            hits = sorted(hits, key=lambda hit: hit[0])[:n_results]
+            merged["ids"].append([hit[1] for hit in hits])
+            merged["metadatas"].append([hit[2] for hit in hits])
+            merged["documents"].append([hit[3] for hit in hits])
+            merged["distances"].append([hit[0] for hit in hits])
+        for key in ("metadatas", "documents", "distances"):
+            if key not in include:
+                merged[key] = None
+        return merged
+
+    def upsert(self, ids, embeddings, metadatas, documents):
+        with self._lock:
+            self._log("upsert", {"ids": list(ids), "embeddings": list(embeddings),
+                                 "metadatas": list(metadatas), "documents": list(documents)})
+
+    def update(self, ids, metadatas):
+        with self._lock:
+            self._log("update", {"ids": list(ids), "metadatas": list(metadatas)})
+
+    def delete(self, ids=None, where=None):
+        with self._lock:
+            self._log("delete", {"ids": list(ids) if ids is not None else None, "where": where})
+
+    def relevance_score(self, distance: float) -> float:
+        return self.backend.relevance_score(distance)
+
+    def persist(self):
+        """Persist the backend if writes are waiting and flush_interval has passed since the last flush"""
+        with self._lock:
+            if self._dirty and time.time() - self._last_flush >= self.flush_interval:
+                self.flush()